@@ -0,0 +1,204 @@
+"""
+Cache local de ERA5-Land por (grilla de la zona, variable, hora) en Zarr.
+
+Cada grilla de recuadros (identificada por el hash de su geometria) tiene un store
+{ruta}/{firma}.zarr con variables (date_time, id), en chunks de 24 horas. Solo se piden a GEE las horas
+que faltan (se agregan al final del store con append_dim), el resto se sirve localmente. Las horas se
+deduplican, por lo que pasadas de distintos satelites en la misma hora comparten la consulta.
+
+Los valores se pueden entregar truncados a la hora (como hasta ahora) o interpolados linealmente al
+minuto exacto de cada pasada a partir de las dos horas vecinas del cache. Las horas que ERA5-Land aun no
+publica (todo NaN) no se guardan y se entregan como filas NaN hasta que aparezcan.
+"""
+from pathlib import Path
+import hashlib
+
+import numpy as np
+import pandas as pd
+import shapely
+import xarray as xr
+
+from era5_lotes import VARIABLES_ERA5, extraer_era5
+
+HORAS_POR_CHUNK = 24
+
+
+def firma_grilla(grid_gdf):
+    """Hash (sha1) de la geometria y CRS de los recuadros de la zona."""
+    h = hashlib.sha1(str(grid_gdf.crs).encode())
+    h.update(b''.join(shapely.to_wkb(grid_gdf.geometry.values)))
+    return h.hexdigest()[:16]
+
+
+def horas_requeridas(fechas, interpolar=False):
+    """Horas UTC necesarias: la hora truncada de cada pasada y, si se interpola, tambien la siguiente."""
+    fechas = pd.to_datetime(pd.Series(list(fechas)), utc=True)
+    horas = fechas.dt.floor('h')
+    if interpolar:
+        siguientes = horas[fechas > horas] + pd.Timedelta(hours=1)
+        horas = pd.concat([horas, siguientes])
+    return pd.DatetimeIndex(horas.drop_duplicates().sort_values())
+
+
+def abrir_cache(path):
+    """Dataset del cache con date_time en UTC, o None si no existe."""
+    if not Path(path).exists():
+        return None
+    ds = xr.open_zarr(path, chunks=None, consolidated=False).load()
+    return ds.assign_coords(date_time=pd.DatetimeIndex(ds['date_time'].values).tz_localize('UTC'))
+
+
+def _a_dataset(df, variables):
+    """Tabla larga (id, variables, date_time) -> Dataset (date_time, id) con fechas sin zona horaria (UTC)."""
+    df = df.assign(date_time=pd.to_datetime(df['date_time'], utc=True).dt.tz_localize(None))
+    return df.set_index(['date_time', 'id'])[variables].to_xarray().sortby('date_time')
+
+
+def _vacio(ids, variables):
+    """Cache sin horas (todas las pedidas aun no publicadas)."""
+    return xr.Dataset({var: (('date_time', 'id'), np.empty((0, len(ids)))) for var in variables},
+                      coords={'date_time': pd.DatetimeIndex([], tz='UTC'), 'id': np.asarray(ids)})
+
+
+def _guardar(ds, path, agregar):
+    if agregar:
+        ds.to_zarr(path, append_dim='date_time', consolidated=False)
+    else:
+        ds.to_zarr(path, mode='w', consolidated=False, encoding={var: {'chunks': (HORAS_POR_CHUNK, ds.sizes['id'])} for var in ds.data_vars})
+
+
+def actualizar_cache(fechas, grid_gdf, fc, ruta, variables=None, interpolar=False, extraer=extraer_era5, **kwargs):
+    """
+    Asegura que el cache tenga todas las horas necesarias para `fechas` y lo retorna.
+
+    Parameters
+    ----------
+    fechas : iterable
+        Fechas de las pasadas (str o Timestamps).
+    grid_gdf : GeoDataFrame
+        Recuadros de la zona con columna 'id' (la firma de su geometria identifica el store).
+    fc : ee.FeatureCollection
+        Los mismos recuadros en GEE.
+    ruta : str
+        Carpeta de los stores Zarr.
+    variables : list of str or None
+        Variables de ERA5-Land (por defecto VARIABLES_ERA5).
+    interpolar : bool
+        Si True tambien se piden las horas siguientes a cada pasada (ver valores_pasadas).
+    extraer : callable
+        Funcion de descarga (extraer_era5); **kwargs se le pasan (p.ej. ee_cliente, horas_por_lote).
+
+    Returns
+    -------
+    xarray.Dataset
+        Cache completo de la grilla (date_time UTC x id); sin horas si ninguna esta publicada todavia.
+    """
+    variables = variables or VARIABLES_ERA5
+    path = Path(ruta) / f'{firma_grilla(grid_gdf)}.zarr'
+    horas = horas_requeridas(fechas, interpolar)
+    cache = abrir_cache(path)
+
+    if cache is not None and not set(variables) <= set(cache.data_vars):
+        # variable nueva: se vuelve a pedir todo el historial de la grilla con todas las variables
+        variables = list(dict.fromkeys(list(cache.data_vars) + list(variables)))
+        horas = horas.union(cache.indexes['date_time'])
+        cache = None
+
+    faltantes = horas if cache is None else horas.difference(cache.indexes['date_time'])
+    print(f'cache ERA5 {path.name}: {len(horas)} horas pedidas, {len(faltantes)} por descargar')
+    if len(faltantes):
+        nuevo = _a_dataset(extraer(faltantes, fc, variables, **kwargs), variables)
+        # horas aun no publicadas en ERA5-Land (todo NaN) no se guardan, para volver a pedirlas despues
+        nuevo = nuevo.dropna('date_time', how='all')
+        if nuevo.sizes['date_time']:
+            _guardar(nuevo, path, agregar=cache is not None)
+            cache = abrir_cache(path)
+    return cache if cache is not None else _vacio(grid_gdf['id'].to_numpy(), variables)
+
+
+def valores_pasadas(cache, fechas, interpolar=False, variables=None):
+    """
+    Valores de ERA5 por recuadro para cada pasada.
+
+    Parameters
+    ----------
+    cache : xarray.Dataset or None
+        Resultado de actualizar_cache (None: sin datos, tabla vacia).
+    fechas : iterable
+        Fechas de las pasadas.
+    interpolar : bool
+        False: valor de la hora truncada, una fila por hora distinta (date_time = hora).
+        True: interpolacion lineal entre la hora truncada y la siguiente, una fila por pasada distinta
+        (date_time = minuto exacto de la pasada).
+
+    Returns
+    -------
+    DataFrame
+        Columnas id, variables y date_time (UTC). Las horas que no estan en el cache (aun no publicadas)
+        quedan NaN.
+    """
+    if cache is None:
+        return pd.DataFrame(columns=['id', *(variables or []), 'date_time'])
+    variables = variables or list(cache.data_vars)
+    cache = cache[variables].sortby('date_time')
+    fechas = pd.to_datetime(pd.Series(list(fechas)), utc=True).drop_duplicates().sort_values()
+
+    h0 = pd.DatetimeIndex(fechas.dt.floor('h'))
+    if not interpolar:
+        h0 = h0.unique()
+        fechas, peso = pd.Series(h0), np.zeros(len(h0))
+    else:
+        peso = ((fechas - fechas.dt.floor('h')) / pd.Timedelta(hours=1)).to_numpy()
+    horas = cache.indexes['date_time']
+    i0 = horas.get_indexer(h0)
+    i1 = horas.get_indexer(h0 + pd.Timedelta(hours=1))
+    i1 = np.where((i1 < 0) & (peso == 0), i0, i1)
+
+    ids = cache['id'].values
+    datos = {'id': np.tile(ids, len(fechas))}
+    for var in variables:
+        ## fila NaN al final: las horas fuera del cache (indice -1) la toman
+        arr = cache[var].transpose('date_time', 'id').values
+        arr = np.concatenate([arr, np.full((1, len(ids)), np.nan)])
+        v0 = arr[i0]
+        v1 = arr[i1]
+        datos[var] = (v0 + peso[:, None] * (v1 - v0)).ravel()
+    datos['date_time'] = pd.DatetimeIndex(fechas).repeat(len(ids))
+    return pd.DataFrame(datos)
+
+
+if __name__ == "__main__":
+    ## corrida con un extractor local (sin GEE): segunda corrida e interpolacion servidas desde el cache
+    import tempfile
+    import time
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    grid_gdf = gpd.GeoDataFrame({'id': range(100)}, geometry=[box(i, 0, i + 1, 1) for i in range(100)], crs='EPSG:32615')
+    consultas = []
+
+    def extraer_local(horas, fc, variables, **kwargs):
+        time.sleep(0.5)   # latencia de una consulta remota
+        consultas.append(len(horas))
+        horas = pd.DatetimeIndex(horas)
+        t = ((horas - pd.Timestamp('2025-04-12', tz='UTC')) / pd.Timedelta(hours=1)).to_numpy()
+        return pd.DataFrame({'id': np.tile(np.arange(100), len(horas)),
+                             **{v: np.repeat(280 + t, 100) + k for k, v in enumerate(variables)},
+                             'date_time': horas.repeat(100)})
+
+    pasadas = pd.date_range('2025-04-12 07:40', periods=40, freq='12h', tz='UTC')
+    fechas = [p + pd.Timedelta(d) for d in ['0min', '12min', '25min'] for p in pasadas]   # 3 satelites
+    with tempfile.TemporaryDirectory() as ruta:
+        for corrida in ['primera', 'segunda']:
+            t = time.perf_counter()
+            cache = actualizar_cache([f.strftime('%Y-%m-%dT%H:00') for f in fechas], grid_gdf, None, ruta,
+                                     extraer=extraer_local)
+            print(f'{corrida} corrida: {time.perf_counter() - t:.2f} s')
+        t = time.perf_counter()
+        cache = actualizar_cache(fechas, grid_gdf, None, ruta, interpolar=True, extraer=extraer_local)
+        df = valores_pasadas(cache, fechas, interpolar=True)
+        print(f'interpolado al minuto: {time.perf_counter() - t:.2f} s, {len(df)} filas')
+        fila = df[df['date_time'] == fechas[-1]].iloc[0]
+        esperado = 280 + (fechas[-1] - pd.Timestamp('2025-04-12', tz='UTC')) / pd.Timedelta(hours=1)
+        print('consultas (horas por consulta):', consultas, '| interpolacion exacta:',
+              np.isclose(fila['u_component_of_wind_10m'], esperado))
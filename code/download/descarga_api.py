@@ -1,6 +1,10 @@
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import os
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from pathlib import Path
 import geopandas as gpd
@@ -39,91 +43,240 @@ def polygon_to_bbox_format(geom):
     return bbox_str, bbox_encoded
 
 
-def download_laads_files_json(products, start_date, end_date, bbox, output_folder, token):
+BASE_URL = "https://ladsweb.modaps.eosdis.nasa.gov/api/v2/content/details/"
+
+## producto -> (satelite, carpeta)
+PRODUCTOS = {
+    'VNP02IMG': ('SUOMI', 'BANDAS'),
+    'VNP03IMG': ('SUOMI', 'COORDS'),
+    'VJ102IMG': ('NOAA1', 'BANDAS'),
+    'VJ103IMG': ('NOAA1', 'COORDS'),
+    'VJ202IMG': ('NOAA2', 'BANDAS'),
+    'VJ203IMG': ('NOAA2', 'COORDS'),
+}
+
+REINTENTAR_STATUS = {429, 500, 502, 503, 504}
+
+
+def crear_sesion(token, n_conexiones=8):
+    """Sesion de requests con pool de conexiones y autenticacion con token."""
+    sesion = requests.Session()
+    adapter = HTTPAdapter(pool_connections=n_conexiones, pool_maxsize=n_conexiones)
+    sesion.mount("https://", adapter)
+    sesion.mount("http://", adapter)
+    sesion.headers.update({"Authorization": f"Bearer {token}"})   ## autenticacion
+    return sesion
+
+
+def get_con_reintentos(sesion, url, reintentos=5, backoff=2.0, **kwargs):
+    """
+    GET con backoff exponencial ante 429/5xx o errores de conexion.
+    Respeta el header Retry-After si el servidor lo envia.
+    """
+    for intento in range(reintentos + 1):
+        try:
+            response = sesion.get(url, timeout=(10, 120), **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if intento == reintentos:
+                raise
+            espera = backoff * 2 ** intento
+            print(f"Error de conexion ({e.__class__.__name__}), reintento en {espera:.0f} s")
+        else:
+            if response.status_code not in REINTENTAR_STATUS or intento == reintentos:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            espera = float(retry_after) if retry_after and retry_after.isdigit() else backoff * 2 ** intento
+            print(f"Status {response.status_code} en {url}, reintento en {espera:.0f} s")
+            response.close()
+        time.sleep(espera)
+
+
+def listar_archivos(sesion, products, start_date, end_date, bbox):
+    """
+    Lista (sin descargar) los archivos de LAADS para uno o varios productos, paginando la API.
+    Cada elemento es el diccionario de la API (name, size, md5sum, downloadsLink, ...) mas 'producto'.
+    """
+    if isinstance(products, str):
+        products = [products]
+
+    archivos = []
+    for producto in products:
+        page = 1
+        while True:
+            params = {
+                "products": producto,
+                "temporalRanges": f"{start_date}..{end_date}",
+                "regions": bbox,
+                "page": page
+            }
+            response = get_con_reintentos(sesion, BASE_URL, params=params)
+            if response.status_code != 200:
+                print(f"⚠️ Error al consultar la API ({producto}, página {page}): {response.status_code}")
+                print(response.text)
+                break
+
+            files = response.json().get("content", [])
+            if not files:
+                break
+            for file in files:
+                file['producto'] = producto
+            archivos.extend(files)
+            page += 1
+
+    return archivos
+
+
+def md5_archivo(path, bloque=8 * 1024 ** 2):
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(bloque), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def descargar_archivo(sesion, file, output_folder, reintentos=3, chunk_size=1024 ** 2):
+    """
+    Descarga un archivo a {output_folder}/{nombre}.part y lo renombra al verificarlo.
+
+    - Si existe un .part (descarga interrumpida) se continua con un request HTTP Range.
+    - Se verifica tamaño y md5 contra los metadatos de la API (size, md5sum); si no coinciden
+      se descarta el .part y se vuelve a intentar.
+    - Un archivo final solo existe si paso la verificacion, por lo que basta revisar su tamaño.
+
+    Returns
+    -------
+    str
+        'existe', 'descargado' o 'error'.
+    """
+    file_url = file['downloadsLink']
+    filename = os.path.join(output_folder, os.path.basename(file_url))
+    parcial = filename + '.part'
+    size = int(file['size']) if file.get('size') not in (None, '') else None
+    md5 = file.get('md5sum') or file.get('md5')
+
+    if os.path.exists(filename) and (size is None or os.path.getsize(filename) == size):
+        print(f"El archivo ya existe: {filename}")
+        return 'existe'
+
+    for intento in range(reintentos):
+        inicio = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+        if size is not None and inicio > size:   # .part corrupto
+            os.remove(parcial)
+            inicio = 0
+
+        headers = {"Range": f"bytes={inicio}-"} if inicio else {}
+        if size is None or inicio < size:
+            print(f"⬇️ Descargando: {file_url}" + (f" (desde byte {inicio})" if inicio else ""))
+            file_response = get_con_reintentos(sesion, file_url, headers=headers, stream=True)
+            if file_response.status_code == 416:   # el .part ya estaba completo
+                file_response.close()
+            elif file_response.status_code in (200, 206):
+                modo = 'ab' if file_response.status_code == 206 else 'wb'   # 200: el servidor ignoro el Range
+                try:
+                    with file_response, open(parcial, modo) as f:
+                        for chunk in file_response.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+                except requests.RequestException as e:   # corte a mitad de la transferencia: se retoma desde el .part
+                    print(f"Transferencia interrumpida ({e.__class__.__name__}): {file_url}")
+                    continue
+            else:
+                print(f"❌ Error al descargar: {file_url} (status {file_response.status_code})")
+                file_response.close()
+                return 'error'
+
+        ## verificacion
+        if size is not None and os.path.getsize(parcial) != size:
+            print(f"❌ Tamaño distinto al esperado en {parcial}, reintentando")
+            continue
+        if md5 and md5_archivo(parcial) != md5:
+            print(f"❌ md5 distinto al esperado en {parcial}, se descarta")
+            os.remove(parcial)
+            continue
+
+        os.replace(parcial, filename)
+        print(f"Guardado: {filename}")
+        return 'descargado'
+
+    return 'error'
+
+
+def download_laads_files_json(products, start_date, end_date, bbox, output_folder, token, n_workers=4):
     """
     Descarga archivos desde la API de LAADS DAAC usando autenticación con token.
     
     Parametros:
-        products (str): Producto, por ejemplo "VNP14IMG".
+        products (str o list): Producto(s), por ejemplo "VNP14IMG" o ['VNP02IMG', 'VNP03IMG'].
         start_date (str): Fecha de inicio en formato "YYYY-MM-DD".
         end_date (str): Fecha de término en formato "YYYY-MM-DD".
         bbox (str): Bounding box en formato "-75,-35,-72,-33".
-        output_folder (str): Carpeta donde guardar los archivos descargados.
+        output_folder (str o dict): Carpeta donde guardar los archivos descargados, o
+            diccionario producto -> carpeta cuando se descargan varios productos.
         token (str): Token de autenticación de LAADS DAAC
+        n_workers (int): Descargas simultaneas.
+
+    Retorna:
+        dict: conteo de archivos por estado ('existe', 'descargado', 'error').
     """
-    
-    base_url = "https://ladsweb.modaps.eosdis.nasa.gov/api/v2/content/details/"
-    headers = {"Authorization": f"Bearer {token}"}   ## autenticacion
-    page = 1
-    os.makedirs(output_folder, exist_ok=True)
-
-    while True:
-        params = {
-            "products": products,
-            "temporalRanges": f"{start_date}..{end_date}",
-            "regions": bbox,
-            "page": page
-        }
-        
-        response = requests.get(base_url, headers=headers, params=params)
-        if response.status_code != 200:
-            print(f"⚠️ Error al consultar la API (página {page}): {response.status_code}")
-            print(response.text)
-            break
-
-        result = response.json()
-        files = result.get("content", [])
-        if not files:
-            print("No hay mas archivos para descargar.")
-            break
-
-        for file in files:
-            file_url = file['downloadsLink']
-            filename = os.path.join(output_folder, os.path.basename(file_url))
-
-            if os.path.exists(filename):
-                print(f"El archivo ya existe: {filename}")
-                continue
-
-            # Descargar el archivo
-            print(f"⬇️ Descargando: {file_url}")
-            file_response = requests.get(file_url, headers=headers, stream=True)
-            if file_response.status_code == 200:
-                with open(filename, 'wb') as f:
-                    for chunk in file_response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                print(f"Guardado: {filename}")
-            else:
-                print(f"❌ Error al descargar: {file_url} (status {file_response.status_code})")
+    sesion = crear_sesion(token, n_conexiones=n_workers + 1)
+    archivos = listar_archivos(sesion, products, start_date, end_date, bbox)
+    if not archivos:
+        print("No hay archivos para descargar.")
+        return {}
+
+    return descargar_archivos(sesion, archivos, output_folder, n_workers)
 
-        page += 1
 
+def descargar_archivos(sesion, archivos, output_folder, n_workers=4):
+    """
+    Descarga en paralelo una lista de archivos de la API (diccionarios con downloadsLink, size,
+    md5sum y producto), p.ej. los de listar_archivos o los de un plan de descarga.
+    """
+    def carpeta(file):
+        destino = output_folder[file['producto']] if isinstance(output_folder, dict) else output_folder
+        os.makedirs(destino, exist_ok=True)
+        return destino
 
+    estados = {}
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        futuros = {pool.submit(descargar_archivo, sesion, file, carpeta(file)): file for file in archivos}
+        for futuro in as_completed(futuros):
+            try:
+                estado = futuro.result()
+            except Exception as e:   # un archivo que falla no corta el resto de las descargas
+                print(f"❌ Error al descargar: {futuros[futuro]['downloadsLink']} ({e.__class__.__name__}: {e})")
+                estado = 'error'
+            estados[estado] = estados.get(estado, 0) + 1
 
-#####################################################
-## token de pag
-load_dotenv() 
-password = os.environ['token']
+    print(estados)
+    return estados
 
-## areas de interes
-path_areas = Path('data/procesado/zonas_incendios/areas_buffer.geojson')
-areas = gpd.read_file(path_areas)
-geom = areas[areas['zona'] == 'area2']['geometry'].iloc[0]
 
-bbox_str, _ = polygon_to_bbox_format(geom)
+def carpetas_productos(base='datos-viirs', productos=None):
+    """Carpeta de destino de cada producto: {base}/{SATELITE}/{BANDAS|COORDS}."""
+    productos = productos or list(PRODUCTOS)
+    return {p: f'{base}/{PRODUCTOS[p][0]}/{PRODUCTOS[p][1]}' for p in productos}
 
 
-set = ['VNP02IMG', 'VNP03IMG', 'VJ102IMG', 'VJ103IMG', 'VJ202IMG', 'VJ203IMG']
-save = ['BANDAS', 'COORDS'] 
-satelite = 'NOAA2'
 
+#####################################################
 if __name__ == "__main__":
-    products = set[5]
+    ## token de pag
+    load_dotenv() 
+    password = os.environ['token']
+
+    ## areas de interes
+    path_areas = Path('data/procesado/zonas_incendios/areas_buffer.geojson')
+    areas = gpd.read_file(path_areas)
+    geom = areas[areas['zona'] == 'area2']['geometry'].iloc[0]
+
+    bbox_str, _ = polygon_to_bbox_format(geom)
+
+    ## los seis productos (bandas y coordenadas de suomi, noaa1 y noaa2) en una sola llamada
+    products = list(PRODUCTOS)
     start_date = "2025-04-12"
     end_date = "2025-04-22"
     bbox = bbox_str # "[BBOX]N35.8419 S35.77783 E-82.07657 W-82.16226"
-    output_dir = f'datos-viirs/{satelite}/{save[1]}'
+    output_dir = carpetas_productos('datos-viirs', products)
     token = password
 
-    download_laads_files_json(products, start_date, end_date, bbox, output_dir, token)
-
+    download_laads_files_json(products, start_date, end_date, bbox, output_dir, token, n_workers=4)
@@ -0,0 +1,111 @@
+"""
+Extraccion de ERA5-Land desde GEE por lotes de horas: una sola imagen multibanda (toBands) y un solo
+reduceRegions + ee_to_df por zona (o por lote de horas), en vez de un viaje de ida y vuelta por fecha.
+
+- Las horas se deduplican antes de consultar (pasadas de noaa1/noaa2/suomi en la misma hora se piden una vez).
+- Las fechas se calculan localmente a partir del nombre de banda ({YYYYmmddTHH}_{variable}), sin getInfo.
+- El cliente de Earth Engine y la conversion a DataFrame se inyectan (`ee_cliente`, `a_df`), por lo que el modulo
+  se puede ejecutar contra un stub local (ver tests/test_era5_lotes.py) sin credenciales.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+COLECCION_ERA5 = "ECMWF/ERA5_LAND/HOURLY"
+VARIABLES_ERA5 = [
+    'u_component_of_wind_10m',
+    'v_component_of_wind_10m',
+    'temperature_2m',
+    'dewpoint_temperature_2m'
+]
+
+
+def horas_unicas(fechas):
+    """Horas UTC (truncadas) distintas y ordenadas de una lista de fechas (str 'YYYY-mm-ddTHH:MM' o Timestamps)."""
+    horas = pd.to_datetime(pd.Series(list(fechas)), utc=True).dt.floor('h')
+    return pd.DatetimeIndex(horas.drop_duplicates().sort_values())
+
+
+def indice_hora(hora):
+    """system:index de la imagen horaria de ERA5-Land (p.ej. '20250418T08')."""
+    return hora.strftime('%Y%m%dT%H')
+
+
+def imagen_horas(horas, variables, ee_cliente):
+    """Imagen multibanda con las variables de todas las horas (bandas {YYYYmmddTHH}_{variable})."""
+    millis = [int(h.timestamp() * 1000) for h in horas]
+    coleccion = ee_cliente.ImageCollection(COLECCION_ERA5) \
+                          .filter(ee_cliente.Filter.inList('system:time_start', millis)) \
+                          .select(variables)
+    return coleccion.toBands()
+
+
+def ancho_a_largo(df, horas, variables, columna_id='id'):
+    """
+    Pasa la tabla ancha de reduceRegions (una columna por hora y variable) a una fila por (hora, recuadro).
+    Las horas sin imagen en la coleccion quedan con NaN.
+    """
+    bloques = []
+    for hora in horas:
+        bloque = pd.DataFrame({columna_id: df[columna_id].to_numpy()})
+        for var in variables:
+            columna = f'{indice_hora(hora)}_{var}'
+            bloque[var] = df[columna].to_numpy(dtype=float) if columna in df.columns else np.nan
+        bloque['date_time'] = hora
+        bloques.append(bloque)
+    return pd.concat(bloques, ignore_index=True)
+
+
+def reducir_lote(horas, fc, variables, ee_cliente, a_df, scale=9000):
+    """Un reduceRegions (media) y una descarga para todas las horas del lote."""
+    imagen = imagen_horas(horas, variables, ee_cliente)
+    fc_reduced = imagen.reduceRegions(collection=fc, reducer=ee_cliente.Reducer.mean(), scale=scale)
+    return ancho_a_largo(a_df(fc_reduced), horas, variables)
+
+
+def extraer_era5(fechas, fc, variables=None, horas_por_lote=None, n_hilos=4, scale=9000, ee_cliente=None, a_df=None):
+    """
+    Valores medios de ERA5-Land en cada recuadro de `fc` para todas las horas de `fechas`.
+
+    Parameters
+    ----------
+    fechas : iterable
+        Fechas de las pasadas; se truncan a la hora y se deduplican.
+    fc : ee.FeatureCollection
+        Recuadros de la zona, con propiedad 'id'.
+    variables : list of str or None
+        Bandas de ERA5-Land (por defecto VARIABLES_ERA5).
+    horas_por_lote : int or None
+        Horas por consulta (None: todas en una). Sirve para no superar el limite de tamaño de respuesta de GEE
+        con muchas horas o recuadros; los lotes se piden en paralelo.
+    n_hilos : int
+        Consultas simultaneas.
+    ee_cliente : module or None
+        Modulo `ee` (o un stub con la misma interfaz). Por defecto se importa `ee`.
+    a_df : callable or None
+        FeatureCollection -> DataFrame (por defecto geemap.ee_to_df).
+
+    Returns
+    -------
+    DataFrame
+        Columnas id, variables y date_time (UTC), una fila por (hora, recuadro), horas en orden.
+    """
+    if ee_cliente is None:
+        import ee as ee_cliente
+    if a_df is None:
+        import geemap
+        a_df = geemap.ee_to_df
+    variables = variables or VARIABLES_ERA5
+
+    horas = horas_unicas(fechas)
+    tamaño = horas_por_lote or max(len(horas), 1)
+    lotes = [horas[i:i + tamaño] for i in range(0, len(horas), tamaño)]
+    print(f'{len(horas)} horas distintas en {len(lotes)} consulta(s)')
+
+    with ThreadPoolExecutor(max_workers=n_hilos) as pool:
+        partes = list(pool.map(lambda lote: reducir_lote(lote, fc, variables, ee_cliente, a_df, scale), lotes))
+    if not partes:
+        return pd.DataFrame(columns=['id'] + variables + ['date_time'])
+    return pd.concat(partes, ignore_index=True)
+
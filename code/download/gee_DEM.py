@@ -1,6 +1,13 @@
 import ee
 import geemap
-import geopandas as gpd
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'procesamiento'))
+from almacenamiento import escribir, leer
 
 
 ee.Authenticate()  
@@ -10,16 +17,54 @@ ee.Initialize(project='tesis-incendios')
 
 #### functions
 
-def process_image_cells(image, fc):
+## tamaño de cada pagina de celdas enviada a GEE (evita el limite de elementos/tamaño de respuesta)
+CELDAS_POR_PAGINA = 5000
+
+
+def imagen_terreno(geometria, capas_extra=None):
+    """
+    DEM, pendiente y orientacion en una sola imagen multibanda (ee.Image.cat).
+
+    Parameters
+    ----------
+    geometria: ee.Geometry or ee.FeatureCollection
+        Zona, para elegir la imagen de GLO30.
+    capas_extra: dict or None
+        Nombre de banda -> ee.Image de una banda (p.ej. cobertura de suelo) a reducir junto al terreno.
+    """
+    dem_image = ee.ImageCollection("COPERNICUS/DEM/GLO30").filterBounds(geometria).first().select("DEM")
+    terrain = ee.Terrain.products(dem_image)
+    aspect_rad = terrain.select("aspect").multiply(3.141592653589793 / 180)
+    ## seno y coseno de la orientacion para poder promediarla en forma circular
+    bandas = [dem_image.rename("dem"),
+              terrain.select("slope"),
+              terrain.select("aspect"),
+              aspect_rad.sin().rename("aspect_sin"),
+              aspect_rad.cos().rename("aspect_cos")]
+    for nombre, imagen in (capas_extra or {}).items():
+        bandas.append(imagen.rename(nombre))
+    return ee.Image.cat(bandas)
+
+
+def reductor_combinado():
+    """Media, desviacion estandar y minimo/maximo en una sola reduccion (columnas {banda}_{estadistico})."""
+    return ee.Reducer.mean() \
+             .combine(ee.Reducer.stdDev(), sharedInputs=True) \
+             .combine(ee.Reducer.minMax(), sharedInputs=True)
+
+
+def process_image_cells(image, fc, reducer=None):
     """
     Returns satellite image reduced to rhealpix grid cells in a feature collection.
 
     Parameters
     ----------
     image: ee.Image
-        GEE image containing satellite data.
+        GEE image containing satellite data (una o varias bandas).
     fc: ee.FeatureCollection
         GEE feature collection containing rhealpix grid cells.
+    reducer: ee.Reducer or None
+        Por defecto ee.Reducer.mean().
     """
 
     scale_reprojection = 30. # used scale from docs
@@ -27,7 +72,7 @@ def process_image_cells(image, fc):
 
     fc_reduced = image.reduceRegions(
         collection = fc,
-        reducer = ee.Reducer.mean(),
+        reducer = reducer or ee.Reducer.mean(),
         scale = scale_reprojection
     )
 
@@ -36,10 +81,42 @@ def process_image_cells(image, fc):
     return df
 
 
+def reducir_por_paginas(image, gdf_celdas, reducer, celdas_por_pagina=CELDAS_POR_PAGINA, n_hilos=4):
+    """
+    Reduce la imagen sobre las celdas en paginas de `celdas_por_pagina`, consultadas en paralelo.
+
+    Returns
+    -------
+    DataFrame
+        Una fila por celda con las propiedades de las celdas y las columnas del reductor.
+    """
+    paginas = [gdf_celdas.iloc[i:i + celdas_por_pagina] for i in range(0, len(gdf_celdas), celdas_por_pagina)]
+    print(f"{len(gdf_celdas)} celdas en {len(paginas)} consulta(s)")
+
+    def reducir(pagina):
+        return process_image_cells(image, geemap.geopandas_to_ee(pagina), reducer)
+
+    with ThreadPoolExecutor(max_workers=n_hilos) as pool:
+        partes = list(pool.map(reducir, paginas))
+    return pd.concat(partes, ignore_index=True)
+
+
+def orientacion_circular(df):
+    """Orientacion media circular (grados) desde las medias de seno y coseno; R = longitud resultante."""
+    s, c = df["aspect_sin_mean"], df["aspect_cos_mean"]
+    df["aspect_circ"] = np.degrees(np.arctan2(s, c)) % 360
+    df["aspect_R"] = np.hypot(s, c)
+    return df.drop(columns=[col for col in df.columns if col.startswith(("aspect_sin_", "aspect_cos_"))])
+
+
 #####################################################################################
 
 # area 
-gdf = gpd.read_file("data/procesado/grilla/areas_grilla_healpix.geojson")
+gdf = leer("data/procesado/grilla/areas_grilla_healpix")
+
+## capas adicionales a reducir junto al terreno, p.ej.
+## {'cobertura': ee.ImageCollection("ESA/WorldCover/v200").first().select("Map")}
+CAPAS_EXTRA = {}
 
 zonas = gdf['zona'].unique()
 
@@ -48,38 +125,18 @@ for z in zonas:
 
     # Filtrar celdas de la zona
     gdf_z = gdf[gdf['zona'] == z]
-    fc = geemap.geopandas_to_ee(gdf_z)
+    zona_ee = ee.Geometry.Rectangle(list(gdf_z.total_bounds))
 
-    # ---------- DEM ----------
-    dem_image = ee.ImageCollection("COPERNICUS/DEM/GLO30").filterBounds(fc).first().select("DEM")
-    print(f"Reduciendo DEM ...")
-    df_dem = process_image_cells(dem_image, fc)
-    df_dem = df_dem.rename(columns = {'mean':'dem'})
-    
-    # ---------- Slope ----------
-    terrain = ee.Terrain.products(dem_image)
-    slope_image = terrain.select("slope")
-    print(f"Reduciendo pendiente ...")
-    df_slope = process_image_cells(slope_image, fc)
-    df_slope = df_slope.rename(columns = {'mean':'slope'})
-    
-    # ---------- Aspect ----------
-    aspect_image = terrain.select("aspect")
-    print(f"Reduciendo orientación...")
-    df_aspect = process_image_cells(aspect_image, fc)
-    df_aspect = df_aspect.rename(columns = {'mean':'aspect'})
-
-    df_merge = df_dem.merge(df_slope,
-                            on=['Codigo', 'zona'],
-                            how="inner").merge(
-                                df_aspect,
-                                on=['Codigo', 'zona'],
-                                how="inner"
-                                )
-    
-    gdf_z = gdf_z.merge(df_merge, on=['Codigo', 'zona'], how = 'left')
+    # ---------- DEM, pendiente y orientacion (una imagen, un reductor) ----------
+    print(f"Reduciendo DEM, pendiente y orientación ...")
+    imagen = imagen_terreno(zona_ee, CAPAS_EXTRA)
+    df_terreno = reducir_por_paginas(imagen, gdf_z[['Codigo', 'zona', 'geometry']], reductor_combinado())
+    df_terreno = orientacion_circular(df_terreno)
+    df_terreno = df_terreno.rename(columns = {'dem_mean':'dem', 'slope_mean':'slope', 'aspect_mean':'aspect'})
+
+    gdf_z = gdf_z.merge(df_terreno, on=['Codigo', 'zona'], how = 'left')
     print(gdf_z.head())
-    gdf_z.to_file(f'data/procesado/DEM/dem_{z}.geojson')
+    escribir(gdf_z, 'data/procesado/DEM/dem_healpix', particiones=['zona'])
     
 
 
@@ -1,151 +1,31 @@
 import ee
 import geemap
 import geopandas as gpd
-import pandas as pd
-import numpy as np
 
-from shapely.geometry import box
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'procesamiento'))
+from almacenamiento import escribir, leer, RUTA_UNION
+from pesos_area import remapear_arreglo
+from cache_era5 import actualizar_cache, valores_pasadas
+from grilla_era5 import grilla_recuadros
+from meteorologia import cubo_meteorologico, derivar, a_largo, DERIVADAS_ERA5
 
 ee.Authenticate()  
 ee.Initialize(project='tesis-incendios')
 
-################################################################################
-
-def process_era5_cells(fecha_objetivo, fc, variables=None):
-    """
-    Descarga datos de ERA5-Land Hourly desde GEE, reducidos sobre la grilla HealPix.
-
-    Parameters
-    ----------
-    fecha_objetivo : str or ee.Date
-        Fecha en formato 'YYYY-MM-DD HH:MM' UTC para consultar ERA5.
-    fc : ee.FeatureCollection
-        Grilla HealPix de interés (FeatureCollection).
-    variables : list or None
-        Lista de variables a extraer (bandas). Si None, usa variables por defecto.
-
-    Returns
-    -------
-    df : GeoDataFrame
-        DataFrame con valores promedio de ERA5-Land en cada celda HealPix.
-    """
-    if isinstance(fecha_objetivo, str):
-        fecha_objetivo = ee.Date(fecha_objetivo)
-
-    if variables is None:
-        variables = [
-            'u_component_of_wind_10m',
-            'v_component_of_wind_10m',
-            'temperature_2m',
-            'dewpoint_temperature_2m'
-        ]
-
-    era5 = ee.ImageCollection("ECMWF/ERA5_LAND/HOURLY") \
-                .filterDate(fecha_objetivo, fecha_objetivo.advance(1, 'hour')) \
-                .select(variables) \
-                .first()
-
-    scale_reprojection = 9000 
-
-    # reducir a la grilla (no healphix porque produce NAs)
-    fc_reduced = era5.reduceRegions(
-        collection=fc,
-        reducer=ee.Reducer.mean(),
-        scale=scale_reprojection
-    )
- 
-    # to GeoDataFrame
-    df = geemap.ee_to_df(fc_reduced)
-    
-    # add fecha
-    df["date_time"] = fecha_objetivo.getInfo()['value'] / 1000  # epoch seconds
-    df["date_time"] = pd.to_datetime(df["date_time"], unit='s', utc=True)
-
-    return df
-
-
-def intersect_ponderado_area(gdf_fecha, area_filtrado, variables = ['dewpoint_temperature_2m',
-                                                                    'temperature_2m',
-                                                                    'u_component_of_wind_10m',
-                                                                    'v_component_of_wind_10m'
-                                                                    ]
-                             ):
-    """
-    Realiza la intersección ponderada por área de los valores de ERA5
-    sobre las celdas HealPix de área_filtrado.
-    
-    Parameters:
-    ----------
-    gdf_fecha : GeoDataFrame
-        GeoDataFrame con polígonos de ERA5 y valores climáticos.
-    area_filtrado : GeoDataFrame
-        GeoDataFrame con la grilla HealPix de áreas pequeñas.
-    variables : list of str
-        Lista de nombres de columnas con variables climáticas a ponderar.
-    
-    Returns:
-    --------
-    GeoDataFrame
-        area_filtrado con columnas de variables ponderadas.
-    """
-    crs_proj = area_filtrado.estimate_utm_crs()
-    gdf_fecha_proj = gdf_fecha.to_crs(crs_proj)
-    area_filtrado_proj = area_filtrado.to_crs(crs_proj)
-
-    inter = gpd.overlay(area_filtrado_proj, gdf_fecha_proj, how='intersection')
-    inter['area_inter'] = inter.geometry.area
-
-    area_filtrado_proj['area_celda'] = area_filtrado_proj.geometry.area
-    
-    if "area_celda" in inter.columns:
-        inter = inter.drop(columns=["area_celda"])
-    
-    inter = inter.merge(area_filtrado_proj[['Codigo', 'area_celda']], on='Codigo', how='left')
-
-    ## ponderar por interseccion area
-    inter['peso'] = inter['area_inter'] / inter['area_celda']
-    
-    for var in variables:
-        inter[f'{var}_pond'] = inter[var] * inter['peso']
-
-    agregados = (
-        inter.groupby('Codigo')[[f'{var}_pond' for var in variables]]
-        .sum()
-        .reset_index()
-    )
-
-    # promedio ponderado
-    suma_pesos = (
-        inter.groupby('Codigo')['peso']
-        .sum()
-        .reset_index()
-        .rename(columns={'peso': 'peso_total'})
-    )
-    agregados = agregados.merge(suma_pesos, on='Codigo', how='left')
-    
-    for var in variables:
-        agregados[f'{var}_ponderado'] = agregados[f'{var}_pond'] / agregados['peso_total']
-
-    resultado = area_filtrado.merge(
-        agregados[['Codigo'] + [f'{var}_ponderado' for var in variables]],
-        on='Codigo',
-        how='left'
-    )
-
-    return resultado
-
-
-
 #######################################################
 
-fecha_noaa1 = gpd.read_file('data/procesado/satellite_data/union/zonas_noaa1.geojson')[['zona', 'date_time']].drop_duplicates()
-fecha_noaa2 = gpd.read_file('data/procesado/satellite_data/union/zonas_noaa2.geojson')[['zona', 'date_time']].drop_duplicates()
-fecha_suomi = gpd.read_file('data/procesado/satellite_data/union/zonas_suomi.geojson')[['zona', 'date_time']].drop_duplicates()
-
-fechas_gen = pd.concat([fecha_noaa1, fecha_noaa2, fecha_suomi]).reset_index(drop = True)
+## solo las columnas zona/date_time de la union (sin geometria)
+fechas_gen = leer(RUTA_UNION,
+                  columnas=['zona', 'date_time'],
+                  filtros=[('satelite', 'in', ['noaa1', 'noaa2', 'suomi'])]).drop_duplicates().reset_index(drop = True)
 fechas_gen['fecha_gee'] = fechas_gen.date_time.dt.strftime('%Y-%m-%dT%H:00')
 
-areas = gpd.read_file("data/procesado/grilla/areas_grilla_healpix.geojson")
+## True: ERA5 interpolado al minuto de cada pasada (date_time = pasada); False: hora truncada (date_time = hora)
+INTERPOLAR_PASADA = False
+
+areas = leer("data/procesado/grilla/areas_grilla_healpix")
 
 zonas =  areas['zona'].unique()
 path_save = 'data/procesado/era5'
@@ -153,91 +33,51 @@ path_save = 'data/procesado/era5'
 for zona in zonas:
     print(zona + '--------------------')
     
-    fechas = fechas_gen[fechas_gen['zona']== zona]['fecha_gee'].unique()
+    fechas = fechas_gen[fechas_gen['zona']== zona]['date_time' if INTERPOLAR_PASADA else 'fecha_gee'].unique()
     gdf_zona = areas[areas['zona'] ==zona]
     
-    ## transformamos area y generamos recuadros mas grandes pues genera valores validos (no hay NAs)
-    gdf_zona_utm = gdf_zona.to_crs(gdf_zona.estimate_utm_crs())
-    minx, miny, maxx, maxy = gdf_zona_utm.total_bounds
-
-    grid_polygons = []
-    grid_size = 1035 #1090 #1100 
-
-    x_left = minx
-    while x_left < maxx:
-        y_bottom = miny
-        while y_bottom < maxy:
-            x_right = x_left + grid_size
-            y_top = y_bottom + grid_size
-            grid_polygons.append(box(x_left, y_bottom, x_right, y_top))
-            y_bottom += grid_size
-        x_left += grid_size
-
-    grid_gdf = gpd.GeoDataFrame({"geometry": grid_polygons}, crs=gdf_zona_utm.crs)
-    grid_gdf['id'] = range(0, grid_gdf.shape[0])   # id para mapear posteriormente las coords
+    ## recuadros mas grandes (en UTM) pues generan valores validos (no hay NAs); solo los que tocan la zona,
+    ## con ids estables y guardados en cache por zona
+    grid_gdf = grilla_recuadros(gdf_zona, zona)
     
     ## to fc
     fc = geemap.geopandas_to_ee(grid_gdf)
 
-    lista_gdf = []
-    for fecha in fechas:
-        print(fecha)
-        df = process_era5_cells(fecha, fc)
-        df = grid_gdf.merge(df, on = 'id', how = 'left')
-        
-        print(df.isna().sum())
-        
-        lista_gdf.append(df)
-
-    gdf_final = pd.concat(lista_gdf, ignore_index=True)
-    gdf_final = gpd.GeoDataFrame(gdf_final, geometry='geometry', crs=lista_gdf[0].crs).drop(['id'], axis = 1)
+    ## solo se piden a GEE (en una consulta) las horas que no estan en el cache local de la grilla
+    cache = actualizar_cache(fechas, grid_gdf, fc, path_save+'/cache_era5', interpolar=INTERPOLAR_PASADA)
+    df = valores_pasadas(cache, fechas, interpolar=INTERPOLAR_PASADA)
+    print(df.isna().sum())
     
-    gdf_final.to_file(path_save+f'/info_era5_{zona}_grilla.geojson')
+    gdf_final = grid_gdf.merge(df, on = 'id', how = 'right')
+    gdf_final = gpd.GeoDataFrame(gdf_final, geometry='geometry', crs=grid_gdf.crs).drop(['id'], axis = 1)
+    
+    gdf_final['zona'] = zona
+    escribir(gdf_final, path_save+'/info_era5_grilla', particiones=['zona'])
 
 
 
 for zona in zonas:
     
     print(zona +'---------------------')
-    gdf = gpd.read_file(path_save+f'/info_era5_{zona}_grilla.geojson')
+    gdf = leer(path_save+'/info_era5_grilla', filtros=[('zona', '==', zona)]).drop(columns='zona')
     area_filtrado = areas[areas['zona'] == zona]
     
-    fechas = gdf['date_time'].unique()
+    ## todas las fechas en un producto matriz dispersa; los pesos de la zona se calculan una vez y quedan en cache
+    variables = ['dewpoint_temperature_2m',
+                 'temperature_2m',
+                 'u_component_of_wind_10m',
+                 'v_component_of_wind_10m'
+                 ]
+    valores, fechas = remapear_arreglo(gdf, area_filtrado, variables, nan_como_cero=True)
     
-    lista_gdf = []
-    for fecha in fechas:
-        print(fecha)
-        gdf_fecha = gdf[gdf['date_time'] == fecha]
-        
-        gdf_inter = intersect_ponderado_area(gdf_fecha, area_filtrado)
-
-        gdf_inter['date_time'] = fecha
-        
-        ## velocidad del viento
-        gdf_inter['wind_speed_10m'] = (gdf_inter['u_component_of_wind_10m_ponderado']**2 + gdf_inter['v_component_of_wind_10m_ponderado']**2) ** 0.5
-        ## direccion del viento
-        gdf_inter['wind_dir_10m'] = (np.degrees(np.arctan2(-gdf_inter['u_component_of_wind_10m_ponderado'],-gdf_inter['v_component_of_wind_10m_ponderado'])) + 360) % 360
-
-        ## humedad relativa:
-        es_Td = 6.112 * np.exp((17.67 * (gdf_inter['dewpoint_temperature_2m_ponderado'] - 273.15)) / (gdf_inter['dewpoint_temperature_2m_ponderado'] - 29.65))
-        es_T = 6.112 * np.exp((17.67 * (gdf_inter['temperature_2m_ponderado'] - 273.15)) / (gdf_inter['temperature_2m_ponderado'] - 29.65))
-
-        gdf_inter['relative_humidity'] = 100 * es_Td / es_T
-        
-        ## Deficit de presion de vapor
-        gdf_inter['VPD'] = es_T - es_Td
-        
-        ## transformacion a grados
-        gdf_inter['temperature_2m_C'] = gdf_inter['temperature_2m_ponderado'] - 273.15
-        gdf_inter['dewpoint_temperature_2m_ponderado'] = gdf_inter['dewpoint_temperature_2m_ponderado'] - 273.15
-        
-        lista_gdf.append(gdf_inter)
-
-
-    gdf_final = pd.concat(lista_gdf, ignore_index=True)
-    gdf_final = gpd.GeoDataFrame(gdf_final, geometry='geometry', crs=lista_gdf[0].crs)
+    ## cubo fecha x celda (sin geometria): viento, humedad relativa, VPD y grados Celsius en una pasada
+    cubo = cubo_meteorologico(valores, fechas, area_filtrado['Codigo'], [f'{var}_ponderado' for var in variables])
+    derivar(cubo, DERIVADAS_ERA5)
+    
+    ## la geometria de cada celda se une por Codigo solo al exportar
+    gdf_final = a_largo(cubo, geometria=area_filtrado)
     
-    gdf_final.to_file(path_save+f'/era5_{zona}_healpix.geojson')
+    escribir(gdf_final, path_save+'/era5_healpix', particiones=['zona'])
 
 
 
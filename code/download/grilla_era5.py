@@ -0,0 +1,128 @@
+"""
+Grilla auxiliar de recuadros (1035 m en UTM) sobre la que se reduce ERA5-Land en GEE.
+
+Los recuadros se construyen en arreglos (shapely.box sobre las esquinas) con el mismo orden e ids que el doble
+while original (x exterior, y interior; las esquinas se acumulan con np.cumsum, que suma en el mismo orden y da
+los mismos flotantes). Solo se conservan los recuadros que tocan alguna celda de la zona (STRtree), conservando
+su id de la grilla completa, por lo que se envian menos features a GEE.
+
+La grilla queda en cache por zona (data/procesado/era5/grilla_recuadros/zona={zona}/{firma}.parquet, firma de
+las celdas y del tamaño), de modo que las corridas siguientes, el cache de cache_era5 y las matrices de pesos de
+pesos_area reutilizan exactamente la misma geometria e ids.
+"""
+from pathlib import Path
+import hashlib
+import sys
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'procesamiento'))
+from almacenamiento import escribir, leer, ruta_particion
+
+RUTA_GRILLA = 'data/procesado/era5/grilla_recuadros'
+TAMAÑO_RECUADRO = 1035
+
+
+def esquinas(inicio, fin, paso):
+    """Valores inicio, inicio+paso, ... menores que fin, sumados uno a uno como en el while original."""
+    n = int(np.ceil((fin - inicio) / paso)) + 1
+    valores = np.cumsum(np.concatenate([[inicio], np.full(n, float(paso))]))
+    return valores[valores < fin]
+
+
+def recuadros(bounds, paso=TAMAÑO_RECUADRO):
+    """
+    Recuadros que cubren bounds, en el orden del doble while (x exterior, y interior).
+
+    Returns
+    -------
+    ndarray of shapely.Polygon
+        El indice de cada recuadro es su id.
+    """
+    minx, miny, maxx, maxy = bounds
+    xs, ys = np.meshgrid(esquinas(minx, maxx, paso), esquinas(miny, maxy, paso), indexing='ij')
+    xs, ys = xs.ravel(), ys.ravel()
+    return shapely.box(xs, ys, xs + paso, ys + paso)
+
+
+def _firma(gdf_utm, paso):
+    h = hashlib.sha1(f'{gdf_utm.crs}|{paso}'.encode())
+    h.update(b''.join(shapely.to_wkb(gdf_utm.geometry.values)))
+    return h.hexdigest()[:16]
+
+
+def grilla_recuadros(gdf_zona, zona, paso=TAMAÑO_RECUADRO, ruta=RUTA_GRILLA):
+    """
+    Recuadros de ERA5 que intersectan las celdas de una zona, en el UTM de la zona.
+
+    Parameters
+    ----------
+    gdf_zona : GeoDataFrame
+        Celdas HealPix de la zona.
+    zona : str
+        Nombre de la zona (particion del cache).
+    paso : float
+        Lado del recuadro en metros.
+    ruta : str or None
+        Dataset del cache (None: sin cache).
+
+    Returns
+    -------
+    GeoDataFrame
+        Columnas geometry e id (posicion en la grilla completa).
+    """
+    gdf_utm = gdf_zona.to_crs(gdf_zona.estimate_utm_crs())
+    firma = _firma(gdf_utm, paso)
+    archivo = ruta_particion(ruta, {'zona': zona}) / f'{firma}.parquet' if ruta else None
+    if archivo is not None and archivo.exists():
+        return leer(archivo)
+
+    cajas = recuadros(gdf_utm.total_bounds, paso)
+    usadas, _ = shapely.STRtree(gdf_utm.geometry.values).query(cajas, predicate='intersects')
+    ids = np.unique(usadas)
+    print(f'{zona}: {len(ids)} de {len(cajas)} recuadros tocan la zona')
+
+    grid_gdf = gpd.GeoDataFrame({'id': ids}, geometry=cajas[ids], crs=gdf_utm.crs)
+    if archivo is not None:
+        escribir(grid_gdf.assign(zona=zona), ruta, particiones=['zona'], nombre=firma)
+    return grid_gdf
+
+
+if __name__ == "__main__":
+    ## comparacion con el doble while de gee_era5.py (misma geometria e ids en los recuadros conservados)
+    import time
+    from shapely.geometry import box
+    from celdas_healpix import grilla_region, a_geodataframe
+
+    ## zona en L sobre la grilla nivel 10 (el rectangulo que la contiene tiene recuadros vacios)
+    codigos, coords = grilla_region((-94.95, 35.75, -94.55, 36.15), nivel=10, ruta_cache=None)
+    celdas = a_geodataframe(codigos, coords)
+    lon, lat = coords[:, :4].mean(axis=1).T
+    for zona, gdf_zona in [('L', celdas[(lon < -94.85) | (lat < 35.85)]), ('completa', celdas)]:
+
+        gdf_zona_utm = gdf_zona.to_crs(gdf_zona.estimate_utm_crs())
+        minx, miny, maxx, maxy = gdf_zona_utm.total_bounds
+
+        t = time.perf_counter()
+        grid_polygons = []
+        grid_size = TAMAÑO_RECUADRO
+        x_left = minx
+        while x_left < maxx:
+            y_bottom = miny
+            while y_bottom < maxy:
+                grid_polygons.append(box(x_left, y_bottom, x_left + grid_size, y_bottom + grid_size))
+                y_bottom += grid_size
+            x_left += grid_size
+        t_while = time.perf_counter() - t
+
+        t = time.perf_counter()
+        cajas = recuadros(gdf_zona_utm.total_bounds)
+        t_arreglos = time.perf_counter() - t
+        grid_gdf = grilla_recuadros(gdf_zona, zona, ruta=None)
+
+        iguales = all(shapely.equals_exact(grid_polygons[i], g, tolerance=0)
+                      for i, g in zip(grid_gdf['id'], grid_gdf.geometry))
+        print(f'{zona}: while {t_while * 1000:.1f} ms vs arreglos {t_arreglos * 1000:.1f} ms ({len(cajas)} recuadros), '
+              f'{len(grid_gdf)} se envian a GEE, misma geometria e id: {iguales}')
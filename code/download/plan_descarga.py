@@ -0,0 +1,175 @@
+"""
+Plan de descarga de granulos VIIRS por pares (bandas + geolocalizacion).
+
+Antes de descargar se listan ambos productos de cada satelite en la API de LAADS, se unen por la
+clave del granulo (A2025102.0818.002) y se descartan los granulos huerfanos (sin su par) y los
+que, aunque caen en el bbox, no tocan el poligono de la zona segun su huella real (GRing de CMR).
+El plan resultante (CSV) alimenta a `descargar_archivos` y a procesamiento_nc.py.
+"""
+from pathlib import Path
+import os
+import re
+
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Polygon
+from dotenv import load_dotenv
+
+from descarga_api import (PRODUCTOS, carpetas_productos, crear_sesion, descargar_archivos,
+                          get_con_reintentos, listar_archivos, polygon_to_bbox_format)
+
+CMR_URL = "https://cmr.earthdata.nasa.gov/search/granules.json"
+regex = re.compile(r"A\d{7}\.\d{4}\.\d{3}")
+
+
+def productos_satelite(satelite):
+    """(producto_bandas, producto_coords) de un satelite ('SUOMI', 'NOAA1', 'NOAA2')."""
+    bandas = [p for p, (s, c) in PRODUCTOS.items() if s == satelite and c == 'BANDAS']
+    coords = [p for p, (s, c) in PRODUCTOS.items() if s == satelite and c == 'COORDS']
+    return bandas[0], coords[0]
+
+
+def _polygon_cmr(entry):
+    """Huella del granulo desde una entrada de CMR ('polygons' = "lat lon lat lon ...", o 'boxes' = "S W N E")."""
+    if entry.get('polygons'):
+        valores = [float(v) for v in entry['polygons'][0][0].split()]
+        return Polygon(list(zip(valores[1::2], valores[0::2])))
+    if entry.get('boxes'):
+        s, w, n, e = (float(v) for v in entry['boxes'][0].split())
+        return Polygon([(w, s), (e, s), (e, n), (w, n)])
+    return None
+
+
+def huellas_cmr(sesion, short_name, start_date, end_date, bounds):
+    """
+    Huella real (GRing) de cada granulo del producto en CMR, por clave.
+    bounds: (minx, miny, maxx, maxy) de la zona, para acotar la busqueda.
+    """
+    params = {
+        'short_name': short_name,
+        'temporal': f'{start_date}T00:00:00Z,{end_date}T23:59:59Z',
+        'bounding_box': ','.join(str(v) for v in bounds),
+        'page_size': 2000,
+    }
+    huellas = {}
+    headers = {}
+    while True:
+        # CMR es publico: no se envia el token de LAADS
+        response = get_con_reintentos(sesion, CMR_URL, params=params, headers={**headers, 'Authorization': None})
+        if response.status_code != 200:
+            print(f"⚠️ Error al consultar CMR ({short_name}): {response.status_code}")
+            break
+        entries = response.json().get('feed', {}).get('entry', [])
+        for entry in entries:
+            m = regex.search(entry.get('producer_granule_id') or entry.get('title', ''))
+            huella = _polygon_cmr(entry)
+            if m and huella is not None:
+                huellas[m.group()] = huella
+        search_after = response.headers.get('CMR-Search-After')
+        if not entries or not search_after:
+            break
+        headers = {'CMR-Search-After': search_after}
+    return huellas
+
+
+def planificar_descarga(sesion, geom, start_date, end_date, satelites=('SUOMI', 'NOAA1', 'NOAA2'), base='datos-viirs'):
+    """
+    Plan de descarga con solo los pares completos cuya huella toca la zona.
+
+    Parameters
+    ----------
+    sesion : requests.Session
+        Sesion autenticada (crear_sesion).
+    geom : shapely Polygon or MultiPolygon
+        Zona de interes en EPSG:4326.
+    start_date, end_date : str
+        Rango de fechas "YYYY-MM-DD".
+    satelites : iterable of str
+        Satelites a planificar.
+    base : str
+        Carpeta raiz de descarga ({base}/{SATELITE}/{BANDAS|COORDS}).
+
+    Returns
+    -------
+    DataFrame
+        Una fila por granulo con urls, tamaños, md5 y rutas locales de ambos archivos.
+        La columna 'intersecta' indica si la huella toca la zona; 'con_huella' si CMR la entrego
+        (sin huella se conserva el granulo, pues el bbox de LAADS ya lo selecciono).
+    """
+    bbox_str, _ = polygon_to_bbox_format(geom)
+    carpetas = carpetas_productos(base)
+
+    filas = []
+    for satelite in satelites:
+        prod_b, prod_c = productos_satelite(satelite)
+        bandas = {regex.search(f['name']).group(): f for f in listar_archivos(sesion, prod_b, start_date, end_date, bbox_str)
+                  if regex.search(f['name'])}
+        coords = {regex.search(f['name']).group(): f for f in listar_archivos(sesion, prod_c, start_date, end_date, bbox_str)
+                  if regex.search(f['name'])}
+        claves = sorted(bandas.keys() & coords.keys())
+        print(f"{satelite}: {len(claves)} pares, {len(bandas.keys() - coords.keys())} bandas sin coords, "
+              f"{len(coords.keys() - bandas.keys())} coords sin bandas")
+
+        huellas = huellas_cmr(sesion, prod_c, start_date, end_date, geom.bounds)
+        for clave in claves:
+            b, c = bandas[clave], coords[clave]
+            huella = huellas.get(clave)
+            filas.append({
+                'clave': clave,
+                'satelite': satelite,
+                'producto_bandas': prod_b,
+                'producto_coords': prod_c,
+                'url_bandas': b['downloadsLink'],
+                'url_coords': c['downloadsLink'],
+                'size_bandas': b.get('size'),
+                'size_coords': c.get('size'),
+                'md5_bandas': b.get('md5sum'),
+                'md5_coords': c.get('md5sum'),
+                'archivo_bandas': f"{carpetas[prod_b]}/{os.path.basename(b['downloadsLink'])}",
+                'archivo_coords': f"{carpetas[prod_c]}/{os.path.basename(c['downloadsLink'])}",
+                'con_huella': huella is not None,
+                'intersecta': huella is None or huella.intersects(geom),
+            })
+
+    plan = pd.DataFrame(filas)
+    if not plan.empty:
+        print(f"{(~plan['intersecta']).sum()} pares descartados por huella fuera de la zona")
+    return plan
+
+
+def archivos_del_plan(plan):
+    """Lista de archivos (formato de la API) de los pares del plan que tocan la zona, para descargar_archivos."""
+    archivos = []
+    for fila in plan[plan['intersecta']].itertuples():
+        for tipo in ['bandas', 'coords']:
+            size = getattr(fila, f'size_{tipo}')
+            md5 = getattr(fila, f'md5_{tipo}')
+            archivos.append({
+                'producto': getattr(fila, f'producto_{tipo}'),
+                'downloadsLink': getattr(fila, f'url_{tipo}'),
+                'size': None if pd.isna(size) else int(size),
+                'md5sum': None if pd.isna(md5) else md5,
+            })
+    return archivos
+
+
+
+#####################################################
+if __name__ == "__main__":
+    load_dotenv()
+    token = os.environ['token']
+
+    path_areas = Path('data/procesado/zonas_incendios/areas_buffer.geojson')
+    areas = gpd.read_file(path_areas)
+    zona = 'area2'
+    geom = areas[areas['zona'] == zona]['geometry'].iloc[0]
+
+    start_date = "2025-04-12"
+    end_date = "2025-04-22"
+
+    sesion = crear_sesion(token, n_conexiones=5)
+    plan = planificar_descarga(sesion, geom, start_date, end_date)
+    os.makedirs('datos-viirs', exist_ok=True)
+    plan.to_csv(f'datos-viirs/plan_{zona}.csv', index=False)
+
+    descargar_archivos(sesion, archivos_del_plan(plan), carpetas_productos('datos-viirs'), n_workers=4)
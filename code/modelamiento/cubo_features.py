@@ -0,0 +1,224 @@
+"""
+Cubo de features espacio-temporal (pasada x celda x variable) por zona, en Zarr.
+
+Alinea en la grilla HealPix las tres fuentes del proyecto:
+- VIIRS: agregados por celda y pasada (data/procesado/satellite_data/celdas_healpix, agregacion_celdas); define
+  el eje de tiempo (una posicion por pasada, con su satelite como coordenada).
+- ERA5: era5_healpix en el minuto de cada pasada, celda por celda: interpolado entre la hora truncada y la
+  siguiente cuando ambas estan, si no el valor de la hora truncada (ver alinear_era5).
+- DEM: variables estaticas (solo dimension Codigo); xarray las difunde al combinarlas con el resto.
+
+Cada zona es un store {ruta}/zona={zona}.zarr con chunks de PASADAS_POR_CHUNK pasadas y el eje Codigo fijo
+(toda la grilla de la zona), por lo que las pasadas nuevas se agregan al final (append_dim) sin reescribir.
+abrir_cubo abre el store en forma perezosa: seleccionar una ventana de tiempo solo lee esos chunks, y
+tensor() entrega el arreglo (pasada, celda, variable) listo para entrenar.
+
+    cubo = abrir_cubo('area2', inicio='2025-04-14', fin='2025-04-18')
+    X, variables = tensor(cubo)
+"""
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'procesamiento'))
+from almacenamiento import leer
+from meteorologia import cubo_desde_largo
+
+RUTA_CUBO = 'data/procesado/cubo'
+PASADAS_POR_CHUNK = 64
+HORA = 3600.0   # segundos entre fechas ERA5 consecutivas
+
+## productos de entrada
+RUTA_VIIRS = 'data/procesado/satellite_data/celdas_healpix'
+RUTA_ERA5 = 'data/procesado/era5/era5_healpix'
+RUTA_DEM = 'data/procesado/DEM/dem_celdas'
+RUTA_GRILLA = 'data/procesado/grilla/areas_grilla_healpix'
+
+NO_FEATURES = ('Codigo', 'zona', 'satelite', 'date_time', 'geometry', 'id_num')
+
+
+def _numericas(df):
+    return [c for c in df.columns if c not in NO_FEATURES and pd.api.types.is_numeric_dtype(df[c])]
+
+
+def pasadas_viirs(df, codigos, variables=None):
+    """
+    Agregados VIIRS como Dataset (date_time, Codigo) con coordenada satelite por pasada.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Salida de agregar_por_celda con columna 'satelite'.
+    codigos : array-like
+        Eje de celdas del cubo (las celdas sin pixeles quedan NaN).
+    """
+    variables = variables or _numericas(df)
+    df = df.assign(date_time=pd.to_datetime(df['date_time'], utc=True)).sort_values('date_time', kind='stable')
+    cubo = cubo_desde_largo(df, variables).reindex(Codigo=np.asarray(codigos))
+    satelite = df.drop_duplicates('date_time').set_index('date_time')['satelite']
+    return cubo.assign_coords(satelite=('date_time', satelite.loc[cubo.indexes['date_time']].to_numpy(dtype=str)))
+
+
+def _segundos(tiempos):
+    """Segundos desde 1970 (UTC) de un DatetimeIndex con zona horaria, sin depender de su resolucion."""
+    return ((tiempos - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64)
+
+
+def alinear_era5(df, tiempos, codigos, variables=None):
+    """
+    ERA5 por celda en cada tiempo de `tiempos`.
+
+    Se interpola linealmente entre la hora truncada de la pasada y la siguiente solo si ambas estan en ERA5
+    (a una hora); si no, queda el valor de la hora truncada. gee_era5 con INTERPOLAR_PASADA=False guarda solo
+    la hora truncada de cada pasada, y la siguiente fecha disponible puede estar a 12 h o a dias. NaN si la
+    hora truncada no esta en ERA5 (antes del inicio o mas de una hora despues de la ultima fecha anterior).
+
+    Returns
+    -------
+    xarray.Dataset
+        (date_time, Codigo) con los tiempos de las pasadas.
+    """
+    variables = variables or _numericas(df)
+    df = df.assign(date_time=pd.to_datetime(df['date_time'], utc=True))
+    era5 = cubo_desde_largo(df, variables).sortby('date_time').reindex(Codigo=np.asarray(codigos))
+
+    t_era5 = _segundos(era5.indexes['date_time'])
+    t = _segundos(pd.DatetimeIndex(tiempos).tz_convert('UTC'))
+    n = len(t_era5)
+    if n == 0:
+        vacio = np.full((len(t), len(codigos)), np.nan)
+        return xr.Dataset({var: (('date_time', 'Codigo'), vacio.copy()) for var in variables},
+                          coords={'date_time': pd.DatetimeIndex(tiempos), 'Codigo': np.asarray(codigos)})
+
+    ## ultima fecha ERA5 <= t: debe ser la hora truncada de la pasada (menos de una hora antes)
+    j = np.searchsorted(t_era5, t, side='right') - 1
+    dentro = (j >= 0) & (t - t_era5[np.maximum(j, 0)] < HORA)
+    j = np.maximum(j, 0)
+    siguiente = np.minimum(j + 1, n - 1)
+    consecutivas = (siguiente > j) & (t_era5[siguiente] - t_era5[j] <= HORA)
+    paso = np.where(consecutivas, t_era5[siguiente] - t_era5[j], 1.0)
+    peso = np.where(consecutivas & dentro, (t - t_era5[j]) / paso, 0.0)[:, None]
+
+    datos = {}
+    for var in variables:
+        arr = era5[var].values
+        v = arr[j] + peso * (arr[siguiente] - arr[j])
+        v[~dentro] = np.nan
+        datos[var] = (('date_time', 'Codigo'), v)
+    return xr.Dataset(datos, coords={'date_time': pd.DatetimeIndex(tiempos), 'Codigo': np.asarray(codigos)})
+
+
+def estaticas_dem(df, codigos, variables=None):
+    """Variables de terreno por celda como Dataset (Codigo,)."""
+    variables = variables or _numericas(df)
+    tabla = df.drop_duplicates('Codigo').set_index('Codigo').reindex(np.asarray(codigos))
+    return xr.Dataset({var: ('Codigo', tabla[var].to_numpy(dtype=float)) for var in variables},
+                      coords={'Codigo': np.asarray(codigos)})
+
+
+def construir_cubo(viirs, era5, dem, codigos, prefijos=('viirs_', 'era5_', 'dem_')):
+    """
+    Cubo de una zona a partir de las tablas largas de cada fuente (cualquiera puede ser None).
+
+    Las variables se prefijan por fuente para no mezclar nombres (p.ej. 'era5_relative_humidity').
+    """
+    partes = []
+    cubo = pasadas_viirs(viirs, codigos)
+    partes.append(cubo.rename({v: prefijos[0] + v for v in cubo.data_vars}))
+    tiempos = cubo.indexes['date_time']
+    if era5 is not None:
+        alineado = alinear_era5(era5, tiempos, codigos)
+        partes.append(alineado.rename({v: prefijos[1] + v for v in alineado.data_vars}))
+    if dem is not None:
+        estatico = estaticas_dem(dem, codigos)
+        partes.append(estatico.rename({v: prefijos[2] + v for v in estatico.data_vars}))
+    return xr.merge(partes, compat='override', join='left')
+
+
+def _ruta_zona(zona, ruta):
+    return Path(ruta) / f'zona={zona}.zarr'
+
+
+def guardar_cubo(cubo, zona, ruta=RUTA_CUBO):
+    """
+    Crea el store de la zona o agrega al final las pasadas que aun no tiene (las estaticas se escriben una vez).
+
+    Returns
+    -------
+    int
+        Pasadas escritas.
+    """
+    path = _ruta_zona(zona, ruta)
+    ## fechas sin zona horaria (UTC) y textos de largo variable para Zarr
+    cubo = cubo.assign_coords(date_time=cubo.indexes['date_time'].tz_convert('UTC').tz_localize(None),
+                              Codigo=cubo['Codigo'].values.astype(object),
+                              satelite=('date_time', cubo['satelite'].values.astype(object)))
+    if not path.exists():
+        encoding = {var: {'chunks': (PASADAS_POR_CHUNK, cubo.sizes['Codigo']) if cubo[var].ndim == 2
+                          else (cubo.sizes['Codigo'],)} for var in cubo.data_vars}
+        cubo.to_zarr(path, mode='w', consolidated=False, encoding=encoding)
+        return cubo.sizes['date_time']
+
+    existentes = xr.open_zarr(path, chunks=None, consolidated=False).indexes['date_time']
+    nuevas = cubo.sel(date_time=~cubo.indexes['date_time'].isin(existentes))
+    nuevas = nuevas.sortby('date_time').drop_vars([v for v in nuevas.data_vars if 'date_time' not in nuevas[v].dims])
+    if nuevas.sizes['date_time']:
+        nuevas.to_zarr(path, append_dim='date_time', consolidated=False)
+    return nuevas.sizes['date_time']
+
+
+def abrir_cubo(zona, inicio=None, fin=None, variables=None, ruta=RUTA_CUBO):
+    """
+    Cubo de la zona sin cargarlo: la seleccion por tiempo y variables solo lee los chunks necesarios.
+
+    Parameters
+    ----------
+    inicio, fin : str or Timestamp or None
+        Ventana de tiempo (UTC, inclusive).
+    variables : list of str or None
+        Variables a conservar.
+    """
+    cubo = xr.open_zarr(_ruta_zona(zona, ruta), chunks=None, consolidated=False)
+    cubo = cubo.assign_coords(date_time=cubo.indexes['date_time'].tz_localize('UTC')).sortby('date_time')
+    if variables is not None:
+        cubo = cubo[variables]
+    if inicio is not None or fin is not None:
+        inicio = None if inicio is None else pd.Timestamp(inicio, tz='UTC')
+        fin = None if fin is None else pd.Timestamp(fin, tz='UTC')
+        cubo = cubo.sel(date_time=slice(inicio, fin))
+    return cubo
+
+
+def tensor(cubo, variables=None, dtype=np.float32):
+    """
+    Arreglo (pasada, celda, variable) del cubo, con las variables estaticas repetidas en cada pasada.
+
+    Returns
+    -------
+    X : ndarray
+    variables : list of str
+    """
+    variables = list(variables or cubo.data_vars)
+    forma = (cubo.sizes['date_time'], cubo.sizes['Codigo'])
+    X = np.empty(forma + (len(variables),), dtype=dtype)
+    for k, var in enumerate(variables):
+        X[:, :, k] = np.broadcast_to(cubo[var].transpose(..., 'Codigo').values, forma)
+    return X, variables
+
+
+if __name__ == "__main__":
+    ## construye (o actualiza con las pasadas nuevas) el cubo de cada zona desde los productos guardados
+    grilla = leer(RUTA_GRILLA, columnas=['Codigo', 'zona'])
+    for zona in grilla['zona'].unique():
+        codigos = np.sort(grilla.loc[grilla['zona'] == zona, 'Codigo'].to_numpy(dtype=str))
+        viirs = leer(RUTA_VIIRS, filtros=[('zona', '==', zona)])
+        era5 = leer(RUTA_ERA5, filtros=[('zona', '==', zona)]) if Path(RUTA_ERA5).exists() else None
+        dem = leer(RUTA_DEM, filtros=[('zona', '==', zona)]) if Path(RUTA_DEM).exists() else None
+
+        cubo = construir_cubo(pd.DataFrame(viirs), era5, dem, codigos)
+        n = guardar_cubo(cubo, zona)
+        print(f'{zona}: {n} pasadas nuevas, cubo {cubo.sizes["date_time"]} pasadas x {len(codigos)} celdas x '
+              f'{len(cubo.data_vars)} variables')
@@ -0,0 +1,359 @@
+"""
+Detector contextual de focos activos sobre las bandas I04/I05 de VIIRS (estilo VNP14IMG, Schroeder et al. 2014),
+vectorizado sobre el swath completo.
+
+Por pixel:
+1. Fuego absoluto: I04 saturado/muy caliente (umbrales fijos de dia y de noche).
+2. Candidato: I04 y ΔT = I04 - I05 sobre umbrales fijos.
+3. Prueba contextual del candidato contra el fondo de una ventana que crece de 11x11 a 31x31 hasta tener al
+   menos FRACCION_FONDO de pixeles validos y MIN_FONDO pixeles (sin mala calidad ni fuegos de fondo):
+       ΔT > media(ΔT) + 3.5 σ(ΔT),  ΔT > media(ΔT) + 6 K,  I04 > media(I04) + 3 σ(I04)
+       y de dia ademas I05 > media(I05) + σ(I05) - 4 K.
+Las pruebas por pixel solo se evaluan en los pixeles con I04 sobre el menor umbral de candidato. Las medias y
+desviaciones del fondo salen, sin loops por pixel, de:
+- pocos candidatos (estadisticas_fondo_vecinos): la ventana de 31x31 de cada candidato reunida con indices, con
+  capas y fondo evaluados solo ahi, y sumas por radio con un producto matricial;
+- muchos candidatos (estadisticas_fondo): tablas de sumas acumuladas (summed-area tables) sobre el rectangulo
+  que contiene los candidatos y una consulta O(1) por candidato y radio.
+No hay mascara de nubes/agua ni angulo solar en los productos del proyecto; dia/noche se decide por la hora
+solar local (es_dia).
+
+    fuego = detectar(I04, I05, valido, dia=True)      # 0 sin fuego, 1 contextual, 2 absoluto
+    celdas = fuego_por_celda(df_pixeles)              # focos por celda HealPix y pasada
+"""
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'procesamiento'))
+from agregacion_celdas import agregar_por_celda, CALIDAD_OK
+
+UMBRALES = {
+    'dia': {'absoluto_I04': 367.0, 'absoluto_I05': 290.0, 'candidato_I04': 325.0, 'candidato_dT': 25.0,
+            'fondo_I04': 325.0, 'fondo_dT': 20.0},
+    'noche': {'absoluto_I04': 320.0, 'absoluto_I05': 0.0, 'candidato_I04': 295.0, 'candidato_dT': 10.0,
+              'fondo_I04': 310.0, 'fondo_dT': 10.0},
+}
+RADIOS = (5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15)   # ventanas de 11x11 a 31x31
+FRACCION_FONDO = 0.25
+MIN_FONDO = 10
+REFERENCIA_K = 300.0   # se resta antes de acumular para no perder precision en las sumas de cuadrados
+
+
+def es_dia(fecha, lon):
+    """True si la hora solar local (UTC + lon/15) esta entre 6 y 18 h."""
+    fecha = pd.Timestamp(fecha)
+    fecha = fecha.tz_convert('UTC') if fecha.tzinfo else fecha
+    hora = (fecha.hour + fecha.minute / 60 + np.asarray(lon, dtype=float) / 15) % 24
+    return (hora >= 6) & (hora < 18)
+
+
+def tabla_sumas(x):
+    """Tabla de sumas acumuladas (n+1, m+1) con borde de ceros."""
+    S = np.zeros((x.shape[0] + 1, x.shape[1] + 1))
+    np.cumsum(x, axis=1, out=S[1:, 1:])
+    np.cumsum(S[1:, 1:], axis=0, out=S[1:, 1:])   # la suma por columnas al final recorre filas contiguas
+    return S
+
+
+def suma_ventana(S, filas, cols, radio):
+    """Suma en la ventana (2r+1)x(2r+1) centrada en cada pixel (filas, cols), recortada en los bordes del swath."""
+    n, m = S.shape[0] - 1, S.shape[1] - 1
+    f0, f1 = np.clip(filas - radio, 0, n), np.clip(filas + radio + 1, 0, n)
+    c0, c1 = np.clip(cols - radio, 0, m), np.clip(cols + radio + 1, 0, m)
+    return S[f1, c1] - S[f0, c1] - S[f1, c0] + S[f0, c0]
+
+
+def estadisticas_fondo(capas, fondo, filas, cols, radios=RADIOS, fraccion=FRACCION_FONDO, minimo=MIN_FONDO):
+    """
+    Media y desviacion de cada capa sobre los pixeles de fondo de la ventana de cada pixel (filas, cols), sin el
+    pixel central, usando el menor radio con fondo suficiente.
+
+    Las tablas de sumas se calculan una vez para todo el swath; cada ventana es una consulta de 4 valores,
+    por lo que el costo por pixel evaluado no depende del radio.
+
+    Returns
+    -------
+    medias, desviaciones : dict of ndarray
+        Un valor por pixel evaluado.
+    suficiente : ndarray of bool
+        False donde ni la ventana mas grande tiene fondo suficiente.
+    """
+    n_filas, n_cols = fondo.shape
+    S_n = tabla_sumas(fondo.astype(np.float64))
+    S = {k: tabla_sumas(np.where(fondo, v - REFERENCIA_K, 0.0)) for k, v in capas.items()}
+    S2 = {k: tabla_sumas(np.where(fondo, (v - REFERENCIA_K) ** 2, 0.0)) for k, v in capas.items()}
+    en_fondo = fondo[filas, cols]
+    centro = {k: np.where(en_fondo, v[filas, cols] - REFERENCIA_K, 0.0) for k, v in capas.items()}
+
+    elegido = np.zeros(len(filas), dtype=bool)
+    n_fondo = np.zeros(len(filas))
+    sumas = {k: np.zeros(len(filas)) for k in capas}
+    sumas2 = {k: np.zeros(len(filas)) for k in capas}
+    for radio in radios:
+        n = suma_ventana(S_n, filas, cols, radio) - en_fondo
+        total = ((np.minimum(filas + radio + 1, n_filas) - np.maximum(filas - radio, 0))
+                 * (np.minimum(cols + radio + 1, n_cols) - np.maximum(cols - radio, 0)) - 1)
+        ok = ~elegido & (n >= minimo) & (n >= fraccion * total)
+        n_fondo[ok] = n[ok]
+        for k in capas:
+            sumas[k][ok] = (suma_ventana(S[k], filas, cols, radio) - centro[k])[ok]
+            sumas2[k][ok] = (suma_ventana(S2[k], filas, cols, radio) - centro[k] ** 2)[ok]
+        elegido |= ok
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        medias = {k: sumas[k] / n_fondo + REFERENCIA_K for k in capas}
+        desviaciones = {k: np.sqrt(np.maximum(sumas2[k] / n_fondo - (sumas[k] / n_fondo) ** 2, 0)) for k in capas}
+    return medias, desviaciones, elegido
+
+
+def estadisticas_fondo_vecinos(pixeles, filas, cols, forma, radios=RADIOS, fraccion=FRACCION_FONDO,
+                               minimo=MIN_FONDO, lote=20000):
+    """
+    Lo mismo que estadisticas_fondo, reuniendo la ventana mas grande de cada pixel evaluado ((n, 2r+1, 2r+1) con
+    indices vectorizados) y sumando por radio con un producto matricial. Conviene cuando hay pocos candidatos
+    respecto del tamaño del swath: capas y fondo solo se evaluan en esas ventanas (costo proporcional a
+    candidatos x (2r+1)^2 en vez de a pixeles).
+
+    Parameters
+    ----------
+    pixeles : callable
+        pixeles(indices) -> (capas, fondo) en los pixeles de indices planos del swath (fila * n_cols + col):
+        dict de ndarray y ndarray of bool.
+    forma : tuple
+        (n_filas, n_cols) del swath.
+    """
+    r = max(radios)
+    d = np.arange(-r, r + 1)
+    anillo = np.maximum(np.abs(d)[:, None], np.abs(d)[None, :]).ravel()
+    ## pixel de la ventana -> ventana de radio k (acumulado por anillos), solo los radios pedidos
+    R = (anillo[:, None] <= np.asarray(radios)[None, :]).astype(np.float64)
+
+    n_filas, n_cols = forma
+    dentro_f = (filas[:, None] + d >= 0) & (filas[:, None] + d < n_filas)
+    dentro_c = (cols[:, None] + d >= 0) & (cols[:, None] + d < n_cols)
+    n_eval = len(filas)
+    medias, desviaciones = {}, {}
+    suficiente = np.zeros(n_eval, dtype=bool)
+    for i in range(0, n_eval, lote):
+        F = np.clip(filas[i:i + lote, None] + d, 0, n_filas - 1)
+        C = np.clip(cols[i:i + lote, None] + d, 0, n_cols - 1)
+        dentro = (dentro_f[i:i + lote, :, None] & dentro_c[i:i + lote, None, :]).reshape(len(F), -1)
+        capas, fondo = pixeles((F[:, :, None] * n_cols + C[:, None, :]).reshape(len(F), -1))
+        m = fondo & dentro
+        m[:, anillo == 0] = False   # sin el pixel central
+        n = m @ R
+        total = dentro @ R - 1
+        ok = (n >= minimo) & (n >= fraccion * total)
+        hay = ok.any(axis=1)
+        fila, elegido = np.arange(len(F)), np.argmax(ok, axis=1)
+        n_fondo = n[fila, elegido]
+        for k, v in capas.items():
+            x = np.where(m, v - REFERENCIA_K, 0.0)
+            suma = (x @ R)[fila, elegido]
+            suma2 = ((x * x) @ R)[fila, elegido]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                medias.setdefault(k, np.full(n_eval, np.nan))[i:i + lote] = np.where(
+                    hay, suma / n_fondo + REFERENCIA_K, np.nan)
+                desviaciones.setdefault(k, np.full(n_eval, np.nan))[i:i + lote] = np.sqrt(
+                    np.maximum(suma2 / n_fondo - (suma / n_fondo) ** 2, 0))
+        suficiente[i:i + lote] = hay
+    return medias, desviaciones, suficiente
+
+
+def detectar(I04, I05, valido=None, dia=True, umbrales=UMBRALES, radios=RADIOS):
+    """
+    Mascara de fuego de un swath (o ventana de swath).
+
+    Parameters
+    ----------
+    I04, I05 : ndarray
+        Temperaturas de brillo (K), 2D en la geometria del swath.
+    valido : ndarray of bool or None
+        Pixeles con buena calidad (por defecto los finitos).
+    dia : bool or ndarray of bool
+        Umbrales de dia o de noche (escalar o por pixel, ver es_dia).
+
+    Returns
+    -------
+    ndarray of int8
+        0 sin fuego, 1 fuego por prueba contextual, 2 fuego absoluto.
+    """
+    I04 = np.ascontiguousarray(I04, dtype=np.float64)
+    I05 = np.ascontiguousarray(I05, dtype=np.float64)
+    valido = None if valido is None else np.ascontiguousarray(valido, dtype=bool)
+    dia = np.asarray(dia, dtype=bool)
+    dia = np.ascontiguousarray(dia) if dia.ndim else dia
+
+    def en(x, region):
+        ## region: slices o indices por eje, o indices planos (ventanas de estadisticas_fondo_vecinos)
+        return x.ravel().take(region) if isinstance(region, np.ndarray) else x[region]
+
+    def umbral(nombre, region=()):
+        if dia.ndim == 0:
+            return umbrales['dia' if dia else 'noche'][nombre]
+        return np.where(en(dia, region), umbrales['dia'][nombre], umbrales['noche'][nombre])
+
+    def pixeles(region):
+        """Capas y mascara de fondo (validos, sin absolutos ni fuegos de fondo) en `region`."""
+        a, b = en(I04, region), en(I05, region)
+        dT = a - b
+        fondo = np.isfinite(a) & np.isfinite(b) & (en(fuego, region) != 2)
+        if valido is not None:
+            fondo &= en(valido, region)
+        fondo &= ~((a > umbral('fondo_I04', region)) & (dT > umbral('fondo_dT', region)))
+        return {'I04': a, 'I05': b, 'dT': dT}, fondo
+
+    ## absolutos y candidatos superan el umbral de candidato en I04: el resto de las pruebas solo sobre esos pixeles
+    regimenes = ['dia', 'noche'] if dia.ndim else ['dia' if dia else 'noche']
+    minimo_I04 = min(umbrales[k][n] for k in regimenes for n in ['absoluto_I04', 'candidato_I04'])
+    calientes = np.nonzero(I04 >= minimo_I04)
+    a, b = I04[calientes], I05[calientes]
+    dT = a - b
+    ok = np.isfinite(b) & (True if valido is None else valido[calientes])
+    absoluto = ok & (a >= umbral('absoluto_I04', calientes)) & (b > umbral('absoluto_I05', calientes))
+    candidato = ok & ~absoluto & (a > umbral('candidato_I04', calientes)) & (dT > umbral('candidato_dT', calientes))
+
+    fuego = np.zeros(I04.shape, dtype=np.int8)
+    fuego[calientes[0][absoluto], calientes[1][absoluto]] = 2
+    filas, cols = calientes[0][candidato], calientes[1][candidato]
+    if not len(filas):
+        return fuego
+
+    ## la prueba contextual solo se evalua en los candidatos, dentro del rectangulo que los contiene (+ ventana)
+    r = max(radios)
+    f0, c0 = max(filas.min() - r, 0), max(cols.min() - r, 0)
+    sub = (slice(f0, filas.max() + r + 1), slice(c0, cols.max() + r + 1))
+    area = (min(filas.max() + r + 1, I04.shape[0]) - f0) * (min(cols.max() + r + 1, I04.shape[1]) - c0)
+    if len(filas) * (2 * r + 1) ** 2 < area:
+        ## pocos candidatos: fondo y capas solo en sus ventanas
+        media, sigma, suficiente = estadisticas_fondo_vecinos(pixeles, filas, cols, I04.shape, radios)
+    else:
+        ## muchos: tablas de sumas sobre el recorte
+        capas, fondo = pixeles(sub)
+        media, sigma, suficiente = estadisticas_fondo(capas, fondo, filas - f0, cols - c0, radios)
+    x = {'I04': a[candidato], 'I05': b[candidato], 'dT': dT[candidato]}
+    dia_candidato = dia if dia.ndim == 0 else dia[filas, cols]
+    contextual = (suficiente
+                  & (x['dT'] > media['dT'] + 3.5 * sigma['dT'])
+                  & (x['dT'] > media['dT'] + 6)
+                  & (x['I04'] > media['I04'] + 3 * sigma['I04'])
+                  & (~dia_candidato | (x['I05'] > media['I05'] + sigma['I05'] - 4)))
+    fuego[filas[contextual], cols[contextual]] = 1
+    return fuego
+
+
+def detectar_dataset(ds, fecha, calidad=CALIDAD_OK):
+    """
+    Agrega la variable 'fuego' a un Dataset de swath (granulos_viirs.leer_variables) de una pasada.
+
+    Usar una ventana con al menos max(RADIOS) pixeles de margen alrededor de la zona para que el fondo
+    de los pixeles del borde sea completo.
+    """
+    valido = np.ones(ds['I04'].shape, dtype=bool)
+    for columna, valores in (calidad or {}).items():
+        valido &= np.isin(ds[columna].values, valores)
+    dia = es_dia(fecha, ds['longitude'].values)
+    fuego = detectar(ds['I04'].values, ds['I05'].values, valido, dia)
+    return ds.assign(fuego=(ds['I04'].dims, fuego))
+
+
+def fuego_granulo(bandas, coordenadas, areas, fecha, margen=max(RADIOS)):
+    """
+    Pixeles de las zonas con su mascara de fuego, detectada sobre las ventanas del swath que tocan las zonas
+    ampliadas en `margen` pixeles (el fondo de los pixeles del borde queda completo).
+
+    Returns
+    -------
+    DataFrame
+        longitude, latitude, I04, I05, fuego y date_time, solo los pixeles dentro del bbox de las zonas.
+    """
+    import rioxarray
+    from granulos_viirs import leer_variables, mascara_bbox_areas, ventanas_swath
+
+    coords = rioxarray.open_rasterio(coordenadas)
+    data_nasa = rioxarray.open_rasterio(bandas)
+    lat = coords[0]['latitude'].isel(band=0).values
+    lon = coords[0]['longitude'].isel(band=0).values
+
+    partes = []
+    ## se amplian antes de fusionar: ventanas que se solapan solo por el margen no repiten pixeles
+    for f0, f1, c0, c1 in ventanas_swath(lat, lon, areas, margen):
+        ds = detectar_dataset(leer_variables(coords, data_nasa, slice(f0, f1), slice(c0, c1)), fecha)
+        mascara = mascara_bbox_areas(ds['latitude'].values, ds['longitude'].values, areas)
+        partes.append(pd.DataFrame({v: ds[v].values[mascara] for v in ['longitude', 'latitude', 'I04', 'I05', 'fuego']}))
+    if not partes:
+        return pd.DataFrame(columns=['longitude', 'latitude', 'I04', 'I05', 'fuego', 'date_time'])
+    df = pd.concat(partes, ignore_index=True)
+    df['date_time'] = pd.Timestamp(fecha)
+    return df
+
+
+def fuego_por_celda(df, nivel=10, codigos_grilla=None, columna_tiempo='date_time'):
+    """
+    Focos por celda HealPix y pasada desde pixeles con la columna 'fuego'.
+
+    Returns
+    -------
+    DataFrame
+        Codigo, fecha, n_pixeles, n_fuego, fuego (bool, algun pixel con fuego), fuego_absoluto, I04_max.
+    """
+    aux = df.assign(_fuego=(df['fuego'] > 0).astype(float), _absoluto=(df['fuego'] == 2).astype(float))
+    celdas = agregar_por_celda(aux, nivel, variables=('_fuego', '_absoluto', 'I04'), calidad=None,
+                               columna_tiempo=columna_tiempo, codigos_grilla=codigos_grilla)
+    return pd.DataFrame({
+        'Codigo': celdas['Codigo'],
+        columna_tiempo: celdas[columna_tiempo],
+        'n_pixeles': celdas['n_pixeles'],
+        'n_fuego': np.rint(celdas['_fuego_mean'] * celdas['n_pixeles']).astype(np.int64),
+        'fuego': celdas['_fuego_max'] > 0,
+        'fuego_absoluto': celdas['_absoluto_max'] > 0,
+        'I04_max': celdas['I04_max'],
+    })
+
+
+if __name__ == "__main__":
+    ## swath sintetico de 3200x3200 con focos dispersos y con un frente extenso; referencia con loop por
+    ## candidato (ventanas recortadas con slices) y la misma regla
+    import time
+
+    def referencia(a, b, v):
+        u = UMBRALES['dia']
+        dT = a - b
+        absoluto = v & (a >= u['absoluto_I04']) & (b > u['absoluto_I05'])
+        fondo = v & ~absoluto & ~((a > u['fondo_I04']) & (dT > u['fondo_dT']))
+        ref = np.where(absoluto, 2, 0).astype(np.int8)
+        for f, c in zip(*np.nonzero(v & ~absoluto & (a > u['candidato_I04']) & (dT > u['candidato_dT']))):
+            for r in RADIOS:
+                sl = (slice(max(f - r, 0), f + r + 1), slice(max(c - r, 0), c + r + 1))
+                mf = fondo[sl].copy()
+                mf[f - sl[0].start, c - sl[1].start] = False
+                if mf.sum() >= MIN_FONDO and mf.sum() >= FRACCION_FONDO * (mf.size - 1):
+                    x4, x5, xd = a[sl][mf], b[sl][mf], dT[sl][mf]
+                    if (dT[f, c] > xd.mean() + 3.5 * xd.std() and dT[f, c] > xd.mean() + 6
+                            and a[f, c] > x4.mean() + 3 * x4.std() and b[f, c] > x5.mean() + x5.std() - 4):
+                        ref[f, c] = 1
+                    break
+        return ref
+
+    rng = np.random.default_rng(0)
+    n = 3200
+    for caso, n_focos, alto in [('focos dispersos', 400, 2), ('frente extenso', 400, 60)]:
+        I05 = 290 + rng.normal(0, 1.5, (n, n))
+        I04 = I05 + 8 + rng.normal(0, 1.5, (n, n))
+        focos = rng.integers(100, n - 100, (n_focos, 2))
+        for f, c in focos:
+            I04[f:f + alto, c:c + 3] += rng.uniform(25, 60)
+            I05[f:f + alto, c:c + 3] += 3
+        I04[focos[:20, 0], focos[:20, 1]] = 367.0   # saturados
+        valido = rng.random((n, n)) > 0.02
+
+        t = time.perf_counter()
+        fuego = detectar(I04, I05, valido, dia=True)
+        t_vec = time.perf_counter() - t
+        t = time.perf_counter()
+        ref = referencia(I04, I05, valido)
+        print(f'{caso}: vectorizado {t_vec:.2f} s vs loop por candidato {time.perf_counter() - t:.2f} s '
+              f'({(fuego == 1).sum()} contextuales, {(fuego == 2).sum()} absolutos), misma mascara: {np.array_equal(ref, fuego)}')
@@ -0,0 +1,197 @@
+"""
+Seguimiento del frente de fuego entre pasadas y velocidad de propagacion (rate of spread) por celda HealPix.
+
+Entrada: celdas con fuego por pasada (p.ej. fuego_por_celda de deteccion_fuego) de cualquier satelite; las
+pasadas de suomi/noaa1/noaa2 se intercalan por tiempo y las de igual hora se unen.
+
+Las celdas rHEALPix de una cara son una grilla regular en el plano de la proyeccion: el codigo (cara + digitos
+base 3x3) se convierte a fila/columna entera sin geometria (indice_healpix.codigos_a_plano), y las celdas con
+fuego de la zona se ubican en un raster recortado a su extension. Por pasada k:
+- quemado: union de las celdas con fuego hasta la pasada k (area quemada acumulada).
+- nuevas: celdas que arden por primera vez en k; su llegada es el tiempo de la pasada.
+- distancia: transformada de distancia euclidiana (scipy.ndimage.distance_transform_edt) al area quemada en
+  k-1, con el tamaño real de la celda en metros al norte y al este (la proyeccion no es conforme).
+  El avance del frente por la celda suma ademas la distancia al nuevo frente (celda sin quemar mas cercana en k).
+- ros = avance / (t_k - t_{k-1}) en m/h, y direccion de avance desde la celda quemada mas cercana.
+- frente: celdas quemadas con algun vecino sin quemar.
+Cada pasada son dos transformadas sobre el recorte (milisegundos), sin loops por celda. Como el frente puede
+avanzar menos de una celda entre pasadas, tambien se entrega ros_llegada = 1 / |grad T| del campo de tiempos de
+llegada.
+
+    pasadas, celdas = seguimiento(pd.concat([fuego_suomi, fuego_noaa1, fuego_noaa2]))
+"""
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+from pyproj import Geod
+from scipy import ndimage
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'procesamiento'))
+from celdas_healpix import dggs
+from indice_healpix import codigos_a_plano
+
+MARGEN = 3
+
+
+def tamaño_celda(codigo, rdggs=None):
+    """(alto, ancho) en metros de una celda cerca de `codigo`, medidos sobre el elipsoide."""
+    rdggs = rdggs or dggs()
+    nivel = len(codigo) - 1
+    w = rdggs.cell_width(nivel)
+    x, y = rdggs.cell([codigo[0]] + [int(d) for d in codigo[1:]]).nucleus(plane=True)
+    lon, lat = rdggs.rhealpix(np.array([x, x + w, x]), np.array([y, y, y + w]), inverse=True)
+    geod = Geod(ellps='WGS84')
+    _, _, alto = geod.inv(lon[0], lat[0], lon[2], lat[2])
+    _, _, ancho = geod.inv(lon[0], lat[0], lon[1], lat[1])
+    return alto, ancho
+
+
+def ros_llegada(tiempos, llegada, fila, col, forma, alto, ancho):
+    """
+    Velocidad por celda como 1 / |grad T| del campo de tiempos de llegada T (horas), con diferencias centradas.
+
+    Resuelve avances menores a una celda entre pasadas (el frente tarda varias pasadas en cruzar una celda),
+    que la distancia entre pasadas consecutivas solo ve como saltos de una celda. NaN en el borde del area
+    quemada.
+    """
+    horas = (tiempos - tiempos[0]).total_seconds().to_numpy() / 3600
+    T = np.full(forma, np.nan)
+    T[fila, col] = horas[llegada]
+    dT_norte, dT_este = np.gradient(T, alto, ancho)
+    pendiente = np.hypot(dT_norte, dT_este)[fila, col]
+    with np.errstate(divide='ignore'):
+        return np.where(pendiente > 0, 1 / pendiente, np.nan)
+
+
+def seguimiento(df, columna_tiempo='date_time', columna_fuego='fuego', margen=MARGEN, rdggs=None):
+    """
+    Frente, area quemada, llegada y velocidad de propagacion entre pasadas consecutivas.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Codigo, tiempo y columna de fuego (bool) por celda y pasada; las filas sin fuego se ignoran.
+        Si trae 'satelite', se informa por pasada.
+    margen : int
+        Celdas sin fuego alrededor del recorte (para el frente y la transformada de distancia).
+
+    Returns
+    -------
+    pasadas : DataFrame
+        Una fila por pasada: tiempo, satelite, horas desde la anterior, n_activas, n_nuevas, area_quemada_ha,
+        n_frente, ros_mediana y ros_max (m/h).
+    celdas : DataFrame
+        Una fila por celda quemada: Codigo, llegada, pasada, distancia_m, ros (m/h), direccion (grados desde
+        el norte, horario; hacia donde avanzo el fuego) y ros_llegada (m/h, ver ros_llegada). La primera
+        pasada no tiene distancia ni ros.
+    """
+    rdggs = rdggs or dggs()
+    fuego = df.loc[df[columna_fuego].astype(bool)]
+    tiempo = pd.to_datetime(fuego[columna_tiempo], utc=True)
+    k, tiempos = pd.factorize(tiempo, sort=True)
+    tiempos = pd.DatetimeIndex(tiempos)
+
+    ## recorte de la zona con fuego, indice plano por fila
+    inverso, codigos = pd.factorize(fuego['Codigo'], sort=True)
+    codigos = np.asarray(codigos, dtype=str)
+    fila, col = codigos_a_plano(codigos, rdggs)
+    fila, col = fila - fila.min() + margen, col - col.min() + margen
+    forma = (int(fila.max()) + margen + 1, int(col.max()) + margen + 1)
+    plano = np.ravel_multi_index((fila, col), forma)
+
+    ## pasada de llegada de cada celda (primera con fuego) y celdas activas por pasada
+    llegada = np.full(len(codigos), len(tiempos), dtype=np.int64)
+    np.minimum.at(llegada, inverso, k)
+    n_activas = np.bincount(k, minlength=len(tiempos))
+    orden = np.argsort(llegada, kind='stable')
+    cortes = np.searchsorted(llegada[orden], np.arange(len(tiempos) + 1))
+
+    alto, ancho = tamaño_celda(codigos[0], rdggs)
+    area_ha = rdggs.cell_area(len(codigos[0]) - 1, plane=False) / 1e4
+    horas = np.r_[np.nan, (tiempos[1:] - tiempos[:-1]).total_seconds() / 3600]
+
+    distancia = np.full(len(codigos), np.nan)
+    direccion = np.full(len(codigos), np.nan)
+    quemado = np.zeros(forma, dtype=bool)
+    n_quemadas = np.zeros(len(tiempos), dtype=np.int64)
+    n_frente = np.zeros(len(tiempos), dtype=np.int64)
+    for p in range(len(tiempos)):
+        nuevas = orden[cortes[p]:cortes[p + 1]]
+        f, c = fila[nuevas], col[nuevas]
+        if p > 0 and quemado.any() and len(nuevas):
+            d, (fi, ci) = ndimage.distance_transform_edt(~quemado, sampling=(alto, ancho), return_indices=True)
+            ## hacia donde avanzo: desde la celda quemada mas cercana (filas crecen hacia el sur)
+            norte, este = (fi[f, c] - f) * alto, (c - ci[f, c]) * ancho
+            direccion[nuevas] = np.degrees(np.arctan2(este, norte)) % 360
+            distancia[nuevas] = d[f, c]
+        quemado.flat[plano[nuevas]] = True
+        if p > 0 and np.isfinite(distancia[nuevas]).any():
+            ## avance del frente por la celda: distancia al frente anterior + distancia al nuevo frente
+            ## (celda sin quemar mas cercana) - un paso de celda en esa direccion (los frentes estan en los bordes)
+            d_nuevo = ndimage.distance_transform_edt(quemado, sampling=(alto, ancho))[f, c]
+            paso = np.hypot(norte, este) / np.maximum(np.hypot(norte / alto, este / ancho), 1)
+            distancia[nuevas] += d_nuevo - paso
+        n_quemadas[p] = quemado.sum()
+        n_frente[p] = (quemado & ~ndimage.binary_erosion(quemado)).sum()
+
+    ros = distancia / horas[np.minimum(llegada, len(tiempos) - 1)]
+    celdas = pd.DataFrame({'Codigo': codigos, 'llegada': tiempos[llegada], 'pasada': llegada,
+                           'distancia_m': distancia, 'ros': ros, 'direccion': direccion,
+                           'ros_llegada': ros_llegada(tiempos, llegada, fila, col, forma, alto, ancho)})
+
+    ros_pasada = pd.Series(ros).groupby(llegada)
+    pasadas = pd.DataFrame({columna_tiempo: tiempos, 'horas': horas, 'n_activas': n_activas,
+                            'n_nuevas': np.diff(cortes), 'area_quemada_ha': n_quemadas * area_ha,
+                            'n_frente': n_frente,
+                            'ros_mediana': ros_pasada.median().reindex(range(len(tiempos))).to_numpy(),
+                            'ros_max': ros_pasada.max().reindex(range(len(tiempos))).to_numpy()})
+    if 'satelite' in fuego.columns:
+        satelites = fuego['satelite'].groupby(k).unique().map(lambda s: '+'.join(sorted(s)))
+        pasadas.insert(1, 'satelite', satelites.reindex(range(len(tiempos))).to_numpy())
+    return pasadas, celdas.sort_values(['pasada', 'Codigo'], ignore_index=True)
+
+
+if __name__ == "__main__":
+    ## incendio sintetico: elipse que crece a velocidad conocida, observado por tres satelites intercalados
+    import time
+    from celdas_healpix import codigos_region
+
+    rdggs = dggs()
+    codigos = codigos_region(10, (-94.95, 35.80, -94.55, 36.10), rdggs)
+    fila, col = codigos_a_plano(codigos, rdggs)
+    nucleos = rdggs.nuclei(codigos, plane=True)
+    w = rdggs.cell_width(10)
+    print('indices = nucleos planos:',
+          np.allclose(col, np.rint((nucleos[:, 0] - rdggs.ul_vertex['N'][0]) / w - 0.5)) and
+          np.allclose(fila, np.rint((rdggs.ul_vertex['N'][1] - nucleos[:, 1]) / w - 0.5)))
+
+    alto, ancho = tamaño_celda(codigos[0], rdggs)
+    y = (fila - fila.min() - (fila.max() - fila.min()) // 2) * alto
+    x = (col - col.min() - (col.max() - col.min()) // 2) * ancho
+    ## elipse que parte del origen: cabeza a 300 m/h hacia el este, cola y flancos a 120 m/h
+    v_este, v_resto = 300.0, 120.0
+    inicio = pd.Timestamp('2025-04-14 06:00', tz='UTC')
+    filas = []
+    for j, satelite in enumerate(['suomi', 'noaa1', 'noaa2'] * 20):
+        t = inicio + pd.Timedelta(minutes=50 * j + 7 * (j % 3))
+        h = (t - inicio).total_seconds() / 3600
+        a = (v_este + v_resto) / 2 * h
+        dentro = ((x - (v_este - v_resto) / 2 * h) / max(a, 1)) ** 2 + (y / max(v_resto * h, 1)) ** 2 <= 1
+        filas.append(pd.DataFrame({'Codigo': codigos[dentro], 'date_time': t, 'fuego': True,
+                                   'satelite': satelite}))
+    df = pd.concat(filas, ignore_index=True)
+
+    tiempo = time.perf_counter()
+    pasadas, celdas = seguimiento(df)
+    tiempo = time.perf_counter() - tiempo
+    print(f'{len(pasadas)} pasadas, {len(celdas)} celdas quemadas: {tiempo:.3f} s '
+          f'({1000 * tiempo / len(pasadas):.1f} ms por pasada)')
+    print(pasadas.tail(3).to_string())
+
+    ## eje de la elipse (fila del origen): cabeza al este y cola al oeste
+    for nombre, lado, real in [('cabeza', x > 0, v_este), ('cola', x < 0, v_resto)]:
+        sel = celdas[celdas['Codigo'].isin(codigos[(y == 0) & lado])]
+        print(f'{nombre}: ros {sel["ros"].median():.0f} m/h, ros_llegada {sel["ros_llegada"].median():.0f} m/h '
+              f'(real {real:.0f})')
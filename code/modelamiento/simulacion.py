@@ -0,0 +1,291 @@
+"""
+Simulador de propagacion de fuego por automata celular sobre la grilla rHEALPix, con ensambles estocasticos en
+lote.
+
+- Vecindad: las 8 vecinas de cada celda (indice_healpix.vecinos, con ids enteros) como adyacencia CSR
+  (indptr, indices) precalculada una vez por zona, con el rumbo y la distancia en metros de cada arista.
+- Probabilidad de ignicion por arista i -> j (Alexandridis et al. 2008), calculada una vez por escenario:
+      p = p_h[j] * exp(C1 V) * exp(C2 V (cos(theta) - 1)) * exp(A * pendiente)
+  con V la velocidad del viento en i (m/s), theta el angulo entre la arista y hacia donde sopla el viento y la
+  pendiente (grados) de i a j desde la elevacion. p_h puede variar por celda (combustible, humedad).
+- Cada paso: las celdas que arden en cada corrida (pares corrida, celda) intentan encender a sus vecinas sin
+  quemar, todas las aristas del frente de todas las corridas a la vez; una celda arde un paso y queda quemada.
+  El estado del ensamble es solo `llegada` (corridas x celdas, paso de ignicion o -1).
+- simular_ensamble reparte bloques de corridas en procesos con semillas independientes; puntajes compara el
+  ensamble con los frentes observados por VIIRS (propagacion.seguimiento) en cada pasada.
+
+    vecinos = vecindad(codigos)
+    prob = prob_aristas(vecinos, elev, viento_vel, viento_dir)
+    llegada = simular_ensamble(vecinos, prob, ignicion, n_corridas=2000, n_pasos=96)
+    tabla = puntajes(llegada, codigos, celdas_observadas, inicio, horas_paso=0.5)
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'procesamiento'))
+from celdas_healpix import dggs
+from indice_healpix import DESPLAZAMIENTOS, codigos_a_ids, codigos_a_plano, posiciones, vecinos
+from propagacion import tamaño_celda
+
+## Alexandridis et al. (2008)
+P_H = 0.58
+A_PENDIENTE = 0.078
+C1_VIENTO = 0.045
+C2_VIENTO = 0.131
+
+CORRIDAS_POR_BLOQUE = 256
+
+
+def vecindad(codigos, rdggs=None):
+    """
+    Adyacencia CSR de las 8 vecinas de cada celda dentro de `codigos`.
+
+    Returns
+    -------
+    dict
+        indptr (n_celdas + 1,), indices (vecina de cada arista), rumbo (grados desde el norte, horario, de la
+        celda a su vecina) y distancia (metros entre centros).
+    """
+    rdggs = rdggs or dggs()
+    codigos = np.asarray(codigos, dtype=str)
+    alto, ancho = tamaño_celda(codigos[0], rdggs)
+    ids, nivel = codigos_a_ids(codigos)
+    orden = np.argsort(ids)
+    pos = posiciones(ids[orden], vecinos(ids, nivel, rdggs))
+    vecina = np.where(pos >= 0, orden[np.maximum(pos, 0)], -1)
+
+    ## aristas en orden de fila (celda de origen), como pide CSR
+    origen, k = np.nonzero(vecina >= 0)
+    norte = -DESPLAZAMIENTOS[k, 0] * alto    # las filas crecen hacia el sur
+    este = DESPLAZAMIENTOS[k, 1] * ancho
+    return {'indptr': np.r_[0, np.cumsum(np.bincount(origen, minlength=len(codigos)))],
+            'indices': vecina[origen, k],
+            'rumbo': np.degrees(np.arctan2(este, norte)) % 360,
+            'distancia': np.hypot(norte, este)}
+
+
+def prob_aristas(vecinos, elev, viento_vel, viento_dir, p_h=P_H):
+    """
+    Probabilidad de que una celda en llamas encienda a cada vecina (una por arista).
+
+    Parameters
+    ----------
+    vecinos : dict
+        Salida de vecindad.
+    elev : ndarray
+        Elevacion por celda (m); None para terreno plano.
+    viento_vel, viento_dir : ndarray or float
+        Velocidad (m/s) y direccion desde donde sopla (grados, como wind_dir_10m de meteorologia) por celda.
+    p_h : ndarray or float
+        Probabilidad base por celda (p.ej. reducida con la humedad o sin combustible = 0).
+    """
+    n = len(vecinos['indptr']) - 1
+    origen = np.repeat(np.arange(n), np.diff(vecinos['indptr']))
+    destino = vecinos['indices']
+    V = np.broadcast_to(viento_vel, (n,))[origen]
+    hacia = np.broadcast_to(viento_dir, (n,))[origen] + 180
+    p_viento = np.exp(C1_VIENTO * V) * np.exp(C2_VIENTO * V * (np.cos(np.radians(vecinos['rumbo'] - hacia)) - 1))
+    p = np.broadcast_to(p_h, (n,))[destino] * p_viento
+    if elev is not None:
+        pendiente = np.degrees(np.arctan((elev[destino] - elev[origen]) / vecinos['distancia']))
+        p = p * np.exp(A_PENDIENTE * pendiente)
+    return np.clip(np.nan_to_num(p), 0, 1).astype(np.float32)
+
+
+def simular(vecinos, prob, ignicion, n_corridas, n_pasos, semilla=None):
+    """
+    Corridas del automata en lote.
+
+    Parameters
+    ----------
+    ignicion : array-like of int
+        Posiciones (en `codigos`) de las celdas que arden en el paso 0, comunes a todas las corridas.
+    semilla : int or SeedSequence or None
+
+    Returns
+    -------
+    ndarray of int16
+        llegada (n_corridas, n_celdas): paso en que la celda se enciende, -1 si no se quema.
+    """
+    rng = np.random.default_rng(semilla)
+    indptr, indices = vecinos['indptr'], vecinos['indices']
+    n_celdas = len(indptr) - 1
+    llegada = np.full((n_corridas, n_celdas), -1, dtype=np.int16)
+    ignicion = np.unique(np.asarray(ignicion, dtype=np.int64))
+    llegada[:, ignicion] = 0
+    corrida = np.repeat(np.arange(n_corridas), len(ignicion))
+    celda = np.tile(ignicion, n_corridas)
+
+    for paso in range(1, n_pasos + 1):
+        if not len(celda):
+            break
+        ## aristas salientes de todas las celdas en llamas (rangos CSR concatenados)
+        inicio, n = indptr[celda], indptr[celda + 1] - indptr[celda]
+        fuente = np.repeat(np.arange(len(celda)), n)
+        arista = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n) + inicio[fuente]
+        corrida_a, vecina = corrida[fuente], indices[arista]
+
+        enciende = llegada[corrida_a, vecina] < 0
+        enciende[enciende] = rng.random(enciende.sum(), dtype=np.float32) < prob[arista[enciende]]
+        nuevas = np.unique(corrida_a[enciende] * n_celdas + vecina[enciende])
+        llegada.flat[nuevas] = paso
+        corrida, celda = np.divmod(nuevas, n_celdas)
+    return llegada
+
+
+def _bloque(args):
+    return simular(*args)
+
+
+def simular_ensamble(vecinos, prob, ignicion, n_corridas, n_pasos, semilla=None, n_procesos=1,
+                     corridas_por_bloque=CORRIDAS_POR_BLOQUE):
+    """
+    Ensamble de `n_corridas` en bloques con semillas independientes (SeedSequence.spawn).
+
+    Parameters
+    ----------
+    n_procesos : int or None
+        1: bloques en serie en este proceso; None = todos los cores. Los procesos devuelven su bloque de
+        llegada completo, por lo que solo convienen cuando cada bloque tarda mas que copiarlo (muchos pasos).
+
+    Returns
+    -------
+    ndarray of int16
+        llegada (n_corridas, n_celdas), igual para la misma semilla con cualquier n_procesos.
+    """
+    tamaños = [min(corridas_por_bloque, n_corridas - k) for k in range(0, n_corridas, corridas_por_bloque)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamaños))
+    tareas = [(vecinos, prob, ignicion, n, n_pasos, s) for n, s in zip(tamaños, semillas)]
+    if n_procesos == 1:
+        return np.concatenate([_bloque(t) for t in tareas])
+    with ProcessPoolExecutor(max_workers=n_procesos) as pool:
+        return np.concatenate(list(pool.map(_bloque, tareas)))
+
+
+def probabilidad_quemado(llegada, paso):
+    """Fraccion de corridas en que cada celda ya se quemo al `paso`."""
+    return ((llegada >= 0) & (llegada <= paso)).mean(axis=0)
+
+
+def puntajes(llegada, codigos, observado, inicio, horas_paso, columna_tiempo='date_time'):
+    """
+    Compara el ensamble con el area quemada observada en cada pasada.
+
+    Parameters
+    ----------
+    llegada : ndarray
+        Salida de simular / simular_ensamble.
+    codigos : array-like of str
+        Codigo de cada celda de la simulacion.
+    observado : DataFrame
+        Codigo y llegada por celda quemada (tabla `celdas` de propagacion.seguimiento).
+    inicio : Timestamp
+        Tiempo del paso 0 (ignicion).
+    horas_paso : float
+        Horas que representa un paso.
+
+    Returns
+    -------
+    DataFrame
+        Por pasada: paso, n_observadas, n_simuladas (media del ensamble), sorensen (media, p10, p90; 2|S∩O| /
+        (|S| + |O|) por corrida) y brier del mapa de probabilidad sobre las celdas quemadas en alguna corrida
+        o en la observacion.
+    """
+    llegada_obs = pd.to_datetime(observado['llegada'], utc=True)
+    posicion = pd.Index(np.asarray(codigos, dtype=str)).get_indexer(observado['Codigo'].to_numpy(dtype=str))
+    posicion, llegada_obs = posicion[posicion >= 0], llegada_obs[posicion >= 0]
+    inicio = pd.Timestamp(inicio)
+    inicio = inicio.tz_convert('UTC') if inicio.tz else inicio.tz_localize('UTC')
+
+    tiempos = pd.DatetimeIndex(np.unique(llegada_obs))
+    pasos = np.rint((tiempos - inicio).total_seconds().to_numpy() / 3600 / horas_paso).astype(np.int64)
+    tiempos, pasos = tiempos[pasos >= 0], pasos[pasos >= 0]
+    n_pasadas, (n_corridas, n_celdas) = len(pasos), llegada.shape
+
+    ## primera pasada en que cada celda esta quemada (n_pasadas: nunca); -1 de llegada cae en el ultimo valor
+    tabla = np.r_[np.searchsorted(pasos, np.arange(max(int(llegada.max()), 0) + 1)), n_pasadas].astype(np.int16)
+    pasada_obs = np.full(n_celdas, n_pasadas, dtype=np.int64)
+    pasada_obs[posicion] = np.searchsorted(tiempos, llegada_obs)
+    n_obs = np.cumsum(np.bincount(pasada_obs, minlength=n_pasadas + 1))[:n_pasadas]
+
+    ## conteos por (corrida, pasada) y por (celda, pasada) con bincount + cumsum, por bloques de corridas
+    n_sim = np.zeros((n_corridas, n_pasadas + 1), dtype=np.int64)
+    interseccion = np.zeros_like(n_sim)
+    por_celda = np.zeros((n_celdas, n_pasadas + 1), dtype=np.int64)
+    observadas = np.flatnonzero(pasada_obs < n_pasadas)
+    ancho = n_pasadas + 1
+
+    def conteo(pasada, filas):
+        return np.bincount((np.arange(filas)[:, None] * ancho + pasada).ravel(),
+                           minlength=filas * ancho).reshape(filas, ancho)
+
+    for k in range(0, n_corridas, CORRIDAS_POR_BLOQUE):
+        pasada_sim = tabla[llegada[k:k + CORRIDAS_POR_BLOQUE]].astype(np.int64)
+        bloque = slice(k, k + len(pasada_sim))
+        n_sim[bloque] = conteo(pasada_sim, len(pasada_sim))
+        interseccion[bloque] = conteo(np.maximum(pasada_sim[:, observadas], pasada_obs[observadas]),
+                                      len(pasada_sim))
+        por_celda += conteo(pasada_sim.T, n_celdas)
+    n_sim = np.cumsum(n_sim, axis=1)[:, :n_pasadas]
+    interseccion = np.cumsum(interseccion, axis=1)[:, :n_pasadas]
+    prob = np.cumsum(por_celda, axis=1)[:, :n_pasadas] / n_corridas
+
+    sorensen = 2 * interseccion / np.maximum(n_sim + n_obs, 1)
+    obs = pasada_obs[:, None] <= np.arange(n_pasadas)
+    evaluadas = (prob > 0) | obs
+    brier = ((prob - obs) ** 2 * evaluadas).sum(axis=0) / np.maximum(evaluadas.sum(axis=0), 1)
+    return pd.DataFrame({columna_tiempo: tiempos, 'paso': pasos, 'n_observadas': n_obs,
+                         'n_simuladas': n_sim.mean(axis=0), 'sorensen': sorensen.mean(axis=0),
+                         'sorensen_p10': np.quantile(sorensen, 0.1, axis=0),
+                         'sorensen_p90': np.quantile(sorensen, 0.9, axis=0), 'brier': brier})
+
+if __name__ == "__main__":
+    ## zona sintetica: colina al este de la ignicion y viento del oeste; 2000 corridas en lote y en procesos,
+    ## puntaje contra un "incendio observado" (otra corrida, pasada por propagacion.seguimiento)
+    import time
+    from celdas_healpix import codigos_region
+    from propagacion import seguimiento
+
+    rdggs = dggs()
+    codigos = codigos_region(10, (-94.90, 35.85, -94.65, 36.05), rdggs)
+    t = time.perf_counter()
+    vecinos = vecindad(codigos, rdggs)
+    print(f'{len(codigos)} celdas, {len(vecinos["indices"])} aristas: vecindad en {time.perf_counter() - t:.2f} s')
+
+    fila, col = codigos_a_plano(codigos, rdggs)
+    f0, c0 = (fila.min() + fila.max()) // 2, (col.min() + col.max()) // 2
+    elev = 300 + 150 * np.exp(-(((fila - f0) / 30.0) ** 2 + ((col - c0 - 40) / 30.0) ** 2))
+    prob = prob_aristas(vecinos, elev, viento_vel=6.0, viento_dir=270.0, p_h=0.35)
+    ignicion = np.flatnonzero((fila == f0) & (col == c0))
+
+    n_corridas, n_pasos, horas_paso = 2000, 60, 0.5
+    resultados = {}
+    for n_procesos in [1, 4]:
+        t = time.perf_counter()
+        resultados[n_procesos] = simular_ensamble(vecinos, prob, ignicion, n_corridas, n_pasos, semilla=0,
+                                                  n_procesos=n_procesos)
+        print(f'{n_corridas} corridas x {n_pasos} pasos, {n_procesos} proceso(s): {time.perf_counter() - t:.2f} s')
+    llegada = resultados[1]
+    print('mismo ensamble en serie y en procesos:', np.array_equal(resultados[1], resultados[4]))
+    print(f'celdas quemadas por corrida: media {(llegada >= 0).sum(axis=1).mean():.0f}')
+
+    ## observacion: una corrida independiente vista cada ~50 minutos por tres satelites
+    inicio = pd.Timestamp('2025-04-14 06:00', tz='UTC')
+    real = simular(vecinos, prob, ignicion, 1, n_pasos, semilla=123)[0]
+    filas = []
+    for j, satelite in enumerate(['suomi', 'noaa1', 'noaa2'] * 12):
+        tiempo = inicio + pd.Timedelta(minutes=50 * j)
+        paso = int(round((tiempo - inicio).total_seconds() / 3600 / horas_paso))
+        quemadas = (real >= 0) & (real <= paso)
+        filas.append(pd.DataFrame({'Codigo': codigos[quemadas], 'date_time': tiempo, 'fuego': True,
+                                   'satelite': satelite}))
+    _, observado = seguimiento(pd.concat(filas, ignore_index=True))
+
+    t = time.perf_counter()
+    tabla = puntajes(llegada, codigos, observado, inicio, horas_paso)
+    print(f'puntajes en {time.perf_counter() - t:.2f} s')
+    print(tabla.iloc[::5].to_string())
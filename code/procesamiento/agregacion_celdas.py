@@ -0,0 +1,132 @@
+"""
+Asignacion directa de puntos VIIRS a celdas rHEALPix y agregados por celda y pasada, sin overlays de poligonos.
+
+Cada punto (centro de pixel) se proyecta a rHEALPix y su codigo de celda se obtiene aritmeticamente
+(rdggs.cells_from_points, el mismo criterio que cell_from_point). Los agregados se calculan ordenando una
+vez por (celda, fecha) y reduciendo por tramos con numpy, por lo que una pasada completa es una tabla
+celda x tiempo en una fraccion de segundo.
+"""
+import numpy as np
+import pandas as pd
+
+from celdas_healpix import dggs
+
+# flags de calidad aceptados (mismos que en viz.py)
+CALIDAD_OK = {'I04_quality_flags': [0, 4, 8]}
+
+
+def codigos_puntos(lon, lat, nivel=10, rdggs=None):
+    """
+    Codigo de la celda de nivel `nivel` que contiene cada punto.
+
+    Returns
+    -------
+    ndarray of str
+        Un codigo por punto ('' si el punto no cae en el plano rHEALPix).
+    """
+    rdggs = rdggs or dggs()
+    return rdggs.cells_from_points(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float), nivel, plane=False)
+
+
+def agregar_por_celda(df, nivel=10, variables=('I04', 'I05'), calidad=CALIDAD_OK, columna_tiempo='date_time',
+                      codigos_grilla=None, rdggs=None):
+    """
+    Agregados por celda y fecha de los pixeles VIIRS.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Pixeles con 'longitude', 'latitude', la columna de tiempo, las variables y los flags de calidad.
+    nivel : int
+        Resolucion rHEALPix de la grilla.
+    variables : iterable of str
+        Variables a agregar (media y maximo).
+    calidad : dict or None
+        Columna de flag -> valores aceptados. Los pixeles que no cumplen se cuentan en 'n_pixeles'
+        pero no entran en los agregados. None: sin filtro.
+    columna_tiempo : str
+        Columna que identifica la pasada.
+    codigos_grilla : array-like or None
+        Si se entrega (p.ej. grilla de la zona), se descartan los puntos de celdas fuera de ella.
+
+    Returns
+    -------
+    DataFrame
+        Una fila por (Codigo, fecha) con n_pixeles, n_calidad y {var}_mean, {var}_max.
+        Para la tabla celda x tiempo de una variable: .pivot(index='Codigo', columns=columna_tiempo, values=...).
+    """
+    codigos = codigos_puntos(df['longitude'].to_numpy(), df['latitude'].to_numpy(), nivel, rdggs)
+    id_celda, celdas = pd.factorize(codigos)
+    celda_valida = celdas != ''
+    if codigos_grilla is not None:
+        celda_valida &= np.isin(celdas, np.asarray(codigos_grilla, dtype=str))
+    dentro = celda_valida[id_celda]
+
+    ok = np.ones(len(df), dtype=bool)
+    for columna, valores in (calidad or {}).items():
+        ok &= df[columna].isin(valores).to_numpy()
+
+    ## clave entera (celda, fecha) y un solo ordenamiento para todas las reducciones
+    id_celda = id_celda[dentro]
+    id_tiempo, tiempos = pd.factorize(df[columna_tiempo].to_numpy()[dentro])
+    clave = id_celda.astype(np.int64) * len(tiempos) + id_tiempo
+    orden = np.argsort(clave, kind='stable')
+    clave = clave[orden]
+    inicio = np.flatnonzero(np.r_[True, clave[1:] != clave[:-1]]) if len(clave) else np.array([], dtype=np.intp)
+
+    ok = ok[dentro][orden]
+    resultado = pd.DataFrame({
+        'Codigo': celdas[clave[inicio] // len(tiempos)],
+        columna_tiempo: tiempos[clave[inicio] % len(tiempos)],
+        'n_pixeles': np.diff(np.r_[inicio, len(clave)]),
+        'n_calidad': np.add.reduceat(ok.astype(np.int64), inicio),
+    })
+    for var in variables:
+        valores = df[var].to_numpy(dtype=float)[dentro][orden]
+        valido = ok & np.isfinite(valores)
+        n = np.add.reduceat(valido.astype(np.int64), inicio)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            resultado[f'{var}_mean'] = np.add.reduceat(np.where(valido, valores, 0.0), inicio) / n
+        resultado[f'{var}_max'] = np.fmax.reduceat(np.where(valido, valores, np.nan), inicio)
+    return resultado
+
+
+if __name__ == "__main__":
+    ## benchmark: 1M puntos en 10 pasadas sobre una zona de ~0.15 x 0.12 grados, contra overlay con la grilla
+    import time
+    import geopandas as gpd
+    from celdas_healpix import grilla_region, a_geodataframe
+
+    rng = np.random.default_rng(0)
+    n = 1_000_000
+    df = pd.DataFrame({
+        'longitude': rng.uniform(-94.85, -94.70, n),
+        'latitude': rng.uniform(35.88, 36.0, n),
+        'date_time': pd.Timestamp('2025-04-12 08:18') + pd.to_timedelta(rng.integers(0, 10, n) * 12, unit='h'),
+        'I04': rng.uniform(280, 360, n),
+        'I05': rng.uniform(260, 320, n),
+        'I04_quality_flags': rng.choice([0, 4, 8, 16], n),
+    })
+    codigos, anillos = grilla_region((-94.85, 35.88, -94.70, 36.0), 10, ruta_cache=None)
+
+    t = time.perf_counter()
+    agregados = agregar_por_celda(df, codigos_grilla=codigos)
+    print(f'agregar_por_celda (1M puntos): {time.perf_counter() - t:.2f} s, {len(agregados)} filas')
+
+    pasada = df[df['date_time'] == df['date_time'].iloc[0]]
+    t = time.perf_counter()
+    agregar_por_celda(pasada, codigos_grilla=codigos)
+    print(f'agregar_por_celda (1 pasada, {len(pasada)} puntos): {time.perf_counter() - t:.2f} s')
+
+    ## referencia: sjoin punto en poligono + groupby
+    t = time.perf_counter()
+    grilla = a_geodataframe(codigos, anillos)
+    puntos = gpd.GeoDataFrame(pasada, geometry=gpd.points_from_xy(pasada['longitude'], pasada['latitude']), crs='EPSG:4326')
+    unido = gpd.sjoin(puntos, grilla, predicate='within')
+    ref = unido[unido['I04_quality_flags'].isin([0, 4, 8])].groupby('Codigo')['I04'].agg(['mean', 'max'])
+    print(f'sjoin + groupby (1 pasada): {time.perf_counter() - t:.2f} s')
+
+    nuevo = agregar_por_celda(pasada, codigos_grilla=codigos).set_index('Codigo')
+    comun = ref.index.intersection(nuevo.index)
+    print('celdas iguales:', len(comun), 'de', len(ref),
+          '| max dif media:', np.abs(ref.loc[comun, 'mean'] - nuevo.loc[comun, 'I04_mean']).max())
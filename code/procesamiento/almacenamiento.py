@@ -0,0 +1,226 @@
+"""
+Capa de almacenamiento de los productos intermedios en GeoParquet.
+
+Los datasets particionados se guardan en estilo hive (ruta/satelite=suomi/zona=area2/fecha=2025-04-12/{nombre}.parquet),
+por lo que al leer se pueden proyectar columnas y filtrar por particion (o por estadisticas de row group)
+sin abrir el resto de los archivos.
+
+    escribir(gdf, ruta, particiones=['zona'])
+    leer(ruta, columnas=['zona', 'date_time'], filtros=[('satelite', 'in', ['suomi', 'noaa1'])])
+
+Ejecutar este archivo convierte los GeoJSON existentes al nuevo formato (ver `convertir_todo`).
+"""
+from pathlib import Path
+import os
+import re
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow.parquet as pq
+
+## union de pixeles por satelite (viz.py). Carpeta propia: la de los GeoJSON heredados (satellite_data/union)
+## tiene archivos que pyarrow intentaria leer como parte del dataset
+CARPETA_UNION = Path('satellite_data') / 'union_parquet'
+RUTA_UNION = Path('data/procesado') / CARPETA_UNION
+
+
+def _escribir_archivo(df, destino):
+    """Escribe un (Geo)DataFrame a parquet de forma atomica (archivo temporal + rename)."""
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    ## con prefijo '.' pyarrow lo ignora al leer el dataset si queda huerfano (corte antes del rename)
+    tmp = destino.with_name('.' + destino.name + '.tmp')
+    if isinstance(df, gpd.GeoDataFrame):
+        df.to_parquet(tmp, index=False, write_covering_bbox=True)   # columna bbox para filtrar por extension al leer
+    else:
+        df.to_parquet(tmp, index=False)
+    os.replace(tmp, destino)
+
+
+def ruta_particion(ruta, valores):
+    """Carpeta hive de una particion: ruta/col1=valor1/col2=valor2."""
+    ruta = Path(ruta)
+    for col, valor in valores.items():
+        ruta = ruta / f'{col}={valor}'
+    return ruta
+
+
+def escribir(gdf, ruta, particiones=None, nombre='part'):
+    """
+    Guarda un (Geo)DataFrame como GeoParquet.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame or DataFrame
+        Datos a guardar.
+    ruta : str or Path
+        Archivo .parquet (sin particiones) o carpeta raiz del dataset (con particiones).
+    particiones : list of str or None
+        Columnas de particion. Cada combinacion de valores se escribe en su carpeta hive
+        como {nombre}.parquet; volver a escribir el mismo nombre reemplaza solo ese archivo. No
+        pueden tener valores nulos (groupby los descartaria y pyarrow no lee la particion nula como
+        categoria).
+    nombre : str
+        Nombre del archivo dentro de cada particion (p.ej. la clave del granulo).
+
+    Returns
+    -------
+    list of Path
+        Archivos escritos.
+    """
+    if not particiones:
+        _escribir_archivo(gdf, ruta)
+        return [Path(ruta)]
+
+    nulos = gdf[particiones].isna().any(axis=1)
+    if nulos.any():
+        raise ValueError(f'{int(nulos.sum())} filas sin valor en las columnas de particion {particiones}')
+
+    escritos = []
+    for valores, grupo in gdf.groupby(particiones, sort=False, observed=True):
+        if not isinstance(valores, tuple):
+            valores = (valores,)
+        destino = ruta_particion(ruta, dict(zip(particiones, valores))) / f'{nombre}.parquet'
+        _escribir_archivo(grupo.drop(columns=particiones), destino)
+        escritos.append(destino)
+    return escritos
+
+
+def leer(ruta, columnas=None, filtros=None, bbox=None):
+    """
+    Lee un archivo o dataset GeoParquet.
+
+    Parameters
+    ----------
+    ruta : str or Path
+        Archivo .parquet o carpeta raiz de un dataset particionado.
+    columnas : list of str or None
+        Columnas a leer (incluidas las de particion). Si no se pide 'geometry' se retorna un
+        DataFrame sin geometria.
+    filtros : list of tuple or None
+        Filtros de pyarrow, p.ej. [('zona', '==', 'area2'), ('date_time', '>=', t0)]. Sobre columnas
+        de particion descartan carpetas completas; sobre el resto, row groups.
+    bbox : tuple or None
+        (minx, miny, maxx, maxy) para filtrar por geometria.
+
+    Returns
+    -------
+    GeoDataFrame or DataFrame
+    """
+    ruta = Path(ruta)
+    if not ruta.exists():
+        raise FileNotFoundError(ruta)
+
+    if columnas is not None and 'geometry' not in columnas:
+        df = pq.read_table(ruta, columns=columnas, filters=filtros).to_pandas()
+    else:
+        df = gpd.read_parquet(ruta, columns=columnas, filters=filtros, bbox=bbox)
+
+    # las columnas de particion vuelven como categoricas
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str)
+    return df
+
+
+def valores_particion(ruta, columna):
+    """Valores existentes de una columna de particion, leyendo solo los nombres de carpeta."""
+    patron = re.compile(rf'^{re.escape(columna)}=(.*)$')
+    valores = set()
+    for carpeta in Path(ruta).rglob(f'{columna}=*'):
+        m = patron.match(carpeta.name)
+        if m and carpeta.is_dir():
+            valores.add(m.group(1))
+    return sorted(valores)
+
+
+## datasets incrementales ----------------------
+def _path_registro(ruta, registro):
+    # los archivos que empiezan con '_' no se leen como parte del dataset
+    return Path(ruta) / f'_{registro}.txt'
+
+
+def claves_ingresadas(ruta, registro):
+    """Claves ya ingresadas por completo a un dataset incremental (p.ej. granulos de un satelite)."""
+    path = _path_registro(ruta, registro)
+    if not path.exists():
+        return set()
+    with open(path) as f:
+        return {linea.strip() for linea in f if linea.strip()}
+
+
+def registrar_claves(ruta, registro, claves):
+    """
+    Marca claves como ingresadas. Se llama despues de escribir todas sus particiones, asi una
+    clave a medio escribir se vuelve a ingresar (y sus archivos se reemplazan) en la siguiente corrida.
+    """
+    path = _path_registro(ruta, registro)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        for clave in claves:
+            f.write(f'{clave}\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+## conversion de GeoJSON existentes ----------------------
+def convertir_geojson(ruta_geojson, ruta_destino, particiones=None, nombre='part', columnas_extra=None):
+    """
+    Convierte un GeoJSON a GeoParquet (opcionalmente particionado).
+    columnas_extra: dict columna -> funcion(gdf) que agrega columnas antes de particionar.
+    """
+    gdf = gpd.read_file(ruta_geojson)
+    for col, funcion in (columnas_extra or {}).items():
+        gdf[col] = funcion(gdf)
+    return escribir(gdf, ruta_destino, particiones=particiones, nombre=nombre)
+
+
+def convertir_todo(base='data/procesado'):
+    """Convierte de una vez los GeoJSON intermedios del pipeline a GeoParquet."""
+    base = Path(base)
+
+    # merge por granulo (procesamiento_nc)
+    for archivo in (base / 'satellite_data').glob('*/merge_*.geojson'):
+        print(archivo)
+        convertir_geojson(archivo, archivo.with_suffix('.parquet'))
+
+    # union por satelite (viz), una parte por granulo
+    for archivo in (base / 'satellite_data' / 'union').glob('zonas_*.geojson'):
+        print(archivo)
+        satelite = archivo.stem.replace('zonas_', '')
+        gdf = gpd.read_file(archivo)
+        gdf['satelite'] = satelite
+        gdf['fecha'] = pd.to_datetime(gdf['date_time']).dt.strftime('%Y-%m-%d')
+        for clave, grupo in gdf.groupby('date_file'):
+            escribir(grupo, base / CARPETA_UNION, particiones=['satelite', 'zona', 'fecha'], nombre=clave)
+            registrar_claves(base / CARPETA_UNION, satelite, [clave])
+
+    # grilla healpix
+    for nombre in ['areas_grilla_healpix', 'areas_grilla_healpix_id_num']:
+        archivo = base / 'grilla' / f'{nombre}.geojson'
+        if archivo.exists():
+            print(archivo)
+            convertir_geojson(archivo, base / 'grilla' / nombre, particiones=['zona'])
+
+    # DEM por celda (gee_DEM) y por pixel (join_dem)
+    for archivo in (base / 'DEM').glob('*.geojson'):
+        print(archivo)
+        if archivo.stem.startswith('dem_'):
+            convertir_geojson(archivo, base / 'DEM' / 'dem_healpix', particiones=['zona'])
+        else:
+            convertir_geojson(archivo, base / 'DEM' / 'pixeles', particiones=['zona'],
+                              columnas_extra={'zona': lambda g, z=archivo.stem: z})
+
+    # ERA5 (gee_era5)
+    for archivo in (base / 'era5').glob('*.geojson'):
+        print(archivo)
+        m = re.match(r'(info_era5|era5)_(.+?)_(grilla|healpix)$', archivo.stem)
+        if m is None:
+            continue
+        destino = base / 'era5' / f'{m.group(1)}_{m.group(3)}'
+        convertir_geojson(archivo, destino, particiones=['zona'],
+                          columnas_extra={'zona': lambda g, z=m.group(2): z})
+
+
+if __name__ == "__main__":
+    convertir_todo()
@@ -0,0 +1,271 @@
+"""
+Animacion de la progresion de incendios (GIF/MP4) a partir de los pixeles VIIRS por fecha.
+
+- El fondo estatico (grilla HealPix + colorbar) se rasteriza una sola vez y cada frame lo pega con
+  figimage; por frame solo se dibujan los pixeles de esa pasada.
+- Los frames se renderizan en paralelo (backend Agg, sin pyplot) y se guardan como
+  {carpeta_frames}/{animacion}/{hash del render}/frame_{nombre}_{hash}.png: si el estilo, la extension y el
+  contenido del frame no cambiaron, el PNG existente se reutiliza. Al terminar se borran los frames de la
+  animacion que ya no se usan (render anterior o contenido que cambio).
+- Los frames se escriben en orden directo al GIF/MP4, sin mantenerlos todos en memoria.
+"""
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+import imageio
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.cm import ScalarMappable
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+
+# region de la figura (fraccion) para el mapa: espacio para el titulo arriba y la colorbar abajo
+REGION_MAPA = (0.02, 0.16, 0.98, 0.92)
+REGION_COLORBAR = [0.2, 0.07, 0.6, 0.03]
+
+_FONDO = None
+_ESTILO = None
+
+
+def anillos(geoms):
+    """
+    Anillos exteriores de un arreglo de poligonos, como coordenadas (n, 2) y offsets por anillo.
+    Los MultiPolygon se separan en partes; idx indica la geometria de origen de cada anillo.
+    """
+    partes, idx = shapely.get_parts(np.asarray(geoms), return_index=True)
+    exteriores = shapely.get_exterior_ring(partes)
+    coords = shapely.get_coordinates(exteriores)
+    offsets = np.concatenate([[0], np.cumsum(shapely.get_num_coordinates(exteriores))])
+    return coords, offsets, idx
+
+
+def _poligonos(coords, offsets):
+    return [coords[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+
+def _figura(estilo):
+    fig = Figure(figsize=estilo['figsize'], dpi=estilo['dpi'])
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _ejes(fig, extent):
+    """Ejes con aspecto igual centrados en REGION_MAPA; misma posicion en el fondo y en cada frame."""
+    x0, y0, x1, y1 = extent
+    ancho_fig, alto_fig = fig.get_size_inches()
+    izq, abajo, der, arriba = REGION_MAPA
+    escala = min((der - izq) * ancho_fig / (x1 - x0), (arriba - abajo) * alto_fig / (y1 - y0))
+    w = escala * (x1 - x0) / ancho_fig
+    h = escala * (y1 - y0) / alto_fig
+    ax = fig.add_axes([izq + ((der - izq) - w) / 2, abajo + ((arriba - abajo) - h) / 2, w, h])
+    ax.set_xlim(x0, x1)
+    ax.set_ylim(y0, y1)
+    ax.axis('off')
+    return ax
+
+
+def rasterizar_fondo(grilla, estilo):
+    """
+    Rasteriza una vez la grilla (solo bordes) y la colorbar en una imagen RGBA del tamaño del frame.
+
+    Parameters
+    ----------
+    grilla : GeoDataFrame
+        Celdas HealPix de la zona, en el mismo CRS que los pixeles.
+    estilo : dict
+        Parametros del frame (ver estilo_animacion).
+
+    Returns
+    -------
+    ndarray
+        Imagen (alto, ancho, 4) uint8.
+    """
+    fig = _figura(estilo)
+    ax = _ejes(fig, estilo['extent'])
+    coords, offsets, _ = anillos(grilla.geometry.values)
+    ax.add_collection(PolyCollection(_poligonos(coords, offsets), facecolors='none',
+                                     edgecolors='gray', linewidths=0.5))
+
+    cax = fig.add_axes(REGION_COLORBAR)
+    norm = Normalize(vmin=estilo['vmin'], vmax=estilo['vmax'])
+    cbar = fig.colorbar(ScalarMappable(norm=norm, cmap=estilo['cmap']), cax=cax, orientation='horizontal')
+    cbar.set_label(estilo['columna'])
+
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba()).copy()
+
+
+def _iniciar_worker(fondo, estilo):
+    global _FONDO, _ESTILO
+    _FONDO, _ESTILO = fondo, estilo
+
+
+def renderizar_frame(coords, offsets, valores, titulo, path):
+    """Dibuja los pixeles de un frame sobre el fondo y lo guarda (escritura atomica) en path."""
+    estilo = _ESTILO
+    fig = _figura(estilo)
+    fig.figimage(_FONDO, 0, 0, origin='upper', zorder=-1)
+    ax = _ejes(fig, estilo['extent'])
+    ax.add_collection(PolyCollection(_poligonos(coords, offsets), array=valores, cmap=estilo['cmap'],
+                                     norm=Normalize(vmin=estilo['vmin'], vmax=estilo['vmax']),
+                                     edgecolors='black', alpha=0.4))
+    ax.set_title(titulo)
+
+    tmp = f'{path}.tmp'
+    fig.savefig(tmp, dpi=estilo['dpi'], format='png')
+    os.replace(tmp, path)
+    return path
+
+
+def estilo_animacion(gdf, grilla, columna='I04', cmap='viridis', vmin=None, vmax=None, figsize=(8, 6), dpi=150):
+    """Parametros comunes a todos los frames: escala de colores fija y extension de grilla + pixeles."""
+    g0, g1, g2, g3 = grilla.total_bounds
+    p0, p1, p2, p3 = gdf.total_bounds
+    return {
+        'columna': columna,
+        'cmap': cmap,
+        'vmin': float(gdf[columna].min() if vmin is None else vmin),
+        'vmax': float(gdf[columna].max() if vmax is None else vmax),
+        'figsize': tuple(figsize),
+        'dpi': dpi,
+        'extent': (min(g0, p0), min(g1, p1), max(g2, p2), max(g3, p3)),
+    }
+
+
+def _firma(*partes):
+    h = hashlib.sha1()
+    for parte in partes:
+        h.update(np.ascontiguousarray(parte).tobytes() if isinstance(parte, np.ndarray) else repr(parte).encode())
+    return h.hexdigest()
+
+
+def _limpiar_cache(carpeta, vigentes):
+    """Borra de la carpeta de una animacion los frames (y temporales) que no estan en `vigentes`."""
+    vigentes = {Path(p) for p in vigentes}
+    for path in carpeta.rglob('frame_*.png*'):
+        if path not in vigentes:
+            path.unlink()
+    for sub in carpeta.iterdir():
+        if sub.is_dir() and not any(sub.iterdir()):
+            sub.rmdir()
+
+
+def renderizar_animacion(gdf, grilla, salida, columna='I04', columna_tiempo='date_time', columna_nombre='date_file',
+                         carpeta_frames='frames', fps=2, n_procesos=None, **kwargs_estilo):
+    """
+    Renderiza un frame por fecha y los escribe en orden en un GIF o MP4.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame
+        Pixeles (poligonos) con la columna a colorear, la fecha y el nombre del granulo.
+    grilla : GeoDataFrame
+        Grilla HealPix de fondo.
+    salida : str or Path
+        Archivo de salida; '.gif' o un formato de video ('.mp4', requiere imageio-ffmpeg).
+    columna, columna_tiempo, columna_nombre : str
+        Variable a colorear, columna que define los frames y columna con el nombre de cada frame.
+    carpeta_frames : str
+        Carpeta con los PNG de cada frame (cache entre corridas), en una subcarpeta por animacion (nombre
+        de `salida`) y por parametros de render.
+    fps : float
+        Frames por segundo de la animacion.
+    n_procesos : int or None
+        Procesos para renderizar (None: os.cpu_count()).
+    **kwargs_estilo
+        cmap, vmin, vmax, figsize, dpi (ver estilo_animacion).
+
+    Returns
+    -------
+    list of str
+        Rutas de los frames en el orden de la animacion.
+    """
+    estilo = estilo_animacion(gdf, grilla, columna=columna, **kwargs_estilo)
+    coords_grilla, _, _ = anillos(grilla.geometry.values)
+    ## parametros de render: grilla, estilo (escala, extension, tamaño) y ubicacion del mapa en la figura
+    firma_fondo = _firma(coords_grilla, sorted(estilo.items()), REGION_MAPA, REGION_COLORBAR)
+    carpeta = Path(carpeta_frames) / Path(salida).stem
+    carpeta_render = carpeta / firma_fondo[:16]
+    os.makedirs(carpeta_render, exist_ok=True)
+
+    ## frames: contenido y ruta (el hash cambia si cambian los pixeles, los valores o el fondo)
+    frames, pendientes = [], []
+    for fecha, grupo in gdf.sort_values(columna_tiempo).groupby(columna_tiempo, sort=True):
+        coords, offsets, idx = anillos(grupo.geometry.values)
+        valores = grupo[columna].to_numpy(dtype=float)[idx]
+        titulo = f"Incendios - {str(pd.Timestamp(fecha))}"
+        firma = _firma(firma_fondo, coords, offsets, valores, titulo)
+        path = str(carpeta_render / f"frame_{grupo[columna_nombre].iloc[0]}_{firma[:16]}.png")
+        frames.append(path)
+        if not os.path.exists(path):
+            pendientes.append((coords, offsets, valores, titulo, path))
+    print(f'{len(frames)} frames, {len(frames) - len(pendientes)} sin cambios')
+
+    if pendientes:
+        fondo = rasterizar_fondo(grilla, estilo)
+        with ProcessPoolExecutor(max_workers=n_procesos, initializer=_iniciar_worker,
+                                 initargs=(fondo, estilo)) as pool:
+            for _ in pool.map(renderizar_frame, *zip(*pendientes)):
+                pass
+
+    ## escritura en streaming: un frame en memoria a la vez
+    es_gif = str(salida).lower().endswith('.gif')
+    kwargs_writer = {'duration': 1000 / fps, 'loop': 0} if es_gif else {'fps': fps}
+    with imageio.get_writer(salida, mode='I', **kwargs_writer) as writer:
+        for path in frames:
+            imagen = imageio.v2.imread(path)
+            writer.append_data(imagen if es_gif else imagen[..., :3])
+
+    _limpiar_cache(carpeta, frames)
+    return frames
+
+
+if __name__ == "__main__":
+    ## benchmark con pixeles y grilla sinteticos: loop serial original vs fondo cacheado + pool
+    import time
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    rng = np.random.default_rng(0)
+    paso = 0.005
+    xs, ys = np.meshgrid(np.arange(-94.9, -94.6, paso), np.arange(35.8, 36.1, paso))
+    grilla = gpd.GeoDataFrame(geometry=[box(x, y, x + paso, y + paso) for x, y in zip(xs.ravel(), ys.ravel())],
+                              crs='EPSG:4326')
+    filas = []
+    for i in range(40):
+        n = 400
+        x0 = rng.uniform(-94.9, -94.61, n)
+        y0 = rng.uniform(35.8, 36.09, n)
+        filas.append(gpd.GeoDataFrame({'I04': rng.uniform(280, 360, n),
+                                       'date_time': pd.Timestamp('2025-04-12') + pd.Timedelta(hours=12 * i),
+                                       'date_file': f'A2025{102 + i // 2:03d}.{(i % 2) * 12:02d}00.002'},
+                                      geometry=[box(x, y, x + 0.004, y + 0.004) for x, y in zip(x0, y0)],
+                                      crs='EPSG:4326'))
+    gdf = pd.concat(filas, ignore_index=True)
+
+    t = time.perf_counter()
+    norm = Normalize(vmin=gdf['I04'].min(), vmax=gdf['I04'].max())
+    os.makedirs('/tmp/frames_serial', exist_ok=True)
+    for fecha in gdf.date_time.unique():
+        sub = gdf[gdf['date_time'] == fecha]
+        fig, ax = plt.subplots(figsize=(8, 6))
+        grilla.plot(ax=ax, facecolor='none', edgecolor='gray', linewidth=0.5)
+        sub.plot(ax=ax, column='I04', cmap='viridis', edgecolor='black', alpha=0.4, norm=norm)
+        sm = plt.cm.ScalarMappable(cmap='viridis', norm=norm)
+        fig.colorbar(sm, ax=ax, orientation='horizontal', fraction=0.046, pad=0.04)
+        plt.savefig(f'/tmp/frames_serial/{sub.date_file.iloc[0]}.png', bbox_inches='tight', dpi=150)
+        plt.close()
+    print(f'serial (solo PNG): {time.perf_counter() - t:.1f} s')
+
+    for corrida in ['fria', 'cache']:
+        t = time.perf_counter()
+        renderizar_animacion(gdf, grilla, '/tmp/anim.gif', carpeta_frames='/tmp/frames_anim')
+        print(f'renderizar_animacion ({corrida}, PNG + GIF): {time.perf_counter() - t:.1f} s')
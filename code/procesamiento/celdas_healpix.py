@@ -0,0 +1,212 @@
+"""
+Generacion de la grilla rHEALPix por zona, vectorizada y con cache en disco de los vertices de cada celda.
+
+- Las celdas de la region se enumeran sin construir objetos Cell (cells_in_box + vertices planos) y se
+  ordenan igual que cells_from_region (filas de norte a sur, celdas de oeste a este).
+- En la region ecuatorial (celdas 'quad') la proyeccion inversa es separable: la longitud depende solo de x
+  y la latitud solo de y. Se proyecta una vez cada x y cada y distintos (~raiz de n llamadas) con la misma
+  funcion escalar que usa Cell.boundary, por lo que los vertices son identicos bit a bit a los del loop
+  por celda. Las celdas polares usan Cell.boundary.
+- Los vertices calculados se guardan en data/procesado/grilla/cache_celdas/nivel={N}/: cada celda se
+  calcula una sola vez, aunque las zonas se solapen o se vuelvan a generar.
+
+El resultado es una tabla en arreglos (codigos, coords de forma (n, 5, 2)); los poligonos se construyen
+solo al final con a_geodataframe.
+"""
+from functools import lru_cache
+from pathlib import Path
+import hashlib
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from rhealpixdggs.dggs import RHEALPixDGGS
+
+from almacenamiento import escribir, leer
+
+RUTA_CACHE = 'data/procesado/grilla/cache_celdas'
+COLUMNAS_CACHE = [f'lon_{i}' for i in range(4)] + [f'lat_{i}' for i in range(4)]
+DECIMALES = 14
+
+
+@lru_cache(maxsize=None)
+def dggs():
+    """rHEALPix por defecto del proyecto (WGS84, N_side=3), construido una vez por proceso."""
+    return RHEALPixDGGS()
+
+
+def codigos_region(nivel, bounds, rdggs=None):
+    """
+    Codigos de las celdas de nivel `nivel` que cubren el rectangulo lon/lat `bounds`.
+
+    Parameters
+    ----------
+    nivel : int
+        Resolucion rHEALPix.
+    bounds : tuple
+        (minx, miny, maxx, maxy) en grados.
+    rdggs : RHEALPixDGGS or None
+        Grilla (por defecto `dggs()`).
+
+    Returns
+    -------
+    ndarray of str
+        Los mismos codigos y en el mismo orden que recorrer rdggs.cells_from_region(nivel, nw, se, plane=False).
+    """
+    rdggs = rdggs or dggs()
+    nw = (bounds[0], bounds[3])
+    se = (bounds[2], bounds[1])
+
+    candidatas = rdggs.cells_in_box(nivel, nw, se, plane=False)
+    if not (rdggs.shapes(candidatas) == 'quad').all():
+        # region con celdas polares: el recorrido de cells_from_region no es un rectangulo en el plano
+        return np.array([str(c) for fila in rdggs.cells_from_region(nivel, nw, se, plane=False) for c in fila])
+
+    ## rectangulo plano entre la celda que contiene la esquina nw y la que contiene la esquina se
+    esquinas = rdggs.cells_from_points(np.array([nw[0], se[0]]), np.array([nw[1], se[1]]), nivel, plane=False)
+    (x0, y0), (x1, y1) = rdggs.boundary_array(esquinas, n=2, plane=True)[:, 0]
+    ul = rdggs.boundary_array(candidatas, n=2, plane=True)[:, 0]
+    dentro = (ul[:, 0] >= x0) & (ul[:, 0] <= x1) & (ul[:, 1] <= y0) & (ul[:, 1] >= y1)
+    codigos, ul = candidatas[dentro], ul[dentro]
+    return codigos[np.lexsort((ul[:, 0], -ul[:, 1]))]
+
+
+def _vertices_quad(rdggs, codigos):
+    """Vertices (nw, ne, se, sw) de celdas ecuatoriales proyectando solo los x e y distintos."""
+    plano = rdggs.boundary_array(codigos, n=2, plane=True)
+    xs, ix = np.unique(plano[:, :, 0], return_inverse=True)
+    ys, iy = np.unique(plano[:, :, 1], return_inverse=True)
+    x_ref, y_ref = float(np.median(xs)), float(np.median(ys))
+    lon = np.array([rdggs.rhealpix(float(x), y_ref, inverse=True, region='equatorial')[0] for x in xs])
+    lat = np.array([rdggs.rhealpix(x_ref, float(y), inverse=True, region='equatorial')[1] for y in ys])
+    return np.stack([lon[ix.reshape(plano.shape[:2])], lat[iy.reshape(plano.shape[:2])]], axis=-1)
+
+
+def _vertices_celda(rdggs, codigo):
+    """Vertices de una celda con Cell.boundary (celdas polares)."""
+    celda = rdggs.cell([codigo[0]] + [int(c) for c in codigo[1:]])
+    return np.array(celda.boundary(n=2, plane=False), dtype=float)
+
+
+def calcular_vertices(codigos, rdggs=None):
+    """
+    Vertices de las celdas, redondeados a 14 decimales como en grilla_healpix.py.
+
+    Returns
+    -------
+    ndarray
+        Forma (n, 4, 2): (lon, lat) de los vertices nw, ne, se, sw.
+    """
+    rdggs = rdggs or dggs()
+    codigos = np.asarray(codigos, dtype=str)
+    vertices = np.empty((len(codigos), 4, 2))
+    if len(codigos) == 0:
+        return vertices
+
+    quad = rdggs.shapes(codigos) == 'quad'
+    if quad.any():
+        vertices[quad] = _vertices_quad(rdggs, codigos[quad])
+    for i in np.flatnonzero(~quad):
+        vertices[i] = _vertices_celda(rdggs, codigos[i])
+    return np.round(vertices, DECIMALES)
+
+
+def leer_cache(nivel, ruta_cache=RUTA_CACHE):
+    """Vertices ya calculados de un nivel, indexados por Codigo (vacio si no hay cache)."""
+    if ruta_cache is None or not (Path(ruta_cache) / f'nivel={nivel}').exists():
+        return pd.DataFrame(columns=COLUMNAS_CACHE, index=pd.Index([], name='Codigo'), dtype=float)
+    cache = leer(ruta_cache, columnas=['Codigo'] + COLUMNAS_CACHE, filtros=[('nivel', '==', nivel)])
+    return cache.drop_duplicates('Codigo').set_index('Codigo')
+
+
+def vertices_celdas(codigos, nivel, ruta_cache=RUTA_CACHE, rdggs=None):
+    """
+    Vertices (n, 4, 2) de las celdas, leyendo del cache y calculando (y agregando al cache) solo las nuevas.
+    """
+    codigos = np.asarray(codigos, dtype=str)
+    cache = leer_cache(nivel, ruta_cache)
+
+    nuevas = np.setdiff1d(codigos, cache.index.to_numpy(dtype=str))
+    if len(nuevas):
+        vertices = calcular_vertices(nuevas, rdggs)
+        df = pd.DataFrame(np.concatenate([vertices[:, :, 0], vertices[:, :, 1]], axis=1), columns=COLUMNAS_CACHE)
+        df.insert(0, 'Codigo', nuevas)
+        df['nivel'] = nivel
+        if ruta_cache:
+            # un archivo por lote de celdas nuevas: el cache solo crece, nunca se reescribe
+            firma = hashlib.sha1('\n'.join(nuevas).encode()).hexdigest()[:16]
+            escribir(df, ruta_cache, particiones=['nivel'], nombre=firma)
+        cache = pd.concat([cache, df.drop(columns='nivel').set_index('Codigo')])
+    print(f'nivel {nivel}: {len(codigos)} celdas, {len(nuevas)} calculadas')
+
+    tabla = cache.loc[codigos, COLUMNAS_CACHE].to_numpy(dtype=float)
+    return np.stack([tabla[:, :4], tabla[:, 4:]], axis=-1)
+
+
+def grilla_region(bounds, nivel=10, ruta_cache=RUTA_CACHE, rdggs=None):
+    """
+    Grilla de una zona como arreglos.
+
+    Parameters
+    ----------
+    bounds : tuple
+        (minx, miny, maxx, maxy) de la zona en grados.
+    nivel : int
+        Resolucion rHEALPix (10 en el proyecto; 11 y 12 para mas detalle).
+    ruta_cache : str or None
+        Dataset del cache de vertices (None: sin cache).
+
+    Returns
+    -------
+    codigos : ndarray of str
+        Codigo de cada celda.
+    coords : ndarray
+        Anillos cerrados de forma (n, 5, 2) en lon/lat.
+    """
+    codigos = codigos_region(nivel, bounds, rdggs)
+    vertices = vertices_celdas(codigos, nivel, ruta_cache, rdggs)
+    return codigos, np.concatenate([vertices, vertices[:, :1]], axis=1)
+
+
+def a_geodataframe(codigos, coords, **columnas):
+    """GeoDataFrame (EPSG:4326) con geometria y Codigo a partir de la tabla en arreglos."""
+    gdf = gpd.GeoDataFrame(geometry=shapely.polygons(coords), crs='EPSG:4326')
+    gdf['Codigo'] = codigos
+    for nombre, valor in columnas.items():
+        gdf[nombre] = valor
+    return gdf
+
+
+if __name__ == "__main__":
+    ## benchmark: loop por celda original vs version vectorizada, en una zona de ~0.15 x 0.12 grados
+    import tempfile
+    import time
+
+    rdggs = dggs()
+    bounds = (-94.85, 35.88, -94.70, 36.0)
+
+    t = time.perf_counter()
+    codigo, coords_loop = [], []
+    for row in rdggs.cells_from_region(10, (bounds[0], bounds[3]), (bounds[2], bounds[1]), plane=False):
+        for cell in row:
+            celda = str(cell)
+            c = rdggs.cell([celda[0]] + [int(c) for c in celda[1:]])
+            coordenadas = [tuple(round(val, 14) for val in d) for d in c.boundary(n=2, plane=False)]
+            if coordenadas[0] != coordenadas[-1]:
+                coordenadas.append(coordenadas[0])
+            codigo.append(celda)
+            coords_loop.append(coordenadas)
+    print(f'loop por celda, nivel 10: {time.perf_counter() - t:.2f} s ({len(codigo)} celdas)')
+
+    with tempfile.TemporaryDirectory() as cache:
+        for corrida in ['sin cache', 'con cache']:
+            t = time.perf_counter()
+            codigos, coords = grilla_region(bounds, 10, cache)
+            print(f'grilla_region nivel 10 ({corrida}): {time.perf_counter() - t:.2f} s')
+        print('identico al loop:', list(codigos) == codigo and np.array_equal(coords, np.array(coords_loop)))
+
+        for nivel in [11, 12]:
+            t = time.perf_counter()
+            codigos, coords = grilla_region(bounds, nivel, cache)
+            print(f'grilla_region nivel {nivel}: {time.perf_counter() - t:.2f} s ({len(codigos)} celdas)')
@@ -0,0 +1,476 @@
+"""
+Lectura y union de granulos VIIRS (pares bandas VNP02IMG / coordenadas VNP03IMG) para las zonas de interes.
+
+Incluye el runner paralelo usado por procesamiento_nc.py: cada granulo se procesa en un worker del
+pool, la salida (GeoParquet) se escribe de forma atomica (archivo temporal + rename) y el resultado (estado, filas,
+tiempo, checksums de entrada) queda en un manifiesto JSONL por clave (p.ej. A2025102.0818.002),
+asi al re-ejecutar solo se saltan los granulos que realmente terminaron. Si un worker muere (p.ej. sin memoria)
+solo su granulo queda con error y el resto sigue en un pool nuevo.
+"""
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+import time
+
+import rioxarray
+import xarray as xr
+import geopandas as gpd
+import pandas as pd
+import numpy as np
+
+from pixel_viirs import make_viirs_pixels
+from almacenamiento import escribir
+
+import warnings
+from rasterio.errors import NotGeoreferencedWarning
+
+warnings.filterwarnings("ignore", category=NotGeoreferencedWarning)
+
+
+## lectura ----------------------
+def mascara_bbox_areas(lat, lon, areas):
+    """
+    Mascara booleana de los puntos que caen en el bbox de alguna zona.
+    Trabaja sobre los arreglos crudos de lat/lon, antes de crear DataFrames o Points.
+    """
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    bounds = areas.geometry.bounds.values
+
+    # primero el bbox que contiene a todas las zonas, luego cada zona solo sobre esos puntos
+    minx, miny = bounds[:, 0].min(), bounds[:, 1].min()
+    maxx, maxy = bounds[:, 2].max(), bounds[:, 3].max()
+    mascara = (lon >= minx) & (lon <= maxx) & (lat >= miny) & (lat <= maxy)
+
+    idx = np.flatnonzero(mascara)
+    lat_sel, lon_sel = lat.ravel()[idx], lon.ravel()[idx]
+    dentro = np.zeros(idx.shape, dtype=bool)
+    for minx, miny, maxx, maxy in bounds:
+        dentro |= (lon_sel >= minx) & (lon_sel <= maxx) & (lat_sel >= miny) & (lat_sel <= maxy)
+
+    mascara = np.zeros(lat.size, dtype=bool)
+    mascara[idx[dentro]] = True
+    return mascara.reshape(lat.shape)
+
+
+def filtrar_por_areas_y_unir(gdf, areas):
+    if len(areas) == 0:
+        return gpd.GeoDataFrame(columns=gdf.columns.tolist() + ["zona"], crs=gdf.crs)
+
+    ## una sola consulta al STRtree de las zonas en vez de un intersects por zona
+    idx_puntos, idx_areas = areas.sindex.query(gdf.geometry, predicate='intersects')
+
+    # mismo orden que antes: por zona y, dentro de cada zona, en el orden original de los puntos
+    orden = np.lexsort((idx_puntos, idx_areas))
+    gdf_unido = gdf.iloc[idx_puntos[orden]].reset_index(drop=True)
+    gdf_unido["zona"] = areas['zona'].values[idx_areas[orden]]
+
+    return gpd.GeoDataFrame(gdf_unido, crs=gdf.crs)
+
+
+def ventanas_swath(lat, lon, areas, margen=0):
+    """
+    Ventanas (fila_ini, fila_fin, col_ini, col_fin) del swath que tocan el bbox de cada zona, ampliadas en
+    `margen` pixeles (recortadas al swath). Las ventanas que se solapan se fusionan despues de ampliarlas,
+    asi ningun pixel se lee dos veces.
+    """
+    n_filas, n_cols = lat.shape
+    ventanas = []
+    for minx, miny, maxx, maxy in areas.geometry.bounds.values:
+        m = (lon >= minx) & (lon <= maxx) & (lat >= miny) & (lat <= maxy)
+        filas = np.flatnonzero(m.any(axis=1))
+        if filas.size == 0:
+            continue
+        cols = np.flatnonzero(m.any(axis=0))
+        ventanas.append([max(filas[0] - margen, 0), min(filas[-1] + 1 + margen, n_filas),
+                         max(cols[0] - margen, 0), min(cols[-1] + 1 + margen, n_cols)])
+
+    fusion = True
+    while fusion:
+        fusion = False
+        for i in range(len(ventanas)):
+            for j in range(i + 1, len(ventanas)):
+                a, b = ventanas[i], ventanas[j]
+                if a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]:
+                    ventanas[i] = [min(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])]
+                    del ventanas[j]
+                    fusion = True
+                    break
+            if fusion:
+                break
+
+    return [tuple(int(v) for v in w) for w in ventanas]
+
+
+def escalar(var):
+    return (var * var.attrs['scale_factor']) + var.attrs['add_offset']
+
+
+def leer_variables(coords, data_nasa, filas=slice(None), cols=slice(None)):
+    """
+    Lee y escala las variables del granulo, solo en la ventana (filas, cols).
+    open_rasterio es lazy, por lo que se leen del disco solo esos slices.
+    """
+    geo = coords[0].isel(band=0, y=filas, x=cols)
+    nasa = data_nasa.isel(band=0, y=filas, x=cols)
+
+    return xr.Dataset({
+        # VNP03IMG coordenadas y angulos
+        'latitude': geo['latitude'],
+        'longitude': geo['longitude'],
+        'sensor_zenith': escalar(geo['sensor_zenith']),
+        'sensor_azimuth': escalar(geo['sensor_azimuth']),
+        # VNP02IMG bandas termicas escaladas
+        'I04': escalar(nasa['I04']),
+        'I05': escalar(nasa['I05']),  
+        'I04_quality_flags': nasa['I04_quality_flags'], 
+        'I05_quality_flags': nasa['I05_quality_flags'], 
+        'quality_flag': geo['quality_flag'],
+        ## incertidumbre -> nos sirve para evaluar la precision del valor
+        'I04_uncert_index': 1 + nasa.I04_uncert_index.attrs['scale_factor'] * (nasa['I04_uncert_index'] ** 2),
+        'I05_uncert_index': 1 + nasa.I05_uncert_index.attrs['scale_factor'] * (nasa['I05_uncert_index'] ** 2)
+    })
+
+
+def leer_granulo(bandas, coordenadas, areas, lectura_ventana=True):
+    """
+    Lee el par (bandas, coordenadas) y retorna un DataFrame con los pixeles dentro del bbox de las zonas.
+
+    Con lectura_ventana=True se buscan primero las ventanas del swath que tocan las zonas
+    (solo con latitude/longitude) y se leen/escalan unicamente esos slices. Con False se
+    escala el swath completo, como antes. Ambos modos retornan las mismas filas y en el mismo orden.
+    """
+    coords = rioxarray.open_rasterio(coordenadas)
+    data_nasa = rioxarray.open_rasterio(bandas)
+
+    if lectura_ventana:
+        lat = coords[0]['latitude'].isel(band=0).values
+        lon = coords[0]['longitude'].isel(band=0).values
+        n_cols = lat.shape[1]
+        ventanas = ventanas_swath(lat, lon, areas)
+        del lat, lon
+    else:
+        n_cols = None
+        ventanas = [(None, None, None, None)]
+
+    partes = []
+    for f0, f1, c0, c1 in ventanas:
+        ds = leer_variables(coords, data_nasa, slice(f0, f1), slice(c0, c1))
+        mascara = mascara_bbox_areas(ds['latitude'].values, ds['longitude'].values, areas)
+        df = pd.DataFrame({nombre: var.values[mascara] for nombre, var in ds.data_vars.items()})
+        if n_cols is not None:
+            filas, cols = np.nonzero(mascara)
+            df['_indice'] = (filas + f0) * n_cols + (cols + c0)   ## posicion en el swath completo
+        partes.append(df)
+
+    if not partes:
+        return pd.DataFrame()
+
+    df = pd.concat(partes, ignore_index=True)
+    if n_cols is not None:
+        df = df.sort_values('_indice', kind='stable').drop(columns='_indice').reset_index(drop=True)
+
+    return df.dropna(subset=['latitude', 'longitude', 'I04', 'I05'])
+
+
+def reiniciar_pico_memoria():
+    """Reinicia el pico de RSS del proceso (solo Linux)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def pico_memoria_mb():
+    """Pico de RSS del proceso en MB (VmHWM en Linux, peak_wset con psutil en Windows)."""
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmHWM'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1024 ** 2
+    except ImportError:
+        return float('nan')
+
+
+def medir_lectura(bandas, coordenadas, areas, lectura_ventana=True):
+    """Lee un granulo con leer_granulo y retorna filas, segundos y pico de RSS del proceso."""
+    reiniciar_pico_memoria()
+    t0 = time.perf_counter()
+    df = leer_granulo(bandas, coordenadas, areas, lectura_ventana)
+    return {'lectura_ventana': lectura_ventana, 'filas': len(df),
+            'segundos': round(time.perf_counter() - t0, 3), 'pico_rss_mb': round(pico_memoria_mb(), 1)}
+
+
+def comparar_lectura(bandas, coordenadas, areas, repeticiones=3):
+    """
+    Lectura por ventanas vs swath completo de un mismo granulo.
+
+    Cada lectura corre en un proceso nuevo (max_tasks_per_child=1), asi el pico de RSS de un modo no
+    queda en el del otro y ninguna lectura aprovecha arreglos ya cargados por la anterior (la cache de
+    disco del sistema si se comparte: la primera repeticion es la lectura en frio).
+
+    Returns
+    -------
+    DataFrame
+        Una fila por lectura: lectura_ventana, repeticion, filas, segundos, pico_rss_mb.
+    """
+    registros = []
+    for repeticion in range(repeticiones):
+        for lectura_ventana in (True, False):
+            with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+                registro = pool.submit(medir_lectura, str(bandas), str(coordenadas), areas,
+                                       lectura_ventana).result()
+            registros.append({**registro, 'repeticion': repeticion})
+    return pd.DataFrame(registros)
+
+
+def pares_desde_plan(path_plan, satelite=None):
+    """
+    Pares (clave, bandas, coordenadas) desde un plan de descarga (code/download/plan_descarga.py):
+    solo granulos cuya huella toca la zona y con ambos archivos ya descargados.
+    """
+    plan = pd.read_csv(path_plan)
+    plan = plan[plan['intersecta']]
+    if satelite is not None:
+        plan = plan[plan['satelite'] == satelite]
+    return [(f.clave, f.archivo_bandas, f.archivo_coords) for f in plan.itertuples()
+            if os.path.exists(f.archivo_bandas) and os.path.exists(f.archivo_coords)]
+
+
+## escritura y manifiesto ----------------------
+def md5_archivo(path, bloque=8 * 1024 ** 2):
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(bloque), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def firma_archivo(path, previa=None):
+    """
+    Firma de un archivo de entrada: tamaño, mtime y md5.
+    Si tamaño y mtime coinciden con la firma previa se reutiliza su md5 (no se vuelve a leer el archivo).
+    """
+    st = os.stat(path)
+    firma = {'tamano': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if previa and previa.get('tamano') == firma['tamano'] and previa.get('mtime_ns') == firma['mtime_ns']:
+        firma['md5'] = previa['md5']
+    else:
+        firma['md5'] = md5_archivo(path)
+    return firma
+
+
+def leer_manifiesto(path_manifiesto):
+    """Ultimo registro del manifiesto JSONL para cada clave de granulo."""
+    registros = {}
+    if not os.path.exists(path_manifiesto):
+        return registros
+    with open(path_manifiesto) as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                reg = json.loads(linea)
+            except json.JSONDecodeError:   # linea cortada por una caida durante la escritura
+                continue
+            registros[reg['clave']] = reg
+    return registros
+
+
+def registrar(path_manifiesto, registro):
+    with open(path_manifiesto, 'a') as f:
+        f.write(json.dumps(registro) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def granulo_terminado(registro, bandas, coordenadas):
+    """
+    True si el granulo termino (con o sin datos en las zonas) con estas mismas entradas
+    (mismo md5) y su salida existe.
+    """
+    if registro is None or registro.get('estado') not in ('ok', 'sin_datos'):
+        return False
+    if firma_archivo(bandas, registro.get('firma_bandas'))['md5'] != registro.get('md5_bandas'):
+        return False
+    if firma_archivo(coordenadas, registro.get('firma_coords'))['md5'] != registro.get('md5_coords'):
+        return False
+    return registro['estado'] == 'sin_datos' or os.path.exists(registro['salida'])
+
+
+## runner ----------------------
+def procesar_granulo(clave, bandas, coordenadas, areas, path_save, lectura_ventana=True, geometria_pixel=False):
+    """
+    Procesa un par (bandas, coordenadas) y escribe merge_{clave}.parquet.
+    Retorna el registro para el manifiesto; los errores se registran en vez de propagarse.
+    """
+    reiniciar_pico_memoria()
+    t0 = time.perf_counter()
+    salida = f'{path_save}/merge_{clave}.parquet'
+    registro = {'clave': clave, 'salida': salida, 'filas': 0}
+
+    try:
+        firma_b = firma_archivo(bandas)
+        firma_c = firma_archivo(coordenadas)
+        registro.update({'md5_bandas': firma_b['md5'], 'md5_coords': firma_c['md5'],
+                         'firma_bandas': firma_b, 'firma_coords': firma_c})
+
+        df = leer_granulo(bandas, coordenadas, areas, lectura_ventana)
+        gdf_unido = None
+        if df.shape[0] > 0:
+            gdf = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df.longitude,
+                                                                   df.latitude), crs="EPSG:4326")
+            gdf_unido = filtrar_por_areas_y_unir(gdf, areas)
+            del gdf, df
+
+        if gdf_unido is None or gdf_unido.shape[0] == 0:
+            registro['estado'] = 'sin_datos'
+        else:
+            if geometria_pixel:
+                gdf_unido['geometry'] = make_viirs_pixels(gdf_unido['latitude'].values,
+                                                          gdf_unido['longitude'].values,
+                                                          gdf_unido['sensor_zenith'].values,
+                                                          gdf_unido['sensor_azimuth'].values)
+            escribir(gdf_unido, salida)
+            registro['estado'] = 'ok'
+            registro['filas'] = int(gdf_unido.shape[0])
+            registro['filas_por_zona'] = {str(k): int(v) for k, v in gdf_unido.zona.value_counts().items()}
+    except Exception as e:
+        registro['estado'] = 'error'
+        registro['error'] = f'{type(e).__name__}: {e}'
+
+    registro['segundos'] = round(time.perf_counter() - t0, 3)
+    registro['pico_rss_mb'] = round(pico_memoria_mb(), 1)
+    return registro
+
+
+def _limitar_memoria(memoria_max_gb):
+    """Inicializador de cada worker: limita su memoria virtual (solo en sistemas con `resource`)."""
+    if memoria_max_gb is None:
+        return
+    try:
+        import resource
+    except ImportError:
+        return
+    limite = int(memoria_max_gb * 1024 ** 3)
+    resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+
+
+def _ejecutar_tanda(pendientes, n_procesos, memoria_max_gb, argumentos, terminar):
+    """
+    Procesa granulos de `pendientes` (deque, se consume) en un pool, con a lo mas n_procesos en curso, y llama
+    a terminar(registro) con cada resultado.
+
+    Returns
+    -------
+    list of tuple
+        Tareas que estaban en curso si un worker murio y rompio el pool (vacia si el pool termino bien).
+    """
+    with ProcessPoolExecutor(max_workers=n_procesos, max_tasks_per_child=1,
+                             initializer=_limitar_memoria, initargs=(memoria_max_gb,)) as pool:
+        en_curso = {}
+        while pendientes or en_curso:
+            while pendientes and len(en_curso) < n_procesos:
+                clave, bandas, coordenadas = tarea = pendientes.popleft()
+                en_curso[pool.submit(procesar_granulo, clave, str(bandas), str(coordenadas), *argumentos)] = tarea
+            hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            rotos = []
+            for futuro in hechos:
+                tarea = en_curso.pop(futuro)
+                if isinstance(futuro.exception(), BrokenProcessPool):
+                    rotos.append(tarea)
+                else:
+                    terminar(futuro.result())
+            if rotos:
+                return rotos + list(en_curso.values())
+    return []
+
+
+def ejecutar_granulos(pares, areas, path_save, path_manifiesto=None, n_procesos=None,
+                      memoria_max_gb=None, lectura_ventana=True, geometria_pixel=False):
+    """
+    Procesa en paralelo la lista de pares (clave, bandas, coordenadas).
+
+    Parameters
+    ----------
+    pares : list of tuple
+        (clave, path_bandas, path_coordenadas) de cada granulo.
+    areas : GeoDataFrame
+        Zonas de interes con columna 'zona'.
+    path_save : str
+        Carpeta de salida de los merge_{clave}.parquet.
+    path_manifiesto : str or None
+        Manifiesto JSONL; por defecto {path_save}/manifiesto.jsonl.
+    n_procesos : int or None
+        Numero de workers (None = todos los cores).
+    memoria_max_gb : float or None
+        Limite de memoria por worker. Cada worker procesa un solo granulo y se recicla,
+        por lo que la memoria se devuelve al sistema entre granulos.
+
+    Returns
+    -------
+    list of dict
+        Registros escritos en el manifiesto en esta ejecucion.
+    """
+    os.makedirs(path_save, exist_ok=True)
+    if path_manifiesto is None:
+        path_manifiesto = f'{path_save}/manifiesto.jsonl'
+    manifiesto = leer_manifiesto(path_manifiesto)
+
+    tareas = []
+    for clave, bandas, coordenadas in pares:
+        if granulo_terminado(manifiesto.get(clave), bandas, coordenadas):
+            print(f"Granulo ya procesado: {clave}")
+            continue
+        tareas.append((clave, bandas, coordenadas))
+
+    print(f'{len(tareas)} granulos por procesar ({len(pares) - len(tareas)} ya terminados)')
+    registros = []
+    if not tareas:
+        return registros
+
+    n_procesos = n_procesos or os.cpu_count()
+    argumentos = (areas, path_save, lectura_ventana, geometria_pixel)
+
+    def terminar(registro):
+        registro['fecha_proceso'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        registrar(path_manifiesto, registro)
+        registros.append(registro)
+        print(f"{registro['clave']}: {registro['estado']} | filas: {registro['filas']} | "
+              f"{registro.get('segundos', float('nan')):.1f} s | pico RSS: {registro.get('pico_rss_mb', float('nan')):.0f} MB")
+
+    pendientes = deque(tareas)
+    while pendientes:
+        sospechosos = _ejecutar_tanda(pendientes, n_procesos, memoria_max_gb, argumentos, terminar)
+        ## un worker murio (p.ej. sin memoria) y rompio el pool: los granulos que estaban en curso se reintentan
+        ## de a uno, cada uno en su propio pool, y solo el que vuelve a matar a su worker queda con error;
+        ## los que no alcanzaron a empezar siguen en `pendientes` para un pool nuevo
+        for tarea in sospechosos:
+            if _ejecutar_tanda(deque([tarea]), 1, memoria_max_gb, argumentos, terminar):
+                terminar({'clave': tarea[0], 'estado': 'error', 'filas': 0,
+                          'error': 'BrokenProcessPool: el worker termino abruptamente'})
+
+    return registros
+
+
+if __name__ == "__main__":
+    ## comparacion en un granulo real: python granulos_viirs.py VNP02IMG...nc VNP03IMG...nc [areas.geojson]
+    import sys
+
+    bandas, coordenadas = sys.argv[1:3]
+    path_areas = sys.argv[3] if len(sys.argv) > 3 else 'data/procesado/zonas_incendios/areas_buffer.geojson'
+    tabla = comparar_lectura(bandas, coordenadas, gpd.read_file(path_areas))
+    print(tabla)
+    print(tabla.groupby('lectura_ventana')[['filas', 'segundos', 'pico_rss_mb']].median())
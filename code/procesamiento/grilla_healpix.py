@@ -1,56 +1,40 @@
-from rhealpixdggs.dggs import *
 import geopandas as gpd
-from shapely.geometry import Polygon
 from pathlib import Path
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
+from almacenamiento import escribir
+from celdas_healpix import grilla_region, a_geodataframe
+from indice_healpix import codigos_a_ids
+
 ## areas de incendios (4)
 path_areas = Path('data/procesado/zonas_incendios/areas_buffer.geojson')
 areas = gpd.read_file(path_areas)
 
-rdggs = RHEALPixDGGS()
-
 Nivel = 10
 list_gdf = []
 
 for zona in areas['zona']:
     print(zona)
     coords = areas[areas['zona'] == zona].iloc[0].geometry
-    nw = (coords.bounds[0], coords.bounds[3])
-    se = (coords.bounds[2], coords.bounds[1])
-
-
-    polygons = []
-    codigo = []
-    cells = rdggs.cells_from_region(Nivel, nw, se, plane=False)
-    for row in cells:
-        for cell in row:
-            coordenadas = []
-            celda = str(cell)
-            primero = [celda[0]]+ [int(c) for c in celda[1:]]
-            c = rdggs.cell(primero)
-            for d in c.boundary(n=2, plane=False):
-                # coord = tuple(my_round(val, 14) for val in d)
-                coord = tuple(round(val, 14) for val in d)            
-                coordenadas.append(coord)
-            if coordenadas[0] != coordenadas[-1]:
-                coordenadas.append(coordenadas[0])
-            codigo.append(celda)
-            polygon = Polygon(coordenadas)
-            polygons.append(polygon)
-
-    gdf_healpix = gpd.GeoDataFrame(crs="EPSG:4326", geometry=polygons)
-    gdf_healpix['Codigo'] = codigo
-    gdf_healpix['zona'] = zona
+
+    ## codigos + anillos (n, 5, 2); los vertices de cada celda se calculan una vez y quedan en cache
+    codigo, anillos = grilla_region(coords.bounds, Nivel)
+    gdf_healpix = a_geodataframe(codigo, anillos, zona=zona)
+
+    ## id entero jerarquico (indice_healpix) e id_num de la zona (1..n en orden de id, 0 = sin celda)
+    ids, _ = codigos_a_ids(codigo)
+    gdf_healpix['id_celda'] = ids
+    gdf_healpix['id_num'] = np.unique(ids, return_inverse=True)[1] + 1
     
     list_gdf.append(gdf_healpix)
     
 
 gdf_all = pd.concat(list_gdf, ignore_index=True)
 gdf_all = gpd.GeoDataFrame(gdf_all, geometry='geometry', crs=list_gdf[0].crs)
-gdf_all.to_file("data/procesado/grilla/areas_grilla_healpix.geojson", driver="GeoJSON")
+escribir(gdf_all, "data/procesado/grilla/areas_grilla_healpix", particiones=['zona'])
 
 
 ## Plot
@@ -0,0 +1,211 @@
+"""
+Indice entero de celdas rHEALPix: codigo <-> id, jerarquia y vecinas como operaciones con arreglos, sin geometria.
+
+El codigo rHEALPix (cara + un digito 0-8 por nivel) es una direccion jerarquica: cada digito elige una de las
+3x3 subceldas (fila = digito // 3, columna = digito % 3, desde la esquina superior izquierda). Con las caras
+N, O, P, Q, R, S numeradas 0..5, el id de nivel N es
+
+    id = cara * 9**N + sum(digito_i * 9**(N - 1 - i))
+
+por lo que padre = id // 9 y los hijos son id * 9 + k (k = 0..8), y el orden de los ids es el de los codigos.
+Fila y columna en el plano rHEALPix salen intercalando los digitos en base 3, y las 8 vecinas son
+desplazamientos de fila/columna que vuelven a convertirse en id. Las caras se ubican en el plano segun su
+vertice superior izquierdo: las ecuatoriales O-P-Q-R son continuas entre si (sin cruzar el antimeridiano) y
+las polares N y S solo con la cara que tienen al lado en el plano.
+
+Para una zona, indice_zona ordena sus ids y entrega id_num = posicion + 1 (0 queda para "sin celda", como en
+el raster ID de join_dem) y las vecinas como posiciones, de modo que los joins y las features de vecindad son
+indexacion de arreglos:
+
+    indice = indice_zona(codigos)
+    media_vecinas = np.nanmean(np.where(indice['vecinos'] >= 0, valores[indice['vecinos']], np.nan), axis=1)
+"""
+import numpy as np
+
+from celdas_healpix import dggs
+
+CARAS = 'NOPQRS'
+## orden de las 8 vecinas: (d_fila, d_col), filas hacia el sur y columnas hacia el este
+DESPLAZAMIENTOS = np.array([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+
+
+def _caras_plano(rdggs=None):
+    """(fila, columna) de cada cara en el plano, en unidades de cara, y la tabla inversa (-1 sin cara)."""
+    rdggs = rdggs or dggs()
+    ancho = rdggs.cell_width(0)
+    x0 = min(x for x, _ in rdggs.ul_vertex.values())
+    y0 = max(y for _, y in rdggs.ul_vertex.values())
+    fila = np.array([round((y0 - rdggs.ul_vertex[c][1]) / ancho) for c in CARAS], dtype=np.int64)
+    col = np.array([round((rdggs.ul_vertex[c][0] - x0) / ancho) for c in CARAS], dtype=np.int64)
+    tabla = np.full((fila.max() + 1, col.max() + 1), -1, dtype=np.int64)
+    tabla[fila, col] = np.arange(len(CARAS))
+    return fila, col, tabla
+
+
+def codigos_a_ids(codigos):
+    """
+    Id entero de cada codigo (todos del mismo nivel).
+
+    Returns
+    -------
+    ids : ndarray of int64
+    nivel : int
+    """
+    codigos = np.asarray(codigos, dtype=str)
+    nivel = len(codigos[0]) - 1
+    caracteres = codigos.astype(f'S{nivel + 1}').view(np.uint8).reshape(len(codigos), nivel + 1)
+    cara = np.searchsorted(np.frombuffer(CARAS.encode(), np.uint8), caracteres[:, 0])
+    potencias = 9 ** np.arange(nivel - 1, -1, -1, dtype=np.int64)
+    return cara * 9 ** nivel + (caracteres[:, 1:].astype(np.int64) - ord('0')) @ potencias, nivel
+
+
+def ids_a_codigos(ids, nivel):
+    """Codigo rHEALPix de cada id de nivel `nivel`."""
+    ids = np.asarray(ids, dtype=np.int64)
+    caracteres = np.empty((len(ids), nivel + 1), dtype=np.uint8)
+    caracteres[:, 0] = np.frombuffer(CARAS.encode(), np.uint8)[ids // 9 ** nivel]
+    resto = ids % 9 ** nivel
+    for i in range(nivel, 0, -1):
+        resto, caracteres[:, i] = np.divmod(resto, 9)
+        caracteres[:, i] += ord('0')
+    return caracteres.view(f'S{nivel + 1}').ravel().astype(str)
+
+
+def ids_a_plano(ids, nivel, rdggs=None):
+    """Fila (norte a sur) y columna (oeste a este) enteras de cada celda en el plano rHEALPix."""
+    ids = np.asarray(ids, dtype=np.int64)
+    fila_cara, col_cara, _ = _caras_plano(rdggs)
+    cara, resto = np.divmod(ids, 9 ** nivel)
+    fila, col = np.zeros_like(ids), np.zeros_like(ids)
+    for i in range(nivel):
+        resto, digito = np.divmod(resto, 9)
+        fila += (digito // 3) * 3 ** i
+        col += (digito % 3) * 3 ** i
+    return fila + fila_cara[cara] * 3 ** nivel, col + col_cara[cara] * 3 ** nivel
+
+
+def plano_a_ids(fila, col, nivel, rdggs=None):
+    """Id de la celda en (fila, col) del plano; -1 donde no hay cara."""
+    fila, col = np.asarray(fila, dtype=np.int64), np.asarray(col, dtype=np.int64)
+    _, _, tabla = _caras_plano(rdggs)
+    lado = 3 ** nivel
+    dentro = (fila >= 0) & (col >= 0) & (fila < tabla.shape[0] * lado) & (col < tabla.shape[1] * lado)
+    cara = np.where(dentro, tabla[np.where(dentro, fila // lado, 0), np.where(dentro, col // lado, 0)], -1)
+    f, c = fila % lado, col % lado
+    ids = np.zeros_like(fila)
+    for i in range(nivel - 1, -1, -1):
+        ids = ids * 9 + (f // 3 ** i % 3) * 3 + c // 3 ** i % 3
+    return np.where(cara >= 0, cara * 9 ** nivel + ids, -1)
+
+
+def codigos_a_plano(codigos, rdggs=None):
+    """Fila y columna en el plano de cada codigo (ver ids_a_plano)."""
+    ids, nivel = codigos_a_ids(codigos)
+    return ids_a_plano(ids, nivel, rdggs)
+
+
+def padres(ids, niveles=1):
+    """Id del ancestro `niveles` niveles mas arriba."""
+    return np.asarray(ids, dtype=np.int64) // 9 ** niveles
+
+
+def hijos(ids, niveles=1):
+    """Ids de los 9**niveles descendientes de cada celda, (n, 9**niveles) en orden de id."""
+    return np.asarray(ids, dtype=np.int64)[:, None] * 9 ** niveles + np.arange(9 ** niveles)
+
+
+def vecinos(ids, nivel, rdggs=None):
+    """Ids de las 8 vecinas de cada celda en el orden de DESPLAZAMIENTOS, (n, 8); -1 fuera del plano."""
+    fila, col = ids_a_plano(ids, nivel, rdggs)
+    return plano_a_ids(fila[:, None] + DESPLAZAMIENTOS[:, 0], col[:, None] + DESPLAZAMIENTOS[:, 1], nivel, rdggs)
+
+
+def posiciones(ids_ordenados, ids):
+    """Posicion de cada id en `ids_ordenados` (arreglo ordenado); -1 si no esta."""
+    ids = np.asarray(ids, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(ids_ordenados, ids), len(ids_ordenados) - 1)
+    return np.where(ids_ordenados[pos] == ids, pos, -1)
+
+
+def indice_zona(codigos, rdggs=None):
+    """
+    Indice de las celdas de una zona.
+
+    Returns
+    -------
+    dict
+        nivel; ids (ordenados); codigos (en el mismo orden); id_num (posicion + 1, para join_dem y el raster
+        ID); vecinos (n, 8) con la posicion de cada vecina en la zona o -1.
+    """
+    ids, nivel = codigos_a_ids(codigos)
+    ids = np.unique(ids)
+    vecinas = vecinos(ids, nivel, rdggs)
+    return {'nivel': nivel, 'ids': ids, 'codigos': ids_a_codigos(ids, nivel),
+            'id_num': np.arange(1, len(ids) + 1), 'vecinos': np.where(vecinas >= 0, posiciones(ids, vecinas), -1)}
+
+
+def agregar_padres(ids, valores, niveles=1):
+    """
+    Media de `valores` por ancestro (agregacion multi-resolucion); las celdas con NaN no cuentan.
+
+    Returns
+    -------
+    ids_padre : ndarray of int64
+    media : ndarray
+    n : ndarray of int64
+        Hijos con dato por padre.
+    """
+    valores = np.asarray(valores, dtype=float)
+    ids_padre, grupo = np.unique(padres(ids, niveles), return_inverse=True)
+    valido = np.isfinite(valores)
+    n = np.bincount(grupo[valido], minlength=len(ids_padre))
+    suma = np.bincount(grupo[valido], valores[valido], minlength=len(ids_padre))
+    with np.errstate(invalid='ignore'):
+        return ids_padre, suma / n, n
+
+
+if __name__ == "__main__":
+    ## verificacion contra rhealpixdggs y benchmark de vecinas: geometria (STRtree) vs ids enteros
+    import time
+    import shapely
+    from celdas_healpix import grilla_region
+
+    rdggs = dggs()
+    codigos, anillos = grilla_region((-94.95, 35.80, -94.55, 36.10), 10, ruta_cache=None)
+    ids, nivel = codigos_a_ids(codigos)
+    print('codigo -> id -> codigo:', np.array_equal(ids_a_codigos(ids, nivel), codigos))
+    print('padre = codigo sin el ultimo digito:',
+          np.array_equal(ids_a_codigos(padres(ids), nivel - 1), np.array([c[:-1] for c in codigos])))
+    print('hijos de rhealpixdggs:', all(
+        list(ids_a_codigos(hijos(i[None])[0], nivel + 1)) == [str(h) for h in rdggs.cell(
+            [c[0]] + [int(d) for d in c[1:]]).subcells()] for i, c in zip(ids[:50], codigos[:50])))
+    ejemplos = np.array(['N0', 'O8', 'P0', 'Q4', 'R8', 'S3'])
+    vecinas = vecinos(codigos_a_ids(ejemplos)[0], 1)
+    nombres = np.where(vecinas >= 0, ids_a_codigos(np.maximum(vecinas, 0).ravel(), 1).reshape(-1, 8), '-')
+    for codigo, fila in zip(ejemplos, nombres):
+        print(f'vecinas de {codigo}:', ' '.join(fila))
+
+    t = time.perf_counter()
+    poligonos = shapely.polygons(anillos)
+    ## los vertices de celdas vecinas difieren en el ultimo decimal: touches/intersects pierden pares
+    i, j = shapely.STRtree(poligonos).query(poligonos, predicate='dwithin', distance=1e-9)
+    i, j = i[i != j], j[i != j]
+    t_geometria = time.perf_counter() - t
+
+    t = time.perf_counter()
+    indice = indice_zona(codigos)
+    t_indice = time.perf_counter() - t
+    ## pares (celda, vecina) en el orden de `codigos`, para comparar con el STRtree
+    pos = posiciones(indice['ids'], ids)
+    original = np.empty_like(pos)
+    original[pos] = np.arange(len(pos))
+    celda, k = np.nonzero(indice['vecinos'][pos] >= 0)
+    vecina = original[indice['vecinos'][pos][celda, k]]
+    print(f'{len(codigos)} celdas: vecinas por STRtree {t_geometria:.2f} s, por indice {t_indice:.3f} s')
+    ## la consulta geometrica tambien une celdas que solo comparten un vertice, igual que las 8 vecinas del indice
+    print('mismos pares de vecinas:', set(zip(i, j)) == set(zip(celda, vecina)))
+
+    valores = np.random.default_rng(0).normal(size=len(ids))
+    t = time.perf_counter()
+    ids_padre, media, n = agregar_padres(ids, valores, niveles=2)
+    print(f'media por ancestro de nivel {nivel - 2}: {len(ids_padre)} celdas en {time.perf_counter() - t:.4f} s')
@@ -1,60 +1,47 @@
-import rasterio
-import pandas as pd
+from pathlib import Path
+
 import numpy as np
-from tqdm import tqdm
-import geopandas as gpd
-from shapely.geometry import Point
+
+from almacenamiento import escribir, leer
+from agregacion_dem import agregar_dem, rutas_dem
+from terreno import bloques_terreno
 
 
-gdf = gpd.read_file("data/procesado/grilla/areas_grilla_healpix_id_num.geojson")
+## id_num de los rasters ID_{zona}.tif; sin ese dataset se usa el de grilla_healpix.py (indice_healpix) y cada
+## pixel se asigna a su celda por su centro
+RUTA_ID_NUM = "data/procesado/grilla/areas_grilla_healpix_id_num"
+RASTER_ID = Path(RUTA_ID_NUM).exists()
+gdf = leer(RUTA_ID_NUM if RASTER_ID else "data/procesado/grilla/areas_grilla_healpix",
+           columnas=['Codigo', 'zona', 'id_num'])
 
 path = 'data/raw/DEM'
 path_save = 'data/procesado/DEM'
 
+## True: pendiente y orientacion se calculan del DEM (terreno.py); no se usan los TIFF Slope/Aspect exportados
+TERRENO_LOCAL = True
+## True: ademas de la tabla por celda exporta cada pixel de 30m (millones de filas por zona)
+EXPORTAR_PIXELES = False
+
 zonas = gdf['zona'].unique()
 for zona in zonas:
     print(zona)
-    with rasterio.open(f"{path}/DEM_{zona}.tif") as dem_src, \
-        rasterio.open(f"{path}/Slope_{zona}.tif") as slope_src, \
-        rasterio.open(f"{path}/Aspect_{zona}.tif") as aspect_src, \
-        rasterio.open(f"{path}/ID_{zona}.tif") as id_src:
-
-        dem = dem_src.read(1)
-        slope = slope_src.read(1)
-        aspect = aspect_src.read(1)
-        ids = id_src.read(1)
-        transform = dem_src.transform
-        nodata = dem_src.nodata
-        
-    min_rows = min(dem.shape[0], slope.shape[0], aspect.shape[0], ids.shape[0])
-    min_cols = min(dem.shape[1], slope.shape[1], aspect.shape[1], ids.shape[1])
-
-    dem = dem[:min_rows, :min_cols]
-    slope = slope[:min_rows, :min_cols]
-    aspect = aspect[:min_rows, :min_cols]
-    ids = ids[:min_rows, :min_cols]
-
-    # filtramos validos
-    mask = (ids > 0) & (dem != nodata) & (slope != nodata) & (aspect != nodata)
-    rows, cols = np.where(mask)
-
-    dem_vals = dem[rows, cols]
-    slope_vals = slope[rows, cols]
-    aspect_vals = aspect[rows, cols]
-    id_vals = ids[rows, cols].astype(int)
-
-    # coords
-    xs, ys = rasterio.transform.xy(transform, rows, cols)
-    geometry = [Point(x, y) for x, y in zip(xs, ys)]
-    id_dict = dict(zip(gdf['id_num'], gdf['Codigo']))
-
-    codigo_vals = [id_dict[i] for i in id_vals]
-    
-    gdf_pix = gpd.GeoDataFrame({
-                'Codigo': codigo_vals,
-                'id_num': id_vals,
-                'elev': dem_vals,
-                'slope': slope_vals,
-                'aspect': aspect_vals
-                }, geometry=geometry, crs="EPSG:4326")
-    gdf_pix.to_file(f'{path_save}/{zona}.geojson', driver="GeoJSON")
\ No newline at end of file
+    celdas = gdf[gdf['zona'] == zona]
+
+    ## Codigo por id_num, para la exportacion de pixeles
+    n_celdas = int(celdas['id_num'].max()) + 1
+    codigos = np.empty(n_celdas, dtype=object)
+    codigos[celdas['id_num'].to_numpy(dtype=int)] = celdas['Codigo'].to_numpy()
+
+    ## los rasters se recorren por ventanas y se agregan por celda (media, min, max; orientacion circular)
+    rutas = rutas_dem(path, zona)
+    bloques = None
+    if TERRENO_LOCAL or not RASTER_ID:
+        ## sin raster ID la celda de cada pixel se obtiene desde su centro
+        ruta_id = rutas['id'] if RASTER_ID and Path(rutas['id']).exists() else None
+        bloques = bloques_terreno(rutas['elev'], ruta_id, celdas=celdas)
+    tabla = agregar_dem(rutas, n_celdas,
+                        ruta_pixeles=f'{path_save}/pixeles' if EXPORTAR_PIXELES else None,
+                        zona=zona, codigos=codigos, bloques=bloques)
+
+    tabla = celdas.merge(tabla, on='id_num', how='inner')
+    escribir(tabla, f'{path_save}/dem_celdas', particiones=['zona'])
@@ -0,0 +1,208 @@
+"""
+Variables meteorologicas derivadas (viento, humedad relativa, VPD, indices de peligro de incendio) sobre un cubo
+(fecha x celda) de xarray.
+
+Las formulas son kernels registrados con el decorador `kernel`: cada uno declara sus entradas y salidas por rol
+('u10', 't2m', 'relative_humidity', ...) y recibe/retorna arreglos numpy del cubo completo, por lo que cada
+formula se evalua una sola vez para todas las fechas. El cubo no guarda geometria; se une por Codigo solo al
+exportar (a_largo). Para agregar un indice nuevo:
+
+    @kernel('mi_indice', entradas=('t2m_C', 'relative_humidity'), salidas=('mi_indice',))
+    def mi_indice(t, rh):
+        return (...,)
+"""
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+KERNELS = {}
+
+## rol -> variable del cubo para los productos de gee_era5.py (los roles no listados usan su propio nombre)
+NOMBRES_ERA5 = {
+    'u10': 'u_component_of_wind_10m_ponderado',
+    'v10': 'v_component_of_wind_10m_ponderado',
+    't2m': 'temperature_2m_ponderado',
+    'd2m': 'dewpoint_temperature_2m_ponderado',
+    't2m_C': 'temperature_2m_C',
+    'd2m_C': 'dewpoint_temperature_2m_ponderado',   # el punto de rocio se guarda en grados sobre la misma columna
+}
+
+## kernels de era5_healpix, en orden (celsius reemplaza el punto de rocio, por eso va al final)
+DERIVADAS_ERA5 = ('viento', 'humedad', 'celsius')
+
+
+def kernel(nombre, entradas, salidas):
+    """Registra una formula en KERNELS con sus roles de entrada y salida."""
+    def registrar(funcion):
+        KERNELS[nombre] = (funcion, tuple(entradas), tuple(salidas))
+        return funcion
+    return registrar
+
+
+@kernel('viento', entradas=('u10', 'v10'), salidas=('wind_speed_10m', 'wind_dir_10m'))
+def viento(u, v):
+    ## velocidad del viento
+    velocidad = (u**2 + v**2) ** 0.5
+    ## direccion del viento (desde donde sopla)
+    direccion = (np.degrees(np.arctan2(-u, -v)) + 360) % 360
+    return velocidad, direccion
+
+
+@kernel('humedad', entradas=('t2m', 'd2m'), salidas=('relative_humidity', 'VPD'))
+def humedad(t, td):
+    ## presion de vapor de saturacion (hPa) a la temperatura y al punto de rocio (K)
+    es_Td = 6.112 * np.exp((17.67 * (td - 273.15)) / (td - 29.65))
+    es_T = 6.112 * np.exp((17.67 * (t - 273.15)) / (t - 29.65))
+    ## humedad relativa y deficit de presion de vapor
+    return 100 * es_Td / es_T, es_T - es_Td
+
+
+@kernel('celsius', entradas=('t2m', 'd2m'), salidas=('t2m_C', 'd2m_C'))
+def celsius(t, td):
+    return t - 273.15, td - 273.15
+
+
+@kernel('fosberg', entradas=('t2m_C', 'relative_humidity', 'wind_speed_10m'), salidas=('FFWI',))
+def fosberg(t_c, rh, viento_ms):
+    """Fosberg Fire Weather Index (Fosberg, 1978), con T en °F y viento en mph."""
+    t_f = t_c * 9 / 5 + 32
+    u_mph = viento_ms * 2.23694
+    h = np.clip(rh, 0, 100)
+    ## humedad de equilibrio del combustible (%)
+    m = np.where(h < 10, 0.03229 + 0.281073 * h - 0.000578 * h * t_f,
+                 np.where(h < 50, 2.22749 + 0.160107 * h - 0.01478 * t_f,
+                          21.0606 + 0.005565 * h**2 - 0.00035 * h * t_f - 0.483199 * h))
+    eta = 1 - 2 * (m / 30) + 1.5 * (m / 30) ** 2 - 0.5 * (m / 30) ** 3
+    return (eta * np.sqrt(1 + u_mph**2) / 0.3002).astype(t_c.dtype, copy=False),
+
+
+def cubo_meteorologico(valores, tiempos, codigos, variables, dtype=np.float64, columna_tiempo='date_time'):
+    """
+    Cubo (fecha x celda) a partir de un arreglo (n_fechas, n_celdas, n_variables), p.ej. de pesos_area.remapear_arreglo.
+
+    Parameters
+    ----------
+    dtype : numpy dtype
+        np.float32 reduce a la mitad la memoria del cubo (los kernels conservan el dtype).
+    """
+    valores = np.asarray(valores, dtype=dtype)
+    return xr.Dataset(
+        {var: ((columna_tiempo, 'Codigo'), valores[:, :, k]) for k, var in enumerate(variables)},
+        coords={columna_tiempo: pd.Index(tiempos), 'Codigo': np.asarray(codigos)},
+    )
+
+
+def cubo_desde_largo(df, variables, columna_tiempo='date_time', dtype=np.float64):
+    """Cubo (fecha x celda) desde una tabla larga con una fila por (Codigo, fecha); faltantes quedan NaN."""
+    id_tiempo, tiempos = pd.factorize(df[columna_tiempo])
+    id_celda, codigos = pd.factorize(df['Codigo'])
+    valores = np.full((len(tiempos), len(codigos), len(variables)), np.nan, dtype=dtype)
+    valores[id_tiempo, id_celda] = df[variables].to_numpy(dtype=dtype)
+    return cubo_meteorologico(valores, tiempos, codigos, variables, dtype, columna_tiempo)
+
+
+def derivar(cubo, kernels=DERIVADAS_ERA5, nombres=NOMBRES_ERA5):
+    """
+    Evalua los kernels sobre el cubo completo, en orden, agregando (o reemplazando) sus salidas.
+
+    Parameters
+    ----------
+    cubo : xarray.Dataset
+        Variables con dims (fecha, Codigo).
+    kernels : iterable of str
+        Nombres en KERNELS.
+    nombres : dict
+        Rol -> variable del cubo.
+
+    Returns
+    -------
+    xarray.Dataset
+        El mismo cubo (modificado en el lugar).
+    """
+    for nombre in kernels:
+        funcion, entradas, salidas = KERNELS[nombre]
+        faltantes = [nombres.get(r, r) for r in entradas if nombres.get(r, r) not in cubo]
+        if faltantes:
+            raise KeyError(f"kernel '{nombre}' requiere {faltantes}")
+        dims = cubo[nombres.get(entradas[0], entradas[0])].dims
+        resultados = funcion(*[cubo[nombres.get(r, r)].values for r in entradas])
+        for rol, arreglo in zip(salidas, resultados):
+            cubo[nombres.get(rol, rol)] = (dims, arreglo)
+    return cubo
+
+
+def a_largo(cubo, geometria=None, columna_tiempo='date_time'):
+    """
+    Tabla larga (una fila por fecha y celda, fechas en orden) para exportar.
+
+    Parameters
+    ----------
+    geometria : GeoDataFrame or None
+        Celdas con 'Codigo' (y demas columnas por celda, p.ej. zona); se une por Codigo solo aqui.
+
+    Returns
+    -------
+    DataFrame or GeoDataFrame
+    """
+    codigos = cubo['Codigo'].values
+    tiempos = cubo.indexes[columna_tiempo]
+    datos = {var: cubo[var].transpose(columna_tiempo, 'Codigo').values.ravel() for var in cubo.data_vars}
+    datos[columna_tiempo] = tiempos.repeat(len(codigos))
+    df = pd.DataFrame(datos)
+    if geometria is None:
+        df.insert(0, 'Codigo', np.tile(codigos, len(tiempos)))
+        return df
+
+    posicion = pd.Index(geometria['Codigo']).get_indexer(codigos)
+    celdas = geometria.iloc[np.tile(posicion, len(tiempos))].reset_index(drop=True)
+    return pd.concat([celdas, df], axis=1)
+
+
+if __name__ == "__main__":
+    ## benchmark: derivadas por fecha sobre GeoDataFrames (gee_era5.py original) vs kernels sobre el cubo
+    import time
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    rng = np.random.default_rng(0)
+    n_celdas, n_fechas = 7600, 66
+    celdas = gpd.GeoDataFrame({'Codigo': [f'P{i:010d}' for i in range(n_celdas)], 'zona': 'area2'},
+                              geometry=[box(i, 0, i + 1, 1) for i in range(n_celdas)], crs='EPSG:4326')
+    fechas = pd.date_range('2025-04-12 06:00', periods=n_fechas, freq='4h', tz='UTC')
+    base = {'u_component_of_wind_10m_ponderado': rng.normal(0, 5, (n_fechas, n_celdas)),
+            'v_component_of_wind_10m_ponderado': rng.normal(0, 5, (n_fechas, n_celdas)),
+            'temperature_2m_ponderado': rng.uniform(280, 305, (n_fechas, n_celdas)),
+            'dewpoint_temperature_2m_ponderado': rng.uniform(265, 280, (n_fechas, n_celdas))}
+
+    t = time.perf_counter()
+    lista_gdf = []
+    for k, fecha in enumerate(fechas):
+        gdf_inter = celdas.copy()
+        for var, arr in base.items():
+            gdf_inter[var] = arr[k]
+        gdf_inter['date_time'] = fecha
+        gdf_inter['wind_speed_10m'] = (gdf_inter['u_component_of_wind_10m_ponderado']**2 + gdf_inter['v_component_of_wind_10m_ponderado']**2) ** 0.5
+        gdf_inter['wind_dir_10m'] = (np.degrees(np.arctan2(-gdf_inter['u_component_of_wind_10m_ponderado'],-gdf_inter['v_component_of_wind_10m_ponderado'])) + 360) % 360
+        es_Td = 6.112 * np.exp((17.67 * (gdf_inter['dewpoint_temperature_2m_ponderado'] - 273.15)) / (gdf_inter['dewpoint_temperature_2m_ponderado'] - 29.65))
+        es_T = 6.112 * np.exp((17.67 * (gdf_inter['temperature_2m_ponderado'] - 273.15)) / (gdf_inter['temperature_2m_ponderado'] - 29.65))
+        gdf_inter['relative_humidity'] = 100 * es_Td / es_T
+        gdf_inter['VPD'] = es_T - es_Td
+        gdf_inter['temperature_2m_C'] = gdf_inter['temperature_2m_ponderado'] - 273.15
+        gdf_inter['dewpoint_temperature_2m_ponderado'] = gdf_inter['dewpoint_temperature_2m_ponderado'] - 273.15
+        lista_gdf.append(gdf_inter)
+    ref = gpd.GeoDataFrame(pd.concat(lista_gdf, ignore_index=True), geometry='geometry', crs=celdas.crs)
+    print(f'por fecha + concat: {time.perf_counter() - t:.2f} s')
+
+    valores = np.stack(list(base.values()), axis=-1)
+    for dtype in [np.float64, np.float32]:
+        t = time.perf_counter()
+        cubo = derivar(cubo_meteorologico(valores, fechas, celdas['Codigo'], list(base), dtype=dtype))
+        t_cubo = time.perf_counter() - t
+        largo = a_largo(cubo, geometria=celdas)
+        print(f'cubo {np.dtype(dtype).name}: kernels {t_cubo:.3f} s, con export {time.perf_counter() - t:.2f} s, '
+              f'{cubo.nbytes / 1e6:.0f} MB')
+    cubo = derivar(cubo_meteorologico(valores, fechas, celdas['Codigo'], list(base)))
+    largo = a_largo(cubo, geometria=celdas)
+    print('identico a la version por fecha:', all(np.array_equal(ref[c].to_numpy(), largo[c].to_numpy())
+                                                  for c in ref.columns if c != 'geometry'))
+    print('FFWI medio:', float(derivar(cubo, ['fosberg'])['FFWI'].mean()))
@@ -0,0 +1,261 @@
+"""
+Remapeo ponderado por area entre dos capas de poligonos (huellas de pixeles VIIRS, recuadros ERA5 -> celdas HealPix).
+
+La interseccion geometrica se calcula una sola vez por par de geometrias y se guarda como matriz dispersa
+W (n_destino x n_fuente) con la fraccion de cada celda de destino cubierta por cada poligono de origen.
+Aplicarla a una variable, o a un stack de pasadas/fechas (n_fuente x k), es un producto matriz-vector:
+
+    W = matriz_pesos(pixeles, grilla)
+    valores_celda = promedio_ponderado(W, pixeles[['I04', 'I05']].to_numpy())
+
+Las matrices quedan en cache (data/procesado/pesos/{firma}.npz) bajo una firma de las geometrias y el CRS,
+por lo que las pasadas con la misma geometria reutilizan los pesos.
+"""
+from pathlib import Path
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+import scipy.sparse as sp
+
+RUTA_CACHE = 'data/procesado/pesos'
+
+
+def firma_geometrias(*capas, extra=None):
+    """Hash (sha1) de las geometrias (WKB) y CRS de una o mas capas; identifica la matriz de pesos."""
+    h = hashlib.sha1()
+    for capa in capas:
+        h.update(str(capa.crs).encode())
+        h.update(b''.join(shapely.to_wkb(capa.geometry.values)))
+    h.update(repr(extra).encode())
+    return h.hexdigest()
+
+
+def fracciones_interseccion(fuente, destino, crs=None):
+    """
+    Fraccion del area de cada poligono de destino cubierta por cada poligono de origen.
+
+    Parameters
+    ----------
+    fuente, destino : GeoDataFrame
+        Capas de origen (p.ej. huellas de pixeles) y destino (p.ej. celdas HealPix).
+    crs : CRS or None
+        CRS proyectado para las areas (por defecto la UTM del destino, como en gee_era5.py).
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        Forma (len(destino), len(fuente)); solo los pares que se intersectan.
+    """
+    crs = crs or destino.estimate_utm_crs()
+    geom_f = fuente.geometry.to_crs(crs).values
+    geom_d = destino.geometry.to_crs(crs).values
+
+    # pares candidatos por indice espacial, luego interseccion vectorizada de esos pares
+    i_f, i_d = shapely.STRtree(geom_d).query(geom_f, predicate='intersects')
+    area_inter = shapely.area(shapely.intersection(geom_f[i_f], geom_d[i_d]))
+    peso = area_inter / shapely.area(geom_d)[i_d]
+
+    positivo = peso > 0
+    return sp.csr_matrix((peso[positivo], (i_d[positivo], i_f[positivo])), shape=(len(geom_d), len(geom_f)))
+
+
+def matriz_pesos(fuente, destino, ruta_cache=RUTA_CACHE, crs=None):
+    """
+    Matriz de pesos (fracciones_interseccion) leida del cache o calculada y guardada.
+
+    Parameters
+    ----------
+    ruta_cache : str or None
+        Carpeta del cache; None para no usarlo.
+    """
+    if ruta_cache is None:
+        return fracciones_interseccion(fuente, destino, crs)
+
+    path = Path(ruta_cache) / f'{firma_geometrias(fuente, destino, extra=str(crs) if crs else None)}.npz'
+    if path.exists():
+        return sp.load_npz(path).tocsr()
+
+    W = fracciones_interseccion(fuente, destino, crs)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.stem + '.tmp.npz')
+    sp.save_npz(tmp, W)
+    os.replace(tmp, path)
+    return W
+
+
+def promedio_ponderado(W, valores, nan_como_cero=False):
+    """
+    Promedio ponderado por area de los valores de origen en cada poligono de destino.
+
+    Parameters
+    ----------
+    W : scipy.sparse matrix
+        Pesos (n_destino x n_fuente).
+    valores : array-like
+        (n_fuente,) o (n_fuente, k) con k variables o pasadas.
+    nan_como_cero : bool
+        False: los NaN no cuentan en el promedio (ni en el numerador ni en la suma de pesos).
+        True: los NaN aportan 0 al numerador pero su peso si se suma (criterio del groupby().sum()
+        del overlay original, ver intersect_ponderado_area en el benchmark de este archivo).
+
+    Returns
+    -------
+    ndarray
+        (n_destino,) o (n_destino, k); NaN en destinos sin interseccion.
+    """
+    valores = np.asarray(valores, dtype=float)
+    validos = np.isfinite(valores)
+    numerador = W @ np.where(validos, valores, 0.0)
+    if nan_como_cero:
+        suma_pesos = np.asarray(W.sum(axis=1)).ravel()
+        suma_pesos = suma_pesos if valores.ndim == 1 else suma_pesos[:, None]
+    else:
+        suma_pesos = W @ validos.astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(suma_pesos > 0, numerador / suma_pesos, np.nan)
+
+
+def remapear_arreglo(fuente, destino, variables, columna_tiempo='date_time', nan_como_cero=False,
+                     ruta_cache=RUTA_CACHE, crs=None):
+    """
+    Promedio ponderado por area de todas las fechas a la vez, cuando la geometria de origen se repite en cada fecha.
+
+    Parameters
+    ----------
+    fuente : GeoDataFrame
+        Formato largo: una fila por (poligono, fecha) con las variables (p.ej. info_era5_grilla de una zona).
+    destino : GeoDataFrame
+        Poligonos de destino (celdas HealPix).
+    variables : list of str
+        Columnas a remapear.
+    columna_tiempo : str
+        Columna de fecha.
+    nan_como_cero, ruta_cache, crs
+        Ver promedio_ponderado y matriz_pesos.
+
+    Returns
+    -------
+    valores : ndarray
+        (n_fechas, n_destino, n_variables), fechas en el orden de aparicion en `fuente`.
+    tiempos : Index
+        Fecha de cada posicion del primer eje.
+    """
+    ## poligonos distintos de origen (por WKB) y matriz de valores (poligono, fecha, variable)
+    id_geom, _ = pd.factorize(shapely.to_wkb(fuente.geometry.values))
+    _, primera = np.unique(id_geom, return_index=True)
+    poligonos = fuente.iloc[primera][[fuente.geometry.name]]
+    id_tiempo, tiempos = pd.factorize(fuente[columna_tiempo])
+
+    valores = np.full((len(poligonos), len(tiempos), len(variables)), np.nan)
+    valores[id_geom, id_tiempo] = fuente[variables].to_numpy(dtype=float)
+
+    W = matriz_pesos(poligonos, destino, ruta_cache, crs)
+    resultado = promedio_ponderado(W, valores.reshape(len(poligonos), -1), nan_como_cero)
+    return resultado.reshape(len(destino), len(tiempos), len(variables)).transpose(1, 0, 2), pd.Index(tiempos)
+
+
+def remapear_fechas(fuente, destino, variables, columna_tiempo='date_time', nan_como_cero=False,
+                    ruta_cache=RUTA_CACHE, crs=None, sufijo='_ponderado'):
+    """
+    remapear_arreglo en formato largo: destino repetido por fecha con las columnas {var}{sufijo}
+    y la columna de tiempo.
+    """
+    valores, tiempos = remapear_arreglo(fuente, destino, variables, columna_tiempo, nan_como_cero, ruta_cache, crs)
+    salida = destino.iloc[np.tile(np.arange(len(destino)), len(tiempos))].reset_index(drop=True)
+    for j, var in enumerate(variables):
+        salida[f'{var}{sufijo}'] = valores[:, :, j].ravel()
+    salida[columna_tiempo] = tiempos.repeat(len(destino))
+    return salida
+
+
+if __name__ == "__main__":
+    ## benchmark: huellas de ~2k pixeles sobre 7.6k celdas, 100 pasadas con la misma geometria
+    import tempfile
+    import time
+    import geopandas as gpd
+    from shapely.geometry import box
+    from celdas_healpix import grilla_region, a_geodataframe
+
+    codigos, anillos = grilla_region((-94.85, 35.88, -94.70, 36.0), 10, ruta_cache=None)
+    grilla = a_geodataframe(codigos, anillos)
+    rng = np.random.default_rng(0)
+    paso = 0.004
+    xs, ys = np.meshgrid(np.arange(-94.85, -94.70, paso), np.arange(35.88, 36.0, paso))
+    pixeles = gpd.GeoDataFrame(geometry=[box(x, y, x + paso, y + paso) for x, y in zip(xs.ravel(), ys.ravel())],
+                               crs='EPSG:4326')
+    pasadas = rng.uniform(280, 360, (len(pixeles), 100))
+
+    ## referencia: overlay por pasada
+    t = time.perf_counter()
+    grilla_utm = grilla.to_crs(grilla.estimate_utm_crs())
+    grilla_utm['area_celda'] = grilla_utm.area
+    ref = []
+    for k in range(5):
+        pix = pixeles.assign(I04=pasadas[:, k]).to_crs(grilla_utm.crs)
+        inter = gpd.overlay(grilla_utm, pix, how='intersection')
+        inter['peso'] = inter.area / inter['area_celda']
+        inter['pond'] = inter['I04'] * inter['peso']
+        g = inter.groupby('Codigo')[['pond', 'peso']].sum()
+        ref.append((g['pond'] / g['peso']).reindex(grilla['Codigo']).to_numpy())
+    t_overlay = (time.perf_counter() - t) / 5
+    print(f'overlay por pasada: {t_overlay:.2f} s -> 100 pasadas ~{100 * t_overlay:.0f} s')
+
+    with tempfile.TemporaryDirectory() as cache:
+        t = time.perf_counter()
+        W = matriz_pesos(pixeles, grilla, cache)
+        print(f'matriz de pesos (calculo): {time.perf_counter() - t:.2f} s, nnz={W.nnz}')
+        t = time.perf_counter()
+        W = matriz_pesos(pixeles, grilla, cache)
+        print(f'matriz de pesos (cache): {time.perf_counter() - t:.2f} s')
+        t = time.perf_counter()
+        resultado = promedio_ponderado(W, pasadas)
+        print(f'100 pasadas en un producto: {time.perf_counter() - t:.3f} s')
+    print('max dif vs overlay:', np.nanmax(np.abs(resultado[:, :5] - np.column_stack(ref))))
+
+    ## ERA5: recuadros de 1035 m (UTM) x 66 fechas -> celdas, contra el overlay por fecha de gee_era5.py
+    variables = ['dewpoint_temperature_2m', 'temperature_2m', 'u_component_of_wind_10m', 'v_component_of_wind_10m']
+    grilla_utm = grilla.to_crs(grilla.estimate_utm_crs())
+    minx, miny, maxx, maxy = grilla_utm.total_bounds
+    cajas = [box(x, y, x + 1035, y + 1035) for x in np.arange(minx, maxx, 1035) for y in np.arange(miny, maxy, 1035)]
+    fechas = pd.date_range('2025-04-12 06:00', periods=66, freq='4h', tz='UTC')
+    era5 = gpd.GeoDataFrame(
+        {var: rng.uniform(270, 300, len(cajas) * len(fechas)) for var in variables},
+        geometry=cajas * len(fechas), crs=grilla_utm.crs)
+    era5['date_time'] = fechas.repeat(len(cajas))
+    era5.loc[rng.random(len(era5)) < 0.01, 'temperature_2m'] = np.nan
+
+    def intersect_ponderado_area(gdf_fecha, area_filtrado):
+        # version por overlay que usaba gee_era5.py (referencia)
+        crs_proj = area_filtrado.estimate_utm_crs()
+        inter = gpd.overlay(area_filtrado.to_crs(crs_proj), gdf_fecha.to_crs(crs_proj), how='intersection')
+        area_proj = area_filtrado.to_crs(crs_proj)
+        inter['peso'] = inter.geometry.area / inter['Codigo'].map(dict(zip(area_proj['Codigo'], area_proj.area)))
+        for var in variables:
+            inter[f'{var}_pond'] = inter[var] * inter['peso']
+        agregados = inter.groupby('Codigo')[[f'{var}_pond' for var in variables] + ['peso']].sum()
+        for var in variables:
+            agregados[f'{var}_ponderado'] = agregados[f'{var}_pond'] / agregados['peso']
+        return area_filtrado.merge(agregados[[f'{var}_ponderado' for var in variables]].reset_index(),
+                                   on='Codigo', how='left')
+
+    t = time.perf_counter()
+    lista = []
+    for fecha in era5['date_time'].unique():
+        r = intersect_ponderado_area(era5[era5['date_time'] == fecha], grilla)
+        r['date_time'] = fecha
+        lista.append(r)
+    ref = pd.concat(lista, ignore_index=True)
+    print(f'ERA5 overlay por fecha ({len(fechas)} fechas): {time.perf_counter() - t:.1f} s')
+
+    with tempfile.TemporaryDirectory() as cache:
+        for corrida in ['calculo', 'cache']:
+            t = time.perf_counter()
+            nuevo = remapear_fechas(era5, grilla, variables, nan_como_cero=True, ruta_cache=cache)
+            print(f'ERA5 remapear_fechas ({corrida}): {time.perf_counter() - t:.2f} s')
+    columnas = [f'{var}_ponderado' for var in variables]
+    print('mismas filas:', ref['Codigo'].equals(nuevo['Codigo']) and ref['date_time'].equals(nuevo['date_time']),
+          '| max dif:', np.nanmax(np.abs(ref[columnas].to_numpy() - nuevo[columnas].to_numpy())),
+          '| NaN iguales:', (ref[columnas].isna().to_numpy() == nuevo[columnas].isna().to_numpy()).all())
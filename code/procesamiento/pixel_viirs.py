@@ -0,0 +1,116 @@
+"""
+Huella de pixeles VIIRS deformada segun el angulo de observacion.
+
+Version vectorizada de `make_viirs_pixel` (viz.py): recibe arreglos de
+lat/lon/zenith/azimuth y genera todas las esquinas en una sola operacion,
+reproyectando con un unico transformer cacheado.
+"""
+from functools import lru_cache
+import time
+
+import numpy as np
+import pyproj
+import shapely
+
+
+@lru_cache(maxsize=None)
+def transformador(crs_origen, crs_destino):
+    """Transformer de pyproj cacheado por par de CRS (always_xy=True)."""
+    return pyproj.Transformer.from_crs(crs_origen, crs_destino, always_xy=True)
+
+
+def esquinas_viirs_pixels(lat, lon, zenith_deg, azimuth_deg, size_nadir=375, crs_metrico="EPSG:5070"):
+    """
+    Calcula las esquinas (lon, lat) de los pixeles deformados.
+
+    Parameters
+    ----------
+    lat, lon : float or array-like
+        Centroides de los pixeles en EPSG:4326.
+    zenith_deg, azimuth_deg : float or array-like
+        Angulos cenital y azimutal del sensor en grados.
+    size_nadir : float
+        Tamaño del pixel en nadir (m).
+    crs_metrico : str
+        CRS proyectado en metros donde se construye el pixel.
+
+    Returns
+    -------
+    np.ndarray
+        Arreglo (n, 5, 2) con el anillo cerrado de cada pixel.
+    """
+    ## escalares como un pixel: las esquinas se apilan en el eje 1
+    lat = np.atleast_1d(np.asarray(lat, dtype=float))
+    lon = np.atleast_1d(np.asarray(lon, dtype=float))
+    zenith_rad = np.deg2rad(np.atleast_1d(np.asarray(zenith_deg, dtype=float)))
+    angulo = -np.atleast_1d(np.asarray(azimuth_deg, dtype=float)) * np.pi / 180.0
+
+    # rectangulo centrado en (0,0), mismo orden de esquinas que make_viirs_pixel
+    hw = (size_nadir / np.cos(zenith_rad)) / 2
+    hh = np.full_like(hw, size_nadir / 2)
+    x = np.stack([-hw, -hw, hw, hw, -hw], axis=1)
+    y = np.stack([-hh, hh, hh, -hh, -hh], axis=1)
+
+    # rotar por azimuth (misma convencion que shapely.affinity.rotate)
+    cosp = np.cos(angulo)
+    sinp = np.sin(angulo)
+    cosp = np.where(np.abs(cosp) < 2.5e-16, 0.0, cosp)[:, None]
+    sinp = np.where(np.abs(sinp) < 2.5e-16, 0.0, sinp)[:, None]
+    x_rot = cosp * x - sinp * y
+    y_rot = sinp * x + cosp * y
+
+    # proyectar centroides a metros y trasladar
+    x0, y0 = transformador("EPSG:4326", crs_metrico).transform(lon, lat)
+    x_m = x_rot + np.asarray(x0)[:, None]
+    y_m = y_rot + np.asarray(y0)[:, None]
+
+    # a lat/lon en una sola llamada
+    lon_c, lat_c = transformador(crs_metrico, "EPSG:4326").transform(x_m.ravel(), y_m.ravel())
+    return np.stack([np.asarray(lon_c).reshape(x_m.shape),
+                     np.asarray(lat_c).reshape(y_m.shape)], axis=2)
+
+
+def make_viirs_pixels(lat, lon, zenith_deg, azimuth_deg, size_nadir=375, crs_metrico="EPSG:5070"):
+    """Crea pixeles deformados segun angulo de observacion (arreglo de Polygons de shapely 2)"""
+    esquinas = esquinas_viirs_pixels(lat, lon, zenith_deg, azimuth_deg, size_nadir, crs_metrico)
+    return shapely.polygons(esquinas)
+
+
+## benchmark ----------------------
+def _make_viirs_pixel_fila(lat, lon, zenith_deg, azimuth_deg, size_nadir=375):
+    """Implementacion original por fila (viz.py), usada solo como referencia."""
+    from shapely.geometry import Polygon
+    from shapely.affinity import rotate, translate
+
+    width = size_nadir / np.cos(np.deg2rad(zenith_deg))
+    hw, hh = width / 2, size_nadir / 2
+    rect = Polygon([(-hw, -hh), (-hw, hh), (hw, hh), (hw, -hh)])
+    pixel_rot = rotate(rect, -azimuth_deg, origin=(0, 0), use_radians=False)
+    proj = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:5070", always_xy=True)
+    x0, y0 = proj.transform(lon, lat)
+    pixel_proj = translate(pixel_rot, xoff=x0, yoff=y0)
+    back_proj = pyproj.Transformer.from_crs("EPSG:5070", "EPSG:4326", always_xy=True)
+    return Polygon([back_proj.transform(x, y) for x, y in pixel_proj.exterior.coords])
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    muestra_fila = 2_000   # la ruta por fila se mide en una muestra y se extrapola
+
+    for n in [10_000, 100_000, 1_000_000]:
+        lat = rng.uniform(33, 37, n)
+        lon = rng.uniform(-95, -80, n)
+        zen = rng.uniform(0, 70, n)
+        azi = rng.uniform(-180, 180, n)
+
+        t0 = time.perf_counter()
+        make_viirs_pixels(lat, lon, zen, azi)
+        t_vec = time.perf_counter() - t0
+
+        m = min(n, muestra_fila)
+        t0 = time.perf_counter()
+        for i in range(m):
+            _make_viirs_pixel_fila(lat[i], lon[i], zen[i], azi[i])
+        t_fila = (time.perf_counter() - t0) * n / m
+
+        print(f"n={n:>9,} | vectorizado: {t_vec:8.2f} s | por fila (estimado): {t_fila:8.1f} s | x{t_fila / t_vec:,.0f}")
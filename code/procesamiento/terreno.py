@@ -0,0 +1,184 @@
+"""
+Pendiente y orientacion calculadas localmente desde el DEM (kernel de Horn) y reducidas a celdas HealPix en una
+sola pasada.
+
+El DEM se recorre en bloques cuadrados leidos con un borde (halo) de 1 pixel, de modo que el kernel 3x3 de cada
+bloque ve a sus vecinos y el resultado no tiene costuras; solo hay un bloque en memoria a la vez. Cada bloque
+entrega elevacion, pendiente y orientacion a agregacion_dem.agregar_dem, por lo que una zona nueva solo
+necesita descargar el DEM (sin Slope/Aspect exportados ni un reduceRegions por variable en GEE). Si no hay
+raster de id_num, la celda de cada pixel se obtiene desde su centro con agregacion_celdas.codigos_puntos.
+
+Convenciones (como ee.Terrain): pendiente en grados; orientacion en grados desde el norte en sentido horario,
+hacia donde mira la ladera. En un DEM geografico el tamaño del pixel en metros se calcula por fila con la latitud.
+"""
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.windows import Window
+
+from agregacion_dem import agregar_dem
+from agregacion_celdas import codigos_puntos
+
+TAMAÑO_BLOQUE = 1024
+METROS_GRADO = 111320.0
+
+
+def horn(z, dx, dy):
+    """
+    Pendiente y orientacion del interior de z (el borde de 1 pixel es el halo).
+
+    Parameters
+    ----------
+    z : ndarray
+        Elevacion (filas + 2, columnas + 2), NaN donde no hay dato.
+    dx : ndarray or float
+        Ancho del pixel en metros (escalar o (filas, 1)).
+    dy : float
+        Alto del pixel en metros.
+
+    Returns
+    -------
+    slope, aspect : ndarray
+        (filas, columnas) en grados; NaN si falta algun vecino (el pixel conserva su elevacion en la agregacion).
+    """
+    a, b, c = z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:]
+    d, f = z[1:-1, :-2], z[1:-1, 2:]
+    g, h, i = z[2:, :-2], z[2:, 1:-1], z[2:, 2:]
+    ## gradiente hacia el este y hacia el norte (las filas crecen hacia el sur)
+    dz_este = ((c + 2 * f + i) - (a + 2 * d + g)) / (8 * dx)
+    dz_norte = ((a + 2 * b + c) - (g + 2 * h + i)) / (8 * dy)
+    slope = np.degrees(np.arctan(np.hypot(dz_este, dz_norte)))
+    aspect = np.degrees(np.arctan2(-dz_este, -dz_norte)) % 360
+    return slope, aspect
+
+
+def tamaño_pixel(src, fila0, n_filas):
+    """(dx, dy) en metros para las filas fila0..fila0+n_filas (dx varia con la latitud en un DEM geografico)."""
+    t = src.transform
+    if src.crs is None or not src.crs.is_geographic:
+        return abs(t.a), abs(t.e)
+    lat = t.f + (np.arange(fila0, fila0 + n_filas) + 0.5) * t.e
+    dx = abs(t.a) * METROS_GRADO * np.cos(np.radians(lat))[:, None]
+    return dx, abs(t.e) * METROS_GRADO
+
+
+def ventanas_halo(alto, ancho, tamaño=TAMAÑO_BLOQUE):
+    """Pares (ventana, ventana con halo de 1 pixel) que cubren el raster."""
+    for fila in range(0, alto, tamaño):
+        for col in range(0, ancho, tamaño):
+            ventana = Window(col, fila, min(tamaño, ancho - col), min(tamaño, alto - fila))
+            yield ventana, Window(col - 1, fila - 1, ventana.width + 2, ventana.height + 2)
+
+
+def ids_por_centro(src, ventana, celdas, nivel):
+    """id_num de cada pixel de la ventana segun la celda que contiene su centro (0 fuera de la grilla)."""
+    t = src.transform
+    filas = np.arange(ventana.row_off, ventana.row_off + ventana.height) + 0.5
+    cols = np.arange(ventana.col_off, ventana.col_off + ventana.width) + 0.5
+    lon = np.broadcast_to(t.c + cols[None, :] * t.a, (len(filas), len(cols)))
+    lat = np.broadcast_to(t.f + filas[:, None] * t.e, (len(filas), len(cols)))
+    codigos = codigos_puntos(lon.ravel(), lat.ravel(), nivel)
+    posicion = pd.Index(celdas['Codigo']).get_indexer(codigos)
+    ids = np.where(posicion >= 0, celdas['id_num'].to_numpy()[posicion], 0)
+    return ids.reshape(len(filas), len(cols)).astype(np.int64)
+
+
+def leer_con_halo(src, con_halo, alto, ancho):
+    """Elevacion de la ventana con halo como float64; lo que cae fuera del raster (o es nodata) queda NaN."""
+    z = np.full((con_halo.height, con_halo.width), np.nan)
+    f0, c0 = max(con_halo.row_off, 0), max(con_halo.col_off, 0)
+    f1, c1 = min(con_halo.row_off + con_halo.height, alto), min(con_halo.col_off + con_halo.width, ancho)
+    datos = src.read(1, window=Window(c0, f0, c1 - c0, f1 - f0)).astype(np.float64)
+    if src.nodata is not None:
+        datos[datos == src.nodata] = np.nan
+    z[f0 - con_halo.row_off:f1 - con_halo.row_off, c0 - con_halo.col_off:c1 - con_halo.col_off] = datos
+    return z
+
+
+def bloques_terreno(ruta_dem, ruta_id=None, celdas=None, nivel=10, tamaño=TAMAÑO_BLOQUE):
+    """
+    Genera (ventana, transform, ids, capas) con elev/slope/aspect por bloque, en el formato de agregar_dem.
+
+    Parameters
+    ----------
+    ruta_dem : str
+        GeoTIFF del DEM.
+    ruta_id : str or None
+        Raster de id_num alineado con el DEM. Si None, los ids salen de `celdas` (Codigo, id_num) y `nivel`.
+    """
+    with rasterio.open(ruta_dem) as dem_src, (rasterio.open(ruta_id) if ruta_id else dem_src) as id_src:
+        alto, ancho = min(dem_src.height, id_src.height), min(dem_src.width, id_src.width)
+        for ventana, con_halo in ventanas_halo(alto, ancho, tamaño):
+            z = leer_con_halo(dem_src, con_halo, alto, ancho)
+            dx, dy = tamaño_pixel(dem_src, ventana.row_off, ventana.height)
+            slope, aspect = horn(z, dx, dy)
+
+            if ruta_id:
+                ids = id_src.read(1, window=ventana).astype(np.int64)
+            else:
+                ids = ids_por_centro(dem_src, ventana, celdas, nivel)
+            ## sin elevacion el pixel no cuenta; si solo le falta algun vecino (borde del DEM o junto a nodata)
+            ## su pendiente/orientacion son NaN y agregar_dem las omite sin perder su elevacion
+            ids[~np.isfinite(z[1:-1, 1:-1])] = 0
+            yield ventana, dem_src.transform, ids, {'elev': z[1:-1, 1:-1], 'slope': slope, 'aspect': aspect}
+
+
+def terreno_celdas(ruta_dem, celdas, nivel=10, ruta_id=None, tamaño=TAMAÑO_BLOQUE):
+    """
+    Elevacion, pendiente y orientacion por celda desde un unico DEM.
+
+    Parameters
+    ----------
+    ruta_dem : str
+        GeoTIFF del DEM (p.ej. GLO30 de la zona).
+    celdas : DataFrame
+        Celdas de la zona con Codigo e id_num.
+    nivel : int
+        Nivel rHEALPix de la grilla (si no hay raster de id).
+    ruta_id : str or None
+        Raster de id_num (opcional).
+
+    Returns
+    -------
+    DataFrame
+        celdas con n_pixeles y elev/slope _mean/_min/_max, aspect_mean/aspect_R.
+    """
+    n_celdas = int(celdas['id_num'].max()) + 1
+    bloques = bloques_terreno(ruta_dem, ruta_id, celdas, nivel, tamaño)
+    tabla = agregar_dem(None, n_celdas, bloques=bloques)
+    return celdas.merge(tabla, on='id_num', how='inner')
+
+
+if __name__ == "__main__":
+    ## verificacion: superficie analitica (plano inclinado) y bloques con halo = DEM completo en un bloque
+    import tempfile
+    import time
+    from pathlib import Path
+    from affine import Affine
+
+    alto, ancho, paso = 3000, 3000, 30.0
+    yy, xx = np.mgrid[0:alto, 0:ancho] * paso
+    ## sube hacia el oeste y el norte (las filas crecen hacia el sur): mira al sureste (135°)
+    z = 500 - 0.1 * xx - 0.1 * yy + np.sin(xx / 700) * 20
+    transform = Affine(paso, 0, 400000, 0, -paso, 4000000)
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = str(Path(tmp) / 'dem.tif')
+        with rasterio.open(ruta, 'w', driver='GTiff', height=alto, width=ancho, count=1, dtype='float32',
+                           crs='EPSG:32615', transform=transform, nodata=-32768, tiled=True) as dst:
+            dst.write(z.astype(np.float32), 1)
+
+        completo = {}
+        for tamaño in [ancho, 512]:
+            t = time.perf_counter()
+            partes = {}
+            for ventana, _, _, capas in bloques_terreno(ruta, ruta_id=ruta, celdas=None, tamaño=tamaño):
+                partes[(ventana.row_off, ventana.col_off)] = capas['slope']
+            filas = sorted({f for f, _ in partes})
+            completo[tamaño] = np.block([[partes[(f, c)] for c in sorted({c for _, c in partes})] for f in filas])
+            print(f'bloques de {tamaño}: {time.perf_counter() - t:.2f} s')
+        print('bloques con halo = un bloque:', np.array_equal(completo[512], completo[ancho], equal_nan=True))
+
+        plano = np.zeros((5, 5)) + 500 - 0.1 * np.arange(5)[None, :] * paso - 0.1 * np.arange(5)[:, None] * paso
+        s, a = horn(plano, paso, paso)
+        print(f'plano: pendiente {s[0, 0]:.4f} (esperado {np.degrees(np.arctan(0.1 * np.sqrt(2))):.4f}), '
+              f'orientacion {a[0, 0]:.1f} (esperado 135.0)')
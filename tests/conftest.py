@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+## los scripts importan sus modulos hermanos sin paquete (como al ejecutarlos desde su carpeta)
+RAIZ = Path(__file__).resolve().parents[1] / 'code'
+for carpeta in ['download', 'procesamiento', 'modelamiento']:
+    sys.path.append(str(RAIZ / carpeta))
@@ -0,0 +1,46 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+from almacenamiento import escribir, leer, ruta_particion
+
+
+def test_temporal_huerfano_no_rompe_lectura(tmp_path):
+    gdf = gpd.GeoDataFrame({'a': [1, 2], 'zona': ['x', 'y']}, geometry=[Point(0, 0), Point(1, 1)], crs=4326)
+    escribir(gdf, tmp_path, particiones=['zona'])
+    assert not list(tmp_path.rglob('*.tmp'))
+    ## corte entre la escritura del temporal y el rename
+    (ruta_particion(tmp_path, {'zona': 'x'}) / '.otro.parquet.tmp').write_bytes(b'incompleto')
+    df = leer(tmp_path)
+    assert sorted(df['a']) == [1, 2]
+    assert sorted(df['zona']) == ['x', 'y']
+
+
+def test_convertir_union_con_geojson_heredados(tmp_path):
+    from almacenamiento import CARPETA_UNION, claves_ingresadas, convertir_todo
+
+    union = tmp_path / 'satellite_data' / 'union'
+    union.mkdir(parents=True)
+    gdf = gpd.GeoDataFrame({'I04': [300.0, 310.0, 320.0], 'zona': ['area1', 'area2', 'area2'],
+                            'date_file': ['A2025102.0818.002', 'A2025102.0818.002', 'A2025102.1942.002'],
+                            'date_time': ['2025-04-12T08:18:00', '2025-04-12T08:18:00', '2025-04-12T19:42:00']},
+                           geometry=[Point(0, 0), Point(1, 1), Point(2, 2)], crs=4326)
+    gdf.to_file(union / 'zonas_noaa2.geojson', driver='GeoJSON')
+
+    convertir_todo(tmp_path)
+    ## los GeoJSON siguen en su carpeta y no se leen como parte del dataset
+    assert (union / 'zonas_noaa2.geojson').exists()
+    df = leer(tmp_path / CARPETA_UNION, filtros=[('satelite', '==', 'noaa2')])
+    assert len(df) == 3
+    assert sorted(df['zona']) == ['area1', 'area2', 'area2']
+    assert claves_ingresadas(tmp_path / CARPETA_UNION, 'noaa2') == {'A2025102.0818.002', 'A2025102.1942.002'}
+
+
+def test_particion_nula(tmp_path):
+    ## groupby descartaria estas filas sin aviso
+    gdf = gpd.GeoDataFrame({'a': [1, 2, 3], 'zona': ['x', None, np.nan]},
+                           geometry=[Point(0, 0), Point(1, 1), Point(2, 2)], crs=4326)
+    with pytest.raises(ValueError, match='2 filas'):
+        escribir(gdf, tmp_path, particiones=['zona'])
+    assert not list(tmp_path.rglob('*.parquet'))
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import box
+
+from animacion import renderizar_animacion
+
+
+def datos():
+    grilla = gpd.GeoDataFrame(geometry=[box(x, y, x + 1, y + 1) for x in range(4) for y in range(3)], crs=3857)
+    gdf = gpd.GeoDataFrame({'I04': [300.0, 320.0, 340.0],
+                            'date_time': pd.to_datetime(['2025-04-12 08:00', '2025-04-12 08:00', '2025-04-12 20:00']),
+                            'date_file': ['A2025102.0800.002', 'A2025102.0800.002', 'A2025102.2000.002']},
+                           geometry=[box(0.2, 0.2, 0.8, 0.8), box(1.2, 1.2, 1.8, 1.8), box(2.2, 0.2, 2.8, 0.8)],
+                           crs=3857)
+    return gdf, grilla
+
+
+def test_cache_por_parametros_de_render(tmp_path):
+    gdf, grilla = datos()
+    carpeta = tmp_path / 'frames'
+    kwargs = dict(carpeta_frames=str(carpeta), n_procesos=1, figsize=(3, 2), dpi=40)
+
+    frames = renderizar_animacion(gdf, grilla, tmp_path / 'anim.gif', **kwargs)
+    assert len(frames) == 2
+    mtimes = [Path(p).stat().st_mtime_ns for p in frames]
+
+    ## mismo render: se reutilizan los PNG
+    assert renderizar_animacion(gdf, grilla, tmp_path / 'anim.gif', **kwargs) == frames
+    assert [Path(p).stat().st_mtime_ns for p in frames] == mtimes
+
+    ## otra escala de colores: frames nuevos y los del render anterior se borran
+    nuevos = renderizar_animacion(gdf, grilla, tmp_path / 'anim.gif', vmax=400, **kwargs)
+    assert set(nuevos).isdisjoint(frames)
+    assert sorted(str(p) for p in carpeta.rglob('*.png')) == sorted(nuevos)
+    assert len(list((carpeta / 'anim').iterdir())) == 1
+
+    ## otra animacion en la misma carpeta no toca sus frames
+    otra = renderizar_animacion(gdf.iloc[:2], grilla, tmp_path / 'otra.gif', **kwargs)
+    assert all(Path(p).exists() for p in nuevos + otra)
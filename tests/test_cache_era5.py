@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import box
+
+from cache_era5 import actualizar_cache, valores_pasadas
+
+PUBLICADO_HASTA = pd.Timestamp('2025-04-12 10:00', tz='UTC')
+
+
+def grilla(n=5):
+    return gpd.GeoDataFrame({'id': range(n)}, geometry=[box(i, 0, i + 1, 1) for i in range(n)], crs='EPSG:32615')
+
+
+def extraer_local(horas, fc, variables, **kwargs):
+    """Extractor sin GEE: valor = horas desde 2025-04-12, NaN en las horas aun no publicadas."""
+    horas = pd.DatetimeIndex(horas)
+    t = ((horas - pd.Timestamp('2025-04-12', tz='UTC')) / pd.Timedelta(hours=1)).to_numpy()
+    t = np.where(horas <= PUBLICADO_HASTA, t, np.nan)
+    n = 5
+    return pd.DataFrame({'id': np.tile(np.arange(n), len(horas)),
+                         **{v: np.repeat(t, n) for v in variables},
+                         'date_time': horas.repeat(n)})
+
+
+def test_horas_no_publicadas_quedan_nan(tmp_path):
+    fechas = ['2025-04-12T08:40', '2025-04-12T09:10', '2025-04-12T11:30']
+    cache = actualizar_cache(fechas, grilla(), None, tmp_path, extraer=extraer_local)
+    df = valores_pasadas(cache, fechas)
+
+    assert len(df) == 3 * 5
+    reciente = df[df['date_time'] == pd.Timestamp('2025-04-12 11:00', tz='UTC')]
+    assert reciente['temperature_2m'].isna().all()
+    assert (df.loc[df['date_time'] == pd.Timestamp('2025-04-12 08:00', tz='UTC'), 'temperature_2m'] == 8).all()
+
+
+def test_interpolacion_con_hora_siguiente_no_publicada(tmp_path):
+    fechas = ['2025-04-12T09:30', '2025-04-12T10:30']
+    cache = actualizar_cache(fechas, grilla(), None, tmp_path, interpolar=True, extraer=extraer_local)
+    df = valores_pasadas(cache, fechas, interpolar=True)
+
+    assert np.allclose(df.loc[df['date_time'] == pd.Timestamp('2025-04-12 09:30', tz='UTC'), 'temperature_2m'], 9.5)
+    assert df.loc[df['date_time'] == pd.Timestamp('2025-04-12 10:30', tz='UTC'), 'temperature_2m'].isna().all()
+
+
+def test_primera_consulta_toda_nan(tmp_path):
+    fechas = ['2025-04-13T08:40']
+    cache = actualizar_cache(fechas, grilla(), None, tmp_path, extraer=extraer_local)
+    df = valores_pasadas(cache, fechas)
+
+    assert cache is not None and cache.sizes['date_time'] == 0
+    assert len(df) == 5 and df['temperature_2m'].isna().all()
+    assert valores_pasadas(None, fechas).empty
+
+    ## cuando la hora se publica, la siguiente corrida la descarga
+    global PUBLICADO_HASTA
+    anterior, PUBLICADO_HASTA = PUBLICADO_HASTA, pd.Timestamp('2025-04-14', tz='UTC')
+    try:
+        cache = actualizar_cache(fechas, grilla(), None, tmp_path, extraer=extraer_local)
+    finally:
+        PUBLICADO_HASTA = anterior
+    assert (valores_pasadas(cache, fechas)['temperature_2m'] == 32).all()
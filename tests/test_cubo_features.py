@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from cubo_features import alinear_era5
+
+CODIGOS = np.array(['N0', 'N1'])
+
+
+def era5_largo(horas):
+    """Tabla larga ERA5 con valor = hora del dia (+ 100 en la segunda celda)."""
+    horas = pd.DatetimeIndex(horas, tz='UTC')
+    h = (horas.hour + horas.minute / 60).to_numpy()
+    return pd.DataFrame({'Codigo': np.repeat(CODIGOS, len(horas)), 'date_time': np.tile(horas, 2),
+                         'temperature_2m': np.r_[h, h + 100]})
+
+
+def test_solo_horas_truncadas():
+    ## como gee_era5 con INTERPOLAR_PASADA=False: solo la hora truncada de cada pasada
+    era5 = era5_largo(['2025-04-12 08:00', '2025-04-12 20:00', '2025-04-13 08:00'])
+    pasadas = pd.DatetimeIndex(['2025-04-12 08:18', '2025-04-12 20:05', '2025-04-13 08:40'], tz='UTC')
+    v = alinear_era5(era5, pasadas, CODIGOS)['temperature_2m'].values
+    ## sin interpolar hacia la fecha siguiente (12 h despues), y la ultima pasada tiene dato
+    np.testing.assert_allclose(v, [[8, 108], [20, 120], [8, 108]])
+
+
+def test_interpola_entre_horas_consecutivas():
+    era5 = era5_largo(['2025-04-12 08:00', '2025-04-12 09:00', '2025-04-12 20:00'])
+    pasadas = pd.DatetimeIndex(['2025-04-12 08:18', '2025-04-12 09:30', '2025-04-12 20:05',
+                                '2025-04-12 07:50', '2025-04-12 10:10', '2025-04-12 21:00'], tz='UTC')
+    v = alinear_era5(era5, pasadas, CODIGOS)['temperature_2m'].values
+    np.testing.assert_allclose(v[:3], [[8.3, 108.3], [9, 109], [20, 120]])
+    ## antes de ERA5 o con la hora truncada ausente
+    assert np.isnan(v[3:]).all()
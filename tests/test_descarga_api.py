@@ -0,0 +1,103 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from descarga_api import crear_sesion, descargar_archivo, descargar_archivos
+
+CONTENIDO = os.urandom(3 * 1024 ** 2 + 123)
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Sirve CONTENIDO con soporte de Range; la primera respuesta completa se corta a la mitad si `cortar`."""
+    cortar = False
+    rangos = []
+
+    def do_GET(self):
+        rango = self.headers.get('Range')
+        Handler.rangos.append(rango)
+        inicio = int(rango.removeprefix('bytes=').rstrip('-')) if rango else 0
+        if inicio >= len(CONTENIDO):
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{len(CONTENIDO)}')
+            self.end_headers()
+            return
+        cuerpo = CONTENIDO[inicio:]
+        self.send_response(206 if rango else 200)
+        if rango:
+            self.send_header('Content-Range', f'bytes {inicio}-{len(CONTENIDO) - 1}/{len(CONTENIDO)}')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        if Handler.cortar and not rango:
+            ## corte a mitad de la transferencia: menos bytes que el Content-Length y se cierra la conexion
+            Handler.cortar = False
+            self.wfile.write(cuerpo[:len(cuerpo) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    Handler.cortar, Handler.rangos = False, []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    hilo = threading.Thread(target=httpd.serve_forever, daemon=True)
+    hilo.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def archivo(url, nombre='VNP02IMG.A2025102.0812.nc', **kwargs):
+    return {'downloadsLink': f'{url}/{nombre}', 'size': len(CONTENIDO),
+            'md5sum': hashlib.md5(CONTENIDO).hexdigest(), 'producto': 'VNP02IMG', **kwargs}
+
+
+def test_transferencia_interrumpida_se_retoma(servidor, tmp_path):
+    Handler.cortar = True
+    estado = descargar_archivo(crear_sesion('token'), archivo(servidor), tmp_path)
+    assert estado == 'descargado'
+    assert (tmp_path / 'VNP02IMG.A2025102.0812.nc').read_bytes() == CONTENIDO
+    assert not list(tmp_path.glob('*.part'))
+    ## el segundo request pide solo lo que falta del .part (lo escrito antes del corte, en chunks completos)
+    assert len(Handler.rangos) == 2 and Handler.rangos[0] is None
+    inicio = int(Handler.rangos[1].removeprefix('bytes=').rstrip('-'))
+    assert 0 < inicio <= len(CONTENIDO) // 2
+
+
+def test_part_existente_continua_con_range(servidor, tmp_path):
+    (tmp_path / 'VNP02IMG.A2025102.0812.nc.part').write_bytes(CONTENIDO[:1000])
+    assert descargar_archivo(crear_sesion('token'), archivo(servidor), tmp_path) == 'descargado'
+    assert Handler.rangos == ['bytes=1000-']
+    assert (tmp_path / 'VNP02IMG.A2025102.0812.nc').read_bytes() == CONTENIDO
+
+    ## con el archivo final verificado no se vuelve a pedir
+    assert descargar_archivo(crear_sesion('token'), archivo(servidor), tmp_path) == 'existe'
+    assert len(Handler.rangos) == 1
+
+
+def test_md5_distinto_descarta(servidor, tmp_path):
+    estado = descargar_archivo(crear_sesion('token'), archivo(servidor, md5sum='0' * 32), tmp_path, reintentos=2)
+    assert estado == 'error'
+    assert not list(tmp_path.iterdir())
+    assert Handler.rangos == [None, None]
+
+
+def test_tamaño_distinto_no_renombra(servidor, tmp_path):
+    estado = descargar_archivo(crear_sesion('token'), archivo(servidor, size=len(CONTENIDO) + 10), tmp_path,
+                               reintentos=2)
+    assert estado == 'error'
+    assert not (tmp_path / 'VNP02IMG.A2025102.0812.nc').exists()
+    ## el segundo intento pide el resto y el servidor responde 416
+    assert Handler.rangos == [None, f'bytes={len(CONTENIDO)}-']
+
+
+def test_excepcion_de_un_archivo_cuenta_como_error(servidor, tmp_path):
+    archivos = [archivo(servidor), archivo(servidor, nombre='VNP03IMG.A2025102.0812.nc', size='no-numero')]
+    estados = descargar_archivos(crear_sesion('token'), archivos, str(tmp_path), n_workers=2)
+    assert estados == {'descargado': 1, 'error': 1}
@@ -0,0 +1,36 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import box
+
+from deteccion_fuego import estadisticas_fondo, estadisticas_fondo_vecinos
+from granulos_viirs import ventanas_swath
+
+
+def test_fondo_por_ventanas_igual_a_tablas_de_sumas():
+    rng = np.random.default_rng(0)
+    capas = {'I04': 300 + rng.normal(0, 2, (120, 90)), 'I05': 290 + rng.normal(0, 2, (120, 90))}
+    capas['I04'][rng.random((120, 90)) < 0.02] = np.nan
+    fondo = (rng.random((120, 90)) > 0.4) & np.isfinite(capas['I04'])
+    filas, cols = rng.integers(0, 120, 200), rng.integers(0, 90, 200)
+    filas[:4], cols[:4] = [0, 119, 0, 60], [0, 89, 45, 0]   # ventanas recortadas por los bordes
+
+    def pixeles(indices):
+        return {k: v.ravel().take(indices) for k, v in capas.items()}, fondo.ravel().take(indices)
+
+    tablas = estadisticas_fondo(capas, fondo, filas, cols)
+    ventanas = estadisticas_fondo_vecinos(pixeles, filas, cols, fondo.shape, lote=64)
+    np.testing.assert_array_equal(tablas[2], ventanas[2])
+    for k in capas:
+        np.testing.assert_allclose(tablas[0][k][tablas[2]], ventanas[0][k][tablas[2]])
+        np.testing.assert_allclose(tablas[1][k][tablas[2]], ventanas[1][k][tablas[2]], atol=1e-9)
+
+
+def test_ventanas_ampliadas_no_se_solapan():
+    lat, lon = np.meshgrid(np.linspace(10, 0, 100), np.linspace(0, 10, 100), indexing='ij')
+    ## dos zonas separadas por 10 pixeles: con margen 15 las ventanas ampliadas se solapan y se fusionan
+    areas = gpd.GeoDataFrame(geometry=[box(1, 1, 3, 3), box(4, 1, 6, 3)], crs=4326)
+    assert len(ventanas_swath(lat, lon, areas)) == 2
+    ventanas = ventanas_swath(lat, lon, areas, margen=15)
+    assert len(ventanas) == 1
+    f0, f1, c0, c1 = ventanas[0]
+    assert f0 >= 0 and c0 >= 0 and f1 <= 100 and c1 <= 100
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from era5_lotes import extraer_era5, horas_unicas, indice_hora
+
+VARIABLES = ['temperature_2m', 'dewpoint_temperature_2m']
+
+
+def valor(id_, hora, var):
+    """Valor sintetico que identifica recuadro, hora y variable."""
+    return 1000 * VARIABLES.index(var) + 100 * hora.hour + id_
+
+
+class ColeccionLocal:
+    """Stub de ee.ImageCollection: solo las horas de `publicadas` tienen imagen."""
+
+    def __init__(self, publicadas, millis=None, variables=None):
+        self.publicadas, self.millis, self.variables = publicadas, millis, variables
+
+    def filter(self, filtro):
+        return ColeccionLocal(self.publicadas, filtro, self.variables)
+
+    def select(self, variables):
+        return ColeccionLocal(self.publicadas, self.millis, variables)
+
+    def toBands(self):
+        horas = [h for h in pd.to_datetime(self.millis, unit='ms', utc=True) if h in self.publicadas]
+        return ImagenLocal(horas, self.variables)
+
+
+class ImagenLocal:
+    def __init__(self, horas, variables):
+        self.horas, self.variables = horas, variables
+
+    def reduceRegions(self, collection, reducer, scale):
+        return self.horas, self.variables, collection
+
+
+class ClienteLocal:
+    """Stub del modulo `ee` y de ee_to_df que registra las horas pedidas en cada consulta."""
+
+    def __init__(self, publicadas):
+        self.consultas = []
+        self.ImageCollection = lambda nombre: ColeccionLocal(set(publicadas))
+        self.Filter = SimpleNamespace(inList=lambda prop, valores: valores)
+        self.Reducer = SimpleNamespace(mean=lambda: 'mean')
+
+    def a_df(self, consulta):
+        horas, variables, ids = consulta
+        self.consultas.append(list(horas))
+        return pd.DataFrame({'id': ids, **{f'{indice_hora(h)}_{v}': [valor(i, h, v) for i in ids]
+                                           for h in horas for v in variables}})
+
+
+def test_horas_deduplicadas_y_ordenadas():
+    horas = horas_unicas(['2025-04-12T20:05', '2025-04-12T08:40', '2025-04-12T08:18', '2025-04-12T20:00'])
+    assert list(horas) == list(pd.DatetimeIndex(['2025-04-12 08:00', '2025-04-12 20:00'], tz='UTC'))
+
+
+def test_una_consulta_y_tabla_larga():
+    ## suomi, noaa1 y noaa2 en la misma hora: una sola hora por consulta
+    fechas = ['2025-04-12T08:10', '2025-04-12T08:22', '2025-04-12T08:35', '2025-04-12T20:05']
+    horas = horas_unicas(fechas)
+    cliente = ClienteLocal(horas)
+    df = extraer_era5(fechas, [3, 7, 9], VARIABLES, ee_cliente=cliente, a_df=cliente.a_df)
+
+    assert cliente.consultas == [list(horas)]
+    assert list(df.columns) == ['id', *VARIABLES, 'date_time']
+    assert len(df) == 2 * 3
+    assert list(df['date_time'].drop_duplicates()) == list(horas)
+    for fila in df.itertuples():
+        for var in VARIABLES:
+            assert getattr(fila, var) == valor(fila.id, fila.date_time, var)
+
+
+def test_horas_sin_imagen_quedan_nan():
+    fechas = ['2025-04-12T08:10', '2025-04-12T09:10', '2025-04-12T10:10']
+    horas = horas_unicas(fechas)
+    cliente = ClienteLocal(horas[:2])   # la ultima hora aun no esta publicada
+    df = extraer_era5(fechas, [1, 2], VARIABLES, ee_cliente=cliente, a_df=cliente.a_df)
+    sin_imagen = df['date_time'] == horas[2]
+    assert sin_imagen.sum() == 2
+    assert df.loc[sin_imagen, VARIABLES].isna().all().all()
+    assert df.loc[~sin_imagen, VARIABLES].notna().all().all()
+
+
+def test_lotes_de_horas():
+    fechas = pd.date_range('2025-04-12 08:30', periods=7, freq='h', tz='UTC')
+    cliente = ClienteLocal(fechas.floor('h'))
+    df = extraer_era5(fechas, [5], VARIABLES, horas_por_lote=3, n_hilos=2, ee_cliente=cliente, a_df=cliente.a_df)
+    assert sorted(len(c) for c in cliente.consultas) == [1, 3, 3]
+    assert sorted(h for c in cliente.consultas for h in c) == list(fechas.floor('h'))
+    ## los lotes se concatenan en orden de hora
+    assert list(df['date_time']) == list(fechas.floor('h'))
+    np.testing.assert_array_equal(df['temperature_2m'], [100 * h.hour + 5 for h in fechas.floor('h')])
@@ -0,0 +1,28 @@
+import json
+import os
+
+import granulos_viirs
+from granulos_viirs import ejecutar_granulos
+
+
+def procesar_o_morir(clave, bandas, coordenadas, areas, path_save, lectura_ventana=True, geometria_pixel=False):
+    """Reemplazo de procesar_granulo: el granulo 'muere' mata a su worker."""
+    if clave == 'muere':
+        os._exit(1)
+    return {'clave': clave, 'estado': 'ok', 'filas': 1, 'segundos': 0.0, 'pico_rss_mb': 0.0}
+
+
+def test_worker_muerto_solo_marca_su_granulo(tmp_path, monkeypatch):
+    monkeypatch.setattr(granulos_viirs, 'procesar_granulo', procesar_o_morir)
+    claves = ['A2025102.0812.002', 'A2025102.0818.002', 'muere', 'A2025102.0824.002', 'A2025102.0830.002']
+    pares = [(clave, tmp_path / f'{clave}_bandas.nc', tmp_path / f'{clave}_coords.nc') for clave in claves]
+
+    registros = ejecutar_granulos(pares, None, tmp_path, n_procesos=2)
+    estados = {r['clave']: r['estado'] for r in registros}
+    assert sorted(estados) == sorted(claves)
+    assert estados.pop('muere') == 'error'
+    assert set(estados.values()) == {'ok'}
+
+    with open(tmp_path / 'manifiesto.jsonl') as f:
+        manifiesto = [json.loads(linea) for linea in f]
+    assert len(manifiesto) == len(claves)
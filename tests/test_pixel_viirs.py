@@ -0,0 +1,13 @@
+import numpy as np
+
+from pixel_viirs import esquinas_viirs_pixels, make_viirs_pixels
+
+
+def test_escalar_igual_a_arreglo():
+    lat, lon = np.array([35.9, 36.0]), np.array([-94.8, -94.7])
+    zenith, azimuth = np.array([10.0, 55.0]), np.array([-100.0, 80.0])
+    esquinas = esquinas_viirs_pixels(lat, lon, zenith, azimuth)
+    escalar = esquinas_viirs_pixels(lat[1], lon[1], zenith[1], azimuth[1])
+    assert escalar.shape == (1, 5, 2)
+    np.testing.assert_allclose(escalar[0], esquinas[1])
+    assert len(make_viirs_pixels(lat[0], lon[0], zenith[0], azimuth[0])) == 1
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from celdas_healpix import dggs
+from indice_healpix import codigos_a_ids, ids_a_codigos, ids_a_plano, plano_a_ids
+from propagacion import seguimiento, tamaño_celda
+
+NIVEL = 10
+FILAS, COLUMNAS, HORAS = 9, 8, 2.0
+
+
+def frente_recto(hacia_este=True):
+    """Bloque de FILAS x COLUMNAS celdas que arde columna por columna, una por pasada cada HORAS."""
+    rdggs = dggs()
+    fila0, col0 = ids_a_plano(codigos_a_ids(['P' + '4' * NIVEL])[0], NIVEL, rdggs)
+    filas, cols = np.meshgrid(np.arange(FILAS), np.arange(COLUMNAS), indexing='ij')
+    codigos = ids_a_codigos(plano_a_ids(fila0 + filas.ravel(), col0 + cols.ravel(), NIVEL, rdggs), NIVEL)
+    paso = cols.ravel() if hacia_este else COLUMNAS - 1 - cols.ravel()
+    inicio = pd.Timestamp('2025-04-14 06:00', tz='UTC')
+    df = pd.concat([pd.DataFrame({'Codigo': codigos[paso <= k], 'fuego': True,
+                                  'date_time': inicio + pd.Timedelta(hours=HORAS * k)}) for k in range(COLUMNAS)])
+    celdas = pd.DataFrame({'Codigo': codigos, 'fila': filas.ravel(), 'paso': paso})
+    return df, celdas, tamaño_celda(codigos[0], rdggs)
+
+
+@pytest.mark.parametrize('hacia_este, direccion', [(True, 90.0), (False, 270.0)])
+def test_frente_recto(hacia_este, direccion):
+    df, esperado, (_, ancho) = frente_recto(hacia_este)
+    pasadas, celdas = seguimiento(df)
+
+    assert len(pasadas) == COLUMNAS
+    assert list(pasadas['n_nuevas']) == [FILAS] * COLUMNAS
+    np.testing.assert_allclose(pasadas['horas'][1:], HORAS)
+    assert np.isnan(pasadas['horas'][0])
+
+    celdas = celdas.merge(esperado, on='Codigo')
+    np.testing.assert_array_equal(celdas['pasada'], celdas['paso'])
+    primera = celdas['pasada'] == 0
+    assert celdas.loc[primera, ['distancia_m', 'ros', 'direccion']].isna().all().all()
+
+    ## filas lejos del borde norte/sur: el frente mas cercano esta al este/oeste, a una celda
+    interior = ~primera & celdas['fila'].between(2, FILAS - 3)
+    np.testing.assert_allclose(celdas.loc[interior, 'distancia_m'], ancho)
+    np.testing.assert_allclose(celdas.loc[interior, 'ros'], ancho / HORAS)
+    np.testing.assert_allclose(celdas.loc[interior, 'direccion'], direccion)
+    medio = interior & (celdas['pasada'] < COLUMNAS - 1)
+    np.testing.assert_allclose(celdas.loc[medio, 'ros_llegada'], ancho / HORAS)
+    np.testing.assert_allclose(pasadas['ros_mediana'][1:], ancho / HORAS)
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from celdas_healpix import dggs
+from indice_healpix import codigos_a_ids, ids_a_codigos, ids_a_plano, plano_a_ids
+from simulacion import prob_aristas, puntajes, simular, simular_ensamble, vecindad
+
+NIVEL = 10
+LADO = 9
+CENTRO = LADO * LADO // 2
+
+
+@pytest.fixture(scope='module')
+def grilla():
+    """Bloque de LADO x LADO celdas con su fila y columna en el plano; la ignicion va en la celda central."""
+    rdggs = dggs()
+    fila0, col0 = ids_a_plano(codigos_a_ids(['P' + '4' * NIVEL])[0], NIVEL, rdggs)
+    filas, cols = np.meshgrid(np.arange(LADO), np.arange(LADO), indexing='ij')
+    codigos = ids_a_codigos(plano_a_ids(fila0 + filas.ravel(), col0 + cols.ravel(), NIVEL, rdggs), NIVEL)
+    return codigos, filas.ravel(), cols.ravel(), vecindad(codigos, rdggs)
+
+
+def test_vecindad(grilla):
+    codigos, filas, cols, vecinos = grilla
+    n = np.diff(vecinos['indptr'])
+    borde = (filas % (LADO - 1) == 0) | (cols % (LADO - 1) == 0)
+    esquina = (filas % (LADO - 1) == 0) & (cols % (LADO - 1) == 0)
+    np.testing.assert_array_equal(n, np.where(esquina, 3, np.where(borde, 5, 8)))
+    origen = np.repeat(np.arange(len(codigos)), n)
+    destino = vecinos['indices']
+    assert (np.maximum(abs(filas[destino] - filas[origen]), abs(cols[destino] - cols[origen])) == 1).all()
+
+
+def test_prob_uno_llena_por_distancia(grilla):
+    codigos, filas, cols, vecinos = grilla
+    prob = prob_aristas(vecinos, None, 0.0, 0.0, p_h=1.0)
+    assert (prob == 1).all()
+    llegada = simular(vecinos, prob, [CENTRO], n_corridas=3, n_pasos=LADO, semilla=0)
+    ## con 8 vecinas el frente avanza una celda por paso tambien en diagonal
+    distancia = np.maximum(abs(filas - filas[CENTRO]), abs(cols - cols[CENTRO]))
+    np.testing.assert_array_equal(llegada, np.broadcast_to(distancia, llegada.shape))
+
+    ## sin pasos suficientes las celdas lejanas quedan sin quemar
+    corta = simular(vecinos, prob, [CENTRO], n_corridas=1, n_pasos=2, semilla=0)[0]
+    np.testing.assert_array_equal(corta, np.where(distancia <= 2, distancia, -1))
+
+
+def test_prob_cero_solo_ignicion(grilla):
+    codigos, _, _, vecinos = grilla
+    prob = prob_aristas(vecinos, None, 0.0, 0.0, p_h=0.0)
+    ignicion = [0, CENTRO, CENTRO]
+    llegada = simular(vecinos, prob, ignicion, n_corridas=4, n_pasos=10, semilla=0)
+    esperado = np.full(len(codigos), -1)
+    esperado[[0, CENTRO]] = 0
+    np.testing.assert_array_equal(llegada, np.broadcast_to(esperado, llegada.shape))
+
+
+def test_ensamble_misma_semilla(grilla):
+    _, _, _, vecinos = grilla
+    prob = np.full(len(vecinos['indices']), 0.3, dtype=np.float32)
+    args = (vecinos, prob, [CENTRO], 10, 6)
+    serie = simular_ensamble(*args, semilla=7, n_procesos=1, corridas_por_bloque=4)
+    procesos = simular_ensamble(*args, semilla=7, n_procesos=2, corridas_por_bloque=4)
+    assert serie.shape == (10, LADO * LADO)
+    np.testing.assert_array_equal(serie, procesos)
+    ## las corridas no repiten la misma realizacion
+    assert len({fila.tobytes() for fila in serie}) > 1
+
+
+def test_puntajes_coincidencia_exacta(grilla):
+    codigos, _, _, vecinos = grilla
+    prob = prob_aristas(vecinos, None, 0.0, 0.0, p_h=1.0)
+    llegada = simular_ensamble(vecinos, prob, [CENTRO], n_corridas=5, n_pasos=3, semilla=1)
+    inicio, horas_paso = pd.Timestamp('2025-04-14 06:00', tz='UTC'), 0.5
+    quemadas = llegada[0] >= 0
+    observado = pd.DataFrame({'Codigo': codigos[quemadas],
+                              'llegada': inicio + pd.to_timedelta(llegada[0][quemadas] * horas_paso, unit='h')})
+
+    tabla = puntajes(llegada, codigos, observado, inicio, horas_paso)
+    assert list(tabla['paso']) == [0, 1, 2, 3]
+    np.testing.assert_array_equal(tabla['n_observadas'], [1, 9, 25, 49])
+    np.testing.assert_allclose(tabla['n_simuladas'], tabla['n_observadas'])
+    np.testing.assert_allclose(tabla[['sorensen', 'sorensen_p10', 'sorensen_p90']], 1.0)
+    np.testing.assert_allclose(tabla['brier'], 0.0)
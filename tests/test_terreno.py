@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import rasterio
+from affine import Affine
+
+from terreno import horn, terreno_celdas
+
+PASO = 30.0
+
+
+def escribir_tif(ruta, arr, nodata):
+    with rasterio.open(ruta, 'w', driver='GTiff', height=arr.shape[0], width=arr.shape[1], count=1,
+                       dtype=arr.dtype, crs='EPSG:32615', transform=Affine(PASO, 0, 400000, 0, -PASO, 4000000),
+                       nodata=nodata) as dst:
+        dst.write(arr, 1)
+
+
+def test_elevacion_con_pendiente_faltante(tmp_path):
+    """Los pixeles del borde del DEM o junto a nodata no tienen pendiente, pero su elevacion cuenta."""
+    rng = np.random.default_rng(0)
+    z = rng.uniform(200, 600, (6, 6)).astype(np.float32)
+    z[2, 3] = -32768
+    ids = np.where(np.arange(6)[None, :] < 3, 1, 2).repeat(6, axis=0).astype(np.int32)
+    escribir_tif(tmp_path / 'dem.tif', z, -32768)
+    escribir_tif(tmp_path / 'id.tif', ids, 0)
+
+    celdas = pd.DataFrame({'Codigo': ['A', 'B'], 'id_num': [1, 2]})
+    tabla = terreno_celdas(str(tmp_path / 'dem.tif'), celdas, ruta_id=str(tmp_path / 'id.tif'),
+                           tamaño=4).set_index('id_num')
+
+    elev = np.where(z == -32768, np.nan, z).astype(np.float64)
+    con_halo = np.pad(elev, 1, constant_values=np.nan)
+    slope, _ = horn(con_halo, PASO, PASO)
+    for id_num in (1, 2):
+        celda = (ids == id_num) & np.isfinite(elev)
+        assert tabla.loc[id_num, 'n_pixeles'] == celda.sum()
+        np.testing.assert_allclose(tabla.loc[id_num, 'elev_mean'], elev[celda].mean())
+        np.testing.assert_allclose(tabla.loc[id_num, 'elev_min'], elev[celda].min())
+        np.testing.assert_allclose(tabla.loc[id_num, 'elev_max'], elev[celda].max())
+        np.testing.assert_allclose(tabla.loc[id_num, 'slope_mean'], np.nanmean(slope[celda]))